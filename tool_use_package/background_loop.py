@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from .resources import shared_resources
+
+class BackgroundEventLoop:
+    """
+    An asyncio event loop running forever on a daemon thread, so synchronous code (like a tool's use_tool, called from any ToolUser thread)
+    can run coroutines on it, and long-lived async resources such as aiohttp sessions can be created once and reused by every call.
+    The thread is started on first use.
+    """
+
+    def __init__(self, name="tool-use-background-loop"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coroutine, timeout=None):
+        """Runs coroutine on the background loop and waits up to timeout seconds for its result. On timeout, the coroutine is cancelled and TimeoutError raised."""
+
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("BackgroundEventLoop.run cannot be called from the background loop itself, await the coroutine instead.")
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+def get_background_loop():
+    """Returns the background event loop shared by every tool in the process."""
+
+    return shared_resources.get(("background_event_loop",), BackgroundEventLoop)
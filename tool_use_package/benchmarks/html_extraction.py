@@ -0,0 +1,53 @@
+"""
+Compares the throughput of the HTML text extractors BraveSearchTool can scrape pages with, on synthetic pages shaped like typical
+articles (scripts and styles in the head, navigation, the article, a footer). Extractors whose parser is not installed are skipped.
+Also shows how many tokens boilerplate stripping saves over BeautifulSoup's plain get_text.
+
+Usage:
+------
+python -m tool_use_package.benchmarks.html_extraction
+"""
+
+import random
+import time
+
+from bs4 import BeautifulSoup
+
+from ..resources import get_tokenizer
+from ..tools.search.html_extractors import HTML_EXTRACTORS, _is_installed
+
+WORDS = "the of search results page model token budget web article news data system user query paragraph engine network latency".split()
+
+def make_page(rng: random.Random, n_paragraphs: int) -> str:
+    sentence = lambda: " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+    scripts = "".join(f"<script>window.__state{i} = {{\"config\": [{', '.join(str(rng.random()) for _ in range(40))}]}};</script>" for i in range(6))
+    styles = "<style>" + "".join(f".c{i} {{ margin: {i}px; color: #{rng.randrange(16 ** 6):06x}; }}" for i in range(150)) + "</style>"
+    nav = "<nav><ul>" + "".join(f"<li><a href='/section/{i}'>Section {rng.choice(WORDS)}</a></li>" for i in range(40)) + "</ul></nav>"
+    article = "<article><h1>" + sentence() + "</h1>" + "".join(f"<p class='c{i % 150}'>{sentence()} {sentence()} <a href='#'>{sentence()}</a></p>" for i in range(n_paragraphs)) + "</article>"
+    aside = "<aside>" + "".join(f"<div><a href='/related/{i}'>{sentence()}</a></div>" for i in range(10)) + "</aside>"
+    footer = "<footer>" + "".join(f"<a href='/legal/{i}'>{sentence()}</a>" for i in range(20)) + "</footer>"
+    return f"<!DOCTYPE html><html><head><title>{sentence()}</title>{styles}{scripts}</head><body>{nav}{article}{aside}{footer}</body></html>"
+
+def main(n_pages=50, seed=0):
+    rng = random.Random(seed)
+    pages = [make_page(rng, rng.randint(10, 80)) for _ in range(n_pages)]
+    megabytes = sum(len(page.encode()) for page in pages) / 1e6
+    tokenizer = get_tokenizer()
+    count = lambda text: len(tokenizer.encode(text).ids)
+
+    print(f"{n_pages} pages, {megabytes:.1f}MB of HTML")
+    print(f"{'extractor':<24}{'pages/s':>10}{'MB/s':>10}{'tokens/page':>14}")
+    extractors = [("bs4 get_text (before)", lambda html: BeautifulSoup(html, "html.parser").get_text(strip=True, separator="\n"))]
+    extractors += [(name, extractor) for name, extractor in HTML_EXTRACTORS.items() if _is_installed(name)]
+    for name, extractor in extractors:
+        start = time.perf_counter()
+        texts = [extractor(page) for page in pages]
+        elapsed = time.perf_counter() - start
+        tokens = sum(count(text) for text in texts) / n_pages
+        print(f"{name:<24}{n_pages / elapsed:>10.1f}{megabytes / elapsed:>10.2f}{tokens:>14.0f}")
+    skipped = [name for name in HTML_EXTRACTORS if not _is_installed(name)]
+    if skipped:
+        print(f"Not installed: {', '.join(skipped)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Compares how many tokens SQLTool results cost Claude in each result format, on a few typical query shapes.
+
+Usage:
+------
+python -m tool_use_package.benchmarks.sql_result_format
+"""
+
+import random
+
+from ..resources import get_tokenizer
+from ..tools.sql_result import SQLResult
+
+def make_datasets(seed=0):
+    rng = random.Random(seed)
+    departments = ["Engineering", "Sales", "Marketing", "Finance", "Support"]
+    cities = ["San Francisco", "New York", "London", "Tokyo"]
+    names = ["John Smith", "Jane Doe", "Alice Johnson", "Bob Lee", "Carol White", "Dan Brown"]
+
+    employees = [(i, rng.choice(names), rng.randint(22, 65), rng.choice(departments), rng.choice(cities), round(rng.uniform(40000, 250000), 2)) for i in range(1, 201)]
+    grouped = sorted((department, city, rng.randint(1, 40), round(rng.uniform(50000, 150000), 2)) for department in departments for city in cities)
+    events = [(f"2024-03-{day:02d}", "page_view" if rng.random() < 0.7 else "signup", f"https://example.com/{rng.choice(['home', 'pricing', 'docs/getting-started'])}", None if rng.random() < 0.5 else rng.randint(1, 999))
+              for day in sorted(rng.randint(1, 28) for _ in range(150))]
+    return {
+        "employees (200 rows, wide)": (["id", "name", "age", "department", "city", "salary"], employees),
+        "sorted group by (20 rows)": (["department", "city", "headcount", "avg_salary"], grouped),
+        "event log (150 rows, repeats, NULLs)": (["day", "event", "url", "user_id"], events),
+    }
+
+def main():
+    tokenizer = get_tokenizer()
+    count = lambda text: len(tokenizer.encode(text).ids)
+    formats = [("repr", {"style": "repr"}), ("markdown", {"style": "markdown", "collapse_repeats": False}), ("markdown+ditto", {"style": "markdown"}),
+               ("delimited", {"style": "delimited", "collapse_repeats": False}), ("delimited+ditto", {"style": "delimited"})]
+
+    print(f"{'dataset':<40}" + "".join(f"{name:>18}" for name, _ in formats))
+    for dataset_name, (columns, rows) in make_datasets().items():
+        baseline = count(str(SQLResult(rows, columns, style="repr")))
+        cells = []
+        for _, options in formats:
+            n_tokens = count(str(SQLResult(rows, columns, **options)))
+            cells.append(f"{n_tokens} ({n_tokens / baseline:.0%})")
+        print(f"{dataset_name:<40}" + "".join(f"{cell:>18}" for cell in cells))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .tools.base_tool import ToolError
+
+class CircuitBreakerOpenError(ToolError):
+    """Raised instead of calling a backend whose circuit breaker is open. Since it is a ToolError, ToolUser injects it back to Claude."""
+
+    def __init__(self, breaker_name, retry_after):
+        self.breaker_name = breaker_name
+        self.retry_after = retry_after
+        super().__init__(f"The {breaker_name} backend is currently unavailable after repeated failures. It will be retried in {retry_after:.0f} seconds, so do not call it again right now.")
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker that tracks the error rate of calls to a single backend and fails fast once that backend looks down.
+
+    States:
+    -------
+    - closed: Calls go through. The outcomes of the last window_size calls are tracked, and once at least minimum_calls have been made with a failure rate >= failure_rate_threshold the breaker opens.
+    - open: Calls fail immediately with CircuitBreakerOpenError until recovery_timeout seconds have passed, after which the breaker is half open.
+    - half_open: Up to half_open_max_calls probe calls are let through. A successful probe closes the breaker, a failed one opens it again.
+
+    Usage:
+    ------
+    breaker.call(fn, *args, **kwargs) runs fn through the breaker, counting any exception as a failure. Use get_circuit_breaker(name) to share one breaker per backend across the process.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_rate_threshold=0.5, minimum_calls=5, window_size=20, recovery_timeout=30, half_open_max_calls=1, clock=time.monotonic):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window_size) # True for a failed call, False for a successful one
+        self._state = CircuitBreaker.CLOSED
+        self._opened_at = None
+        self._half_open_calls = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == CircuitBreaker.OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = CircuitBreaker.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self):
+        """
+        Raises CircuitBreakerOpenError if a call should not be made right now, otherwise reserves a slot for the call.
+        If the call took a half open probe slot, returns a token to pass to release_probe should the call end without recording a success or failure.
+        """
+
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitBreaker.OPEN:
+                raise CircuitBreakerOpenError(self.name, self.recovery_timeout - (self._clock() - self._opened_at))
+            if state == CircuitBreaker.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    # A probe is already in flight. If it fails the breaker opens for another recovery_timeout, so that is how long a retry may have to wait.
+                    raise CircuitBreakerOpenError(self.name, self.recovery_timeout)
+                self._half_open_calls += 1
+                return self._opened_at # Identifies this half open period, see release_probe
+            return None
+
+    def release_probe(self, probe):
+        """Gives back the half open probe slot before_call returned probe for, for a call that ended (e.g. was cancelled) without an outcome."""
+
+        with self._lock:
+            # Only if the breaker is still in the same half open period, otherwise the slot was already reset.
+            if self._state == CircuitBreaker.HALF_OPEN and self._opened_at == probe and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                self._state = CircuitBreaker.CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(False)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(True)
+            if self._state == CircuitBreaker.CLOSED and len(self._outcomes) >= self.minimum_calls and self._failure_rate() >= self.failure_rate_threshold:
+                self._open()
+
+    def _open(self):
+        self._state = CircuitBreaker.OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+
+    def _failure_rate(self):
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def call(self, fn, *args, **kwargs):
+        """Calls fn(*args, **kwargs) through the breaker, recording a failure if it raises."""
+
+        with self.guard():
+            return fn(*args, **kwargs)
+
+    @contextmanager
+    def guard(self):
+        """
+        Runs the body of a with block through the breaker, like call, for work that is more than one function call
+        (e.g. calling a streaming tool and then consuming its output). A failure is recorded if the body raises, a success otherwise.
+        """
+
+        probe = self.before_call()
+        recorded = False
+        try:
+            yield
+        except CircuitBreakerOpenError:
+            # A nested breaker failing fast says nothing about the health of this backend.
+            raise
+        except Exception:
+            self.record_failure()
+            recorded = True
+            raise
+        else:
+            self.record_success()
+            recorded = True
+        finally:
+            # Neither outcome was recorded (a nested breaker failed fast, or the call was cancelled or interrupted), so let another probe through.
+            if not recorded and probe is not None:
+                self.release_probe(probe)
+
+    def reset(self):
+        with self._lock:
+            self._state = CircuitBreaker.CLOSED
+            self._opened_at = None
+            self._outcomes.clear()
+
+    def stats(self):
+        """Returns the breaker's state, its failure rate over the window, and how many seconds until an open breaker lets a probe through."""
+
+        with self._lock:
+            state = self._current_state()
+            return {
+                "name": self.name,
+                "state": state,
+                "failure_rate": self._failure_rate(),
+                "calls_in_window": len(self._outcomes),
+                "retry_after": max(0, self.recovery_timeout - (self._clock() - self._opened_at)) if state == CircuitBreaker.OPEN else 0
+            }
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(name, **kwargs):
+    """Returns the process-wide circuit breaker for the named backend, creating it with kwargs if it does not exist yet."""
+
+    with _circuit_breakers_lock:
+        if name not in _circuit_breakers:
+            _circuit_breakers[name] = CircuitBreaker(name, **kwargs)
+        return _circuit_breakers[name]
+
+def circuit_breaker_states():
+    """Returns the stats of every registered circuit breaker, keyed by backend name."""
+
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
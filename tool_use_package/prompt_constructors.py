@@ -1,7 +1,10 @@
+import hashlib
 import typing
+import threading
+from collections import OrderedDict
 
 # This file contains prompt constructors for various pieces of code. Used primarily to keep other code legible.
-def construct_tool_use_system_prompt(tools):
+def construct_tool_use_system_prompt(tools, query=None):
     tool_use_system_prompt = (
         "In this environment you have access to a set of tools you can use to answer the user's question.\n"
         "\n"
@@ -18,22 +21,22 @@ def construct_tool_use_system_prompt(tools):
         "\n"
         "Here are the tools available:\n"
         "<tools>\n"
-        + '\n'.join([tool.format_tool_for_claude() for tool in tools]) +
+        + '\n'.join([tool.format_tool_for_claude() if query is None else tool.format_tool_for_claude_for_query(query) for tool in tools]) +
         "\n</tools>"
     )
         
     return tool_use_system_prompt
 
-def construct_use_tools_prompt(prompt, tools, last_message_role):
+def construct_use_tools_prompt(prompt, tools, last_message_role, query=None):
     if last_message_role == 'user':
         constructed_prompt = (
-            f"{construct_tool_use_system_prompt(tools)}"
+            f"{construct_tool_use_system_prompt(tools, query)}"
             f"{prompt}"
             "\n\nAssistant:"
         )
     else:
         constructed_prompt = (
-            f"{construct_tool_use_system_prompt(tools)}"
+            f"{construct_tool_use_system_prompt(tools, query)}"
             f"{prompt}"
         )
     
@@ -106,79 +109,129 @@ def construct_format_sql_tool_for_claude_prompt(name, description, parameters, d
 def construct_prompt_from_messages(messages):
     validate_messages(messages)
     
-    constructed_prompt = ""
-    for i, message in enumerate(messages):
-        if message['role'] == 'user':
-            if (i > 0 and messages[i-1]['role'] != 'user') or i == 0:
-                constructed_prompt = f"{constructed_prompt}\n\nHuman: {message['content']}"
-            else:
-                constructed_prompt = f"{constructed_prompt}\n\n{message['content']}"
-        if message['role'] == 'assistant':
-            if (i > 0 and messages[i-1]['role'] == 'user') or i == 0:
-                constructed_prompt = f"{constructed_prompt}\n\nAssistant: {message['content']}"
-            else:
-                constructed_prompt = f"{constructed_prompt}\n\n{message['content']}"
-        if message['role'] == 'tool_inputs':
-            appendage = construct_tool_inputs_message(message['content'], message['tool_inputs'])
-            if (i > 0 and messages[i-1]['role'] == 'user') or i == 0:
-                constructed_prompt = f"{constructed_prompt}\n\nAssistant:{appendage}"
-            elif message['content'] == "":
-                constructed_prompt = f"{constructed_prompt}{appendage}"
-            else:
-                constructed_prompt = f"{constructed_prompt}\n\n{appendage}"
-        if message['role'] == 'tool_outputs':
-            appendage = construct_tool_outputs_message(message['tool_outputs'], message['tool_error'])
-            if (i > 0 and messages[i-1]['role'] == 'user') or i == 0:
-                constructed_prompt = f"{constructed_prompt}\n\nAssistant:{appendage}"
-            else:
-                constructed_prompt = f"{constructed_prompt}{appendage}"
-    
-    return constructed_prompt
+    return "".join(construct_message_prompt(message, messages[i-1]['role'] if i > 0 else None) for i, message in enumerate(messages))
+
+def construct_message_prompt(message, previous_role):
+    """Renders the piece of the prompt for a single message. The rendering only depends on the message itself and the role of the message before it."""
+
+    if message['role'] == 'user':
+        if previous_role != 'user':
+            return f"\n\nHuman: {message['content']}"
+        return f"\n\n{message['content']}"
+    if message['role'] == 'assistant':
+        if previous_role is None or previous_role == 'user':
+            return f"\n\nAssistant: {message['content']}"
+        return f"\n\n{message['content']}"
+    if message['role'] == 'tool_inputs':
+        appendage = construct_tool_inputs_message(message['content'], message['tool_inputs'])
+        if previous_role is None or previous_role == 'user':
+            return f"\n\nAssistant:{appendage}"
+        if message['content'] == "":
+            return appendage
+        return f"\n\n{appendage}"
+    if message['role'] == 'tool_outputs':
+        appendage = construct_tool_outputs_message(message['tool_outputs'], message['tool_error'])
+        if previous_role is None or previous_role == 'user':
+            return f"\n\nAssistant:{appendage}"
+        return appendage
+    return ""
+
+class PromptRenderer:
+    """
+    Renders messages into a prompt string like construct_prompt_from_messages, but remembers the prompts it rendered recently.
+
+    When it is called with a conversation that extends one it rendered before (as happens when a growing conversation is resent on every call), only the new messages are validated and rendered.
+    Up to max_conversations prompts are kept, least recently used first out, so conversations interleaved on a shared ToolUser (e.g. one served to several clients) each keep their prefix.
+    Prompts are keyed by a running hash of the messages' reprs, so messages edited in place, nested values included, are rendered again.
+    """
+
+    def __init__(self, max_conversations=32):
+        self.max_conversations = max_conversations
+        self._lock = threading.Lock()
+        self._prompts = OrderedDict()
+
+    def render(self, messages):
+        validate_messages_list(messages)
+
+        prefix_keys = []
+        running_hash = hashlib.blake2b(digest_size=16)
+        for message in messages:
+            running_hash.update(repr(message).encode())
+            running_hash.update(b"\0")
+            prefix_keys.append(running_hash.digest())
+
+        n_reused, prompt = 0, ""
+        with self._lock:
+            for i in range(len(messages), 0, -1):
+                if prefix_keys[i-1] in self._prompts:
+                    self._prompts.move_to_end(prefix_keys[i-1])
+                    n_reused, prompt = i, self._prompts[prefix_keys[i-1]]
+                    break
+
+        if n_reused == len(messages):
+            return prompt
+        new_fragments = []
+        for i in range(n_reused, len(messages)):
+            validate_message(messages[i])
+            new_fragments.append(construct_message_prompt(messages[i], messages[i-1]['role'] if i > 0 else None))
+        prompt = "".join([prompt, *new_fragments])
+
+        with self._lock:
+            self._prompts[prefix_keys[-1]] = prompt
+            self._prompts.move_to_end(prefix_keys[-1])
+            while len(self._prompts) > self.max_conversations:
+                self._prompts.popitem(last=False)
+        return prompt
 
 def validate_messages(messages):
+    validate_messages_list(messages)
+    for message in messages:
+        validate_message(message)
+
+def validate_messages_list(messages):
     if not isinstance(messages, list):
         raise ValueError("Messages must be a list of length > 0.")
     if len(messages) < 1:
         raise ValueError("Messages must be a list of length > 0.")
-    
+
+def validate_message(message):
     valid_roles = ['user', 'assistant', 'tool_inputs', 'tool_outputs']
-    for message in messages:
-        if not isinstance(message, dict):
-            raise ValueError("All messages in messages list should be dictionaries.")
-        if 'role' not in message:
-            raise ValueError("All messages must have a 'role' key.")
-        if message['role'] not in valid_roles:
-            raise ValueError(f"{message['role']} is not a valid role. Valid roles are {valid_roles}")
-        if message['role'] == 'user' or message['role'] == 'assistant':
-            if 'content' not in message:
-                raise ValueError("All messages with user or assistant roles must have a 'content' key.")
-            if not isinstance(message['content'], str):
-                raise ValueError("For messages with role='user' or role='assistant', content must be a string.")
-        if message['role'] == 'tool_inputs':
-            if 'tool_inputs' not in message:
-                raise ValueError("All messages with tool_inputs roles must have a 'tool_inputs' key.")
-            if not isinstance(message['tool_inputs'], list):
-                raise ValueError("For messages with role='tool_inputs', tool_inputs must be a list of length > 0.")
-            if len(message['tool_inputs']) < 1:
-                raise ValueError("For messages with role='tool_inputs', tool_inputs must be a list of length > 0.")
-            for tool_input in message['tool_inputs']:
-                if not isinstance(tool_input, dict):
-                    raise ValueError("All elements of tool_inputs must be dictionaries with keys 'tool_name' and 'tool_arguments'.")
-                if 'tool_name' not in tool_input:
-                    raise ValueError("All elements of tool_inputs must be dictionaries with keys 'tool_name' and 'tool_arguments'.")
-                if 'tool_arguments' not in tool_input:
-                    raise ValueError("All elements of tool_inputs must be dictionaries with keys 'tool_name' and 'tool_arguments'.")
-        if message['role'] == 'tool_outputs':
-            if 'content' in message:
-                raise ValueError("tool_outputs should not have a 'content' key/value pair")
-            if message['tool_error'] is not None and message['tool_outputs'] is not None:
-                raise ValueError("Only one of tool_outputs and tool_error should be provided, the other should be None. Both are currently not None.")
-            if message['tool_error'] is None and message['tool_outputs'] is None:
-                raise ValueError("For messages with role='tool_putput' you must provide one of tool_outputs or tool_error.")
-            if message['tool_outputs'] is not None and not isinstance(message['tool_outputs'], list):
-                raise ValueError("tool_error must be str or None.")
-            if message['tool_error'] is not None and not isinstance(message['tool_error'], str):
-                raise ValueError("tool_error must be str or None.")
+    if not isinstance(message, dict):
+        raise ValueError("All messages in messages list should be dictionaries.")
+    if 'role' not in message:
+        raise ValueError("All messages must have a 'role' key.")
+    if message['role'] not in valid_roles:
+        raise ValueError(f"{message['role']} is not a valid role. Valid roles are {valid_roles}")
+    if message['role'] == 'user' or message['role'] == 'assistant':
+        if 'content' not in message:
+            raise ValueError("All messages with user or assistant roles must have a 'content' key.")
+        if not isinstance(message['content'], str):
+            raise ValueError("For messages with role='user' or role='assistant', content must be a string.")
+    if message['role'] == 'tool_inputs':
+        if 'tool_inputs' not in message:
+            raise ValueError("All messages with tool_inputs roles must have a 'tool_inputs' key.")
+        if not isinstance(message['tool_inputs'], list):
+            raise ValueError("For messages with role='tool_inputs', tool_inputs must be a list of length > 0.")
+        if len(message['tool_inputs']) < 1:
+            raise ValueError("For messages with role='tool_inputs', tool_inputs must be a list of length > 0.")
+        for tool_input in message['tool_inputs']:
+            if not isinstance(tool_input, dict):
+                raise ValueError("All elements of tool_inputs must be dictionaries with keys 'tool_name' and 'tool_arguments'.")
+            if 'tool_name' not in tool_input:
+                raise ValueError("All elements of tool_inputs must be dictionaries with keys 'tool_name' and 'tool_arguments'.")
+            if 'tool_arguments' not in tool_input:
+                raise ValueError("All elements of tool_inputs must be dictionaries with keys 'tool_name' and 'tool_arguments'.")
+    if message['role'] == 'tool_outputs':
+        if 'content' in message:
+            raise ValueError("tool_outputs should not have a 'content' key/value pair")
+        if message['tool_error'] is not None and message['tool_outputs'] is not None:
+            raise ValueError("Only one of tool_outputs and tool_error should be provided, the other should be None. Both are currently not None.")
+        if message['tool_error'] is None and message['tool_outputs'] is None:
+            raise ValueError("For messages with role='tool_putput' you must provide one of tool_outputs or tool_error.")
+        if message['tool_outputs'] is not None and not isinstance(message['tool_outputs'], list):
+            raise ValueError("tool_error must be str or None.")
+        if message['tool_error'] is not None and not isinstance(message['tool_error'], str):
+            raise ValueError("tool_error must be str or None.")
 
 def construct_tool_inputs_message(content, tool_inputs):
     def format_parameters(tool_arguments):
@@ -0,0 +1,278 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import threading
+import time
+
+class TokenBucket:
+    """
+    A thread-safe token bucket holding up to capacity tokens and refilling at capacity / period tokens per second.
+
+    Attributes:
+    -----------
+    - capacity (float): The maximum number of tokens the bucket holds.
+    - period (float): The number of seconds it takes to refill an empty bucket. Default is 60, for per-minute limits.
+    """
+
+    def __init__(self, capacity, period=60, clock=time.monotonic):
+        self.capacity = capacity
+        self.period = period
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._available = capacity
+        self._updated_at = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._available = min(self.capacity, self._available + (now - self._updated_at) * self.capacity / self.period)
+        self._updated_at = now
+
+    def wait_time(self, amount):
+        """Returns how many seconds until amount tokens are available (0 if they are available now). Amounts above capacity are treated as capacity."""
+
+        with self._lock:
+            self._refill()
+            missing = min(amount, self.capacity) - self._available
+            return max(0.0, missing * self.period / self.capacity)
+
+    def try_acquire(self, amount):
+        """Takes amount tokens and returns 0 if they are available, otherwise takes nothing and returns the number of seconds to wait."""
+
+        with self._lock:
+            self._refill()
+            missing = min(amount, self.capacity) - self._available
+            if missing > 0:
+                return missing * self.period / self.capacity
+            self._available -= amount
+            return 0.0
+
+    def acquire(self, amount):
+        """Blocks until amount tokens could be taken."""
+
+        while (wait := self.try_acquire(amount)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount):
+        """Like acquire, but waits with asyncio.sleep so it does not block the event loop."""
+
+        while (wait := self.try_acquire(amount)) > 0:
+            await asyncio.sleep(wait)
+
+    def take(self, amount):
+        """Takes amount tokens without waiting, possibly going into debt. A negative amount returns tokens (e.g. when a reservation turns out to have been too large)."""
+
+        with self._lock:
+            self._refill()
+            self._available = min(self.capacity, self._available - amount)
+
+    def update(self, capacity=None, remaining=None):
+        """Adapts the bucket to what the server reports: its real capacity and how many tokens are actually left."""
+
+        with self._lock:
+            self._refill()
+            if capacity is not None and capacity > 0:
+                self.capacity = capacity
+            if remaining is not None:
+                self._available = min(self._available, remaining)
+            self._available = min(self._available, self.capacity)
+
+class RateLimitReservation:
+    """
+    The requests and tokens reserved for one API call. Record the actual usage on it so the scheduler can refund or charge the difference.
+    If the call raises before its usage is recorded, its tokens are refunded, except after a 429, which means the tokens really were used up.
+    """
+
+    def __init__(self, scheduler, input_tokens, output_tokens):
+        self.scheduler = scheduler
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.actual_input_tokens = None
+        self.actual_output_tokens = None
+        self.failed = False
+
+    def record_usage(self, input_tokens=None, output_tokens=None):
+        self.actual_input_tokens = input_tokens
+        self.actual_output_tokens = output_tokens
+
+    def record_headers(self, headers):
+        self.scheduler.update_from_headers(headers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        response = getattr(exc, 'response', None)
+        if response is not None and getattr(response, 'status_code', None) == 429:
+            self.scheduler.update_from_headers(response.headers)
+        elif exc_type is not None:
+            # Connection errors and server errors consume no tokens.
+            self.failed = True
+        self.scheduler.release(self)
+        return False
+
+class RateLimitScheduler:
+    """
+    A process-wide scheduler that every ToolUser API call goes through, to stay under requests-per-minute and tokens-per-minute limits instead of triggering 429 storms.
+
+    Keeps a token bucket each for requests, input tokens and output tokens. Callers wait in a priority queue (interactive before batch, then first come first served) until every bucket can cover their request.
+    Output tokens are reserved at max_tokens and the unused part is refunded once the real usage is known; input tokens are estimated up front and corrected the same way.
+    Calls that fail without reporting their usage (other than with a 429) get their tokens back.
+
+    Attributes:
+    -----------
+    - requests_per_minute (int, optional): Requests allowed per minute. If None, requests are not limited until a rate limit header reports the limit.
+    - input_tokens_per_minute (int, optional): Input tokens allowed per minute. If None, learned from rate limit headers.
+    - output_tokens_per_minute (int, optional): Output tokens allowed per minute. If None, learned from rate limit headers.
+
+    The scheduler adapts to the anthropic-ratelimit-* response headers (limits and remaining amounts) and pauses everyone for retry-after seconds when a 429 is returned.
+    """
+
+    PRIORITIES = {"interactive": 0, "batch": 1}
+
+    def __init__(self, requests_per_minute=None, input_tokens_per_minute=None, output_tokens_per_minute=None, clock=time.monotonic):
+        self._clock = clock
+        self._buckets = {
+            "requests": TokenBucket(requests_per_minute, clock=clock) if requests_per_minute else None,
+            "input_tokens": TokenBucket(input_tokens_per_minute, clock=clock) if input_tokens_per_minute else None,
+            "output_tokens": TokenBucket(output_tokens_per_minute, clock=clock) if output_tokens_per_minute else None
+        }
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+    def request(self, estimated_input_tokens, max_output_tokens, priority="interactive"):
+        """Blocks until the call may be made and returns a RateLimitReservation, to be used as a context manager around the call."""
+
+        if priority not in RateLimitScheduler.PRIORITIES:
+            raise ValueError(f"priority must be one of {list(RateLimitScheduler.PRIORITIES)}, got {priority}")
+
+        amounts = self._amounts(estimated_input_tokens, max_output_tokens)
+        ticket = (RateLimitScheduler.PRIORITIES[priority], next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = self._paused_until - self._clock()
+                    if self._waiting[0] == ticket and wait <= 0:
+                        wait = self._bucket_wait_time(amounts)
+                        if wait <= 0:
+                            for name, bucket in self._buckets.items():
+                                if bucket is not None:
+                                    bucket.take(amounts[name])
+                            break
+                    # Woken early whenever the queue or the limits change
+                    self._condition.wait(timeout=wait if wait > 0 else None)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+        return RateLimitReservation(self, estimated_input_tokens, max_output_tokens)
+
+    def wait_time(self, estimated_input_tokens, max_output_tokens):
+        """Returns how many seconds a call of this size would have to wait for the limits (0 if it could be made now), not counting calls already queued."""
+
+        with self._condition:
+            return max(self._paused_until - self._clock(), self._bucket_wait_time(self._amounts(estimated_input_tokens, max_output_tokens)), 0.0)
+
+    @staticmethod
+    def _amounts(estimated_input_tokens, max_output_tokens):
+        return {"requests": 1, "input_tokens": estimated_input_tokens, "output_tokens": max_output_tokens}
+
+    def _bucket_wait_time(self, amounts):
+        return max((bucket.wait_time(amounts[name]) for name, bucket in self._buckets.items() if bucket is not None), default=0.0)
+
+    def release(self, reservation):
+        """
+        Refunds (or charges) the difference between the reserved and the actual token usage of a finished call.
+        The tokens of a call that failed without recording its usage are refunded in full. Its request stays counted, since the server may have counted it.
+        """
+
+        def correction(actual, reserved):
+            if actual is not None:
+                return actual - reserved
+            return -reserved if reservation.failed else None
+
+        corrections = {
+            "input_tokens": correction(reservation.actual_input_tokens, reservation.input_tokens),
+            "output_tokens": correction(reservation.actual_output_tokens, reservation.output_tokens)
+        }
+        with self._condition:
+            for name, correction in corrections.items():
+                if correction is not None and self._buckets[name] is not None:
+                    self._buckets[name].take(correction)
+            self._condition.notify_all()
+
+    def update_from_headers(self, headers):
+        """Adapts the buckets to the rate limit headers of an API response."""
+
+        if headers is None:
+            return
+
+        with self._condition:
+            for name, header_name in (("requests", "requests"), ("input_tokens", "input-tokens"), ("output_tokens", "output-tokens")):
+                limit = RateLimitScheduler._int_header(headers, f"anthropic-ratelimit-{header_name}-limit")
+                remaining = RateLimitScheduler._int_header(headers, f"anthropic-ratelimit-{header_name}-remaining")
+                if self._buckets[name] is None:
+                    if limit is None:
+                        continue
+                    self._buckets[name] = TokenBucket(limit, clock=self._clock)
+                self._buckets[name].update(capacity=limit, remaining=remaining)
+
+            retry_after = RateLimitScheduler._retry_after(headers)
+            if retry_after is not None:
+                self._paused_until = max(self._paused_until, self._clock() + retry_after)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "waiting": len(self._waiting),
+                "paused_for": max(0.0, self._paused_until - self._clock()),
+                "limits": {name: bucket.capacity for name, bucket in self._buckets.items() if bucket is not None}
+            }
+
+    @staticmethod
+    def _int_header(headers, name):
+        value = headers.get(name)
+        try:
+            return int(value) if value is not None else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _retry_after(headers):
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            # retry-after may also be an HTTP date
+            retry_at = datetime.datetime.strptime(value, "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=datetime.timezone.utc)
+            return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+        except ValueError:
+            return None
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+def get_default_scheduler():
+    """Returns the process-wide RateLimitScheduler shared by every ToolUser that was not given its own. It starts unlimited and learns the account's limits from response headers."""
+
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RateLimitScheduler()
+        return _default_scheduler
+
+def set_default_scheduler(scheduler):
+    """Replaces the process-wide RateLimitScheduler, e.g. with one configured with known limits."""
+
+    global _default_scheduler
+    with _default_scheduler_lock:
+        _default_scheduler = scheduler
@@ -0,0 +1,60 @@
+import math
+import re
+from collections import Counter
+
+# Small, dependency-free relevance scoring used to pick which tools (or schema tables) are worth showing Claude for a given question.
+STOPWORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does", "for", "from", "given", "how", "i", "if", "in", "is", "it",
+    "me", "my", "of", "on", "or", "please", "should", "so", "that", "the", "then", "this", "to", "use", "was", "what", "when", "where",
+    "which", "who", "will", "with", "you", "your"
+])
+
+def tokenize_for_relevance(text):
+    """Lowercases text and splits it into alphanumeric terms without stopwords, so snake_case identifiers like get_weather become ['get', 'weather']."""
+
+    return [term for term in re.findall(r"[a-z0-9]+", text.lower()) if term not in STOPWORDS]
+
+class BM25Index:
+    """
+    An in-memory Okapi BM25 index over a fixed list of documents.
+
+    Attributes:
+    -----------
+    - k1 (float): Term frequency saturation. Default is 1.5.
+    - b (float): Document length normalization. Default is 0.75.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_frequencies = [Counter(tokenize_for_relevance(document)) for document in documents]
+        self._lengths = [sum(tf.values()) for tf in self._term_frequencies]
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0
+
+        document_frequencies = Counter()
+        for tf in self._term_frequencies:
+            document_frequencies.update(tf.keys())
+        n_documents = len(self._term_frequencies)
+        self._idf = {term: math.log(1 + (n_documents - df + 0.5) / (df + 0.5)) for term, df in document_frequencies.items()}
+
+    def scores(self, query):
+        """Returns the BM25 score of every document for the query, in document order."""
+
+        query_terms = set(tokenize_for_relevance(query))
+        scores = []
+        for tf, length in zip(self._term_frequencies, self._lengths):
+            score = 0.0
+            for term in query_terms:
+                if term not in tf:
+                    continue
+                length_norm = 1 - self.b + self.b * (length / self._average_length) if self._average_length else 1
+                score += self._idf[term] * tf[term] * (self.k1 + 1) / (tf[term] + self.k1 * length_norm)
+            scores.append(score)
+        return scores
+
+    def top_k(self, query, k):
+        """Returns the indices of the (at most) k highest scoring documents with a positive score, best first. Ties keep document order."""
+
+        scores = self.scores(query)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        return ranked[:k]
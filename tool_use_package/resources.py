@@ -0,0 +1,55 @@
+import threading
+
+from anthropic import Anthropic
+
+class ResourceRegistry:
+    """
+    A thread-safe, process-wide registry of lazily created backend resources (clients, tokenizers, fetched configs), keyed by what identifies the backend.
+
+    Tools ask the registry for their resources on first use instead of creating them in __init__, so constructing a tool does no network work,
+    and two tools pointed at the same backend (e.g. the same Elasticsearch cluster) share one client. A resource's factory runs at most once per key,
+    even when several threads ask for it at the same time. A factory that raises is not cached, so the next caller tries again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resources = {}
+        self._key_locks = {}
+
+    def get(self, key, factory):
+        """Returns the resource for key, calling factory() to create it if it does not exist yet."""
+
+        with self._lock:
+            if key in self._resources:
+                return self._resources[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._resources:
+                    return self._resources[key]
+            resource = factory()
+            with self._lock:
+                self._resources[key] = resource
+            return resource
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._resources
+
+    def discard(self, key):
+        """Forgets the resource for key (e.g. after its connection broke), so the next get creates it again."""
+
+        with self._lock:
+            self._resources.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._resources.clear()
+
+shared_resources = ResourceRegistry()
+
+def get_tokenizer():
+    """Returns the Anthropic tokenizer shared by every tool in the process. Loading it is slow, so it is only done once."""
+
+    return shared_resources.get(("anthropic_tokenizer",), lambda: Anthropic().get_tokenizer())
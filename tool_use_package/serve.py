@@ -0,0 +1,262 @@
+"""
+Serve a toolset behind a small local JSON API, with a pool of pre-warmed worker processes.
+
+Usage:
+------
+python -m tool_use_package.serve --toolset my_package.my_tools:build_tools --workers 4 --port 8080
+python -m tool_use_package.serve --toolset my_package.my_tools:build_tools --transport stdio
+
+--toolset is a "module:attribute" path. The attribute can be a list of tools, a ToolUser, or a function returning either; a function is called once in each worker process, so that is where expensive setup (tokenizers, database connections, search clients) should go.
+
+HTTP transport:
+- POST /v1/use_tools with a JSON body of ToolUser.use_tools keyword arguments, e.g. {"messages": [...], "execution_mode": "automatic"}. Responds {"result": ...}.
+- POST /v1/execute_tool_inputs with {"tool_inputs_message": {...}, "timeout": 30}. Responds {"result": <tool_outputs message>}.
+- GET /health.
+Requests beyond the worker pool plus the queue are rejected immediately with a 503 rather than piling up.
+
+Workers print to stderr, so anything tools print never mixes with the responses.
+
+stdio transport: one JSON request per line, {"id": ..., "method": "use_tools" | "execute_tool_inputs", "params": {...}}, answered (possibly out of order) with one {"id": ..., "result": ...} or {"id": ..., "error": ...} line each.
+
+Set --model-base-url to point the workers at a different (e.g. local fake) model endpoint.
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .tool_user import ToolUser
+
+METHODS = ("use_tools", "execute_tool_inputs")
+
+class ServerBusyError(Exception):
+    """Raised when a request arrives while every worker is busy and the queue is full."""
+
+# Worker process side. Each worker builds its ToolUser once and reuses it for every request it handles.
+_worker_tool_user = None
+
+def load_tool_user(toolset, tool_user_kwargs=None):
+    """Builds a ToolUser from a "module:attribute" toolset path."""
+
+    module_name, _, attribute_name = toolset.partition(":")
+    if not module_name or not attribute_name:
+        raise ValueError(f"toolset must look like 'module:attribute', got {toolset}")
+    toolset_object = getattr(importlib.import_module(module_name), attribute_name)
+    if callable(toolset_object) and not isinstance(toolset_object, ToolUser):
+        toolset_object = toolset_object()
+    if isinstance(toolset_object, ToolUser):
+        return toolset_object
+    return ToolUser(list(toolset_object), **(tool_user_kwargs or {}))
+
+def _init_worker(toolset, tool_user_kwargs, model_base_url):
+    global _worker_tool_user
+    # Tools print progress ("Searching...") freely, and with the stdio transport stdout carries the responses, so workers print to stderr.
+    # Redirecting the file descriptor as well catches output from subprocesses and C extensions.
+    sys.stdout.flush()
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    if model_base_url is not None:
+        os.environ["ANTHROPIC_BASE_URL"] = model_base_url
+    _worker_tool_user = load_tool_user(toolset, tool_user_kwargs)
+    _worker_tool_user.warmup()
+
+def _worker_ready():
+    return os.getpid()
+
+def _handle_in_worker(method, params):
+    if method == "use_tools":
+        return _worker_tool_user.use_tools(**params)
+    return _worker_tool_user.execute_tool_inputs(**params)
+
+class ToolUserServer:
+    """
+    Runs ToolUser requests on a pool of worker processes, each holding its own pre-warmed copy of the toolset.
+
+    Attributes:
+    -----------
+    - toolset (str): The "module:attribute" path of the toolset, see load_tool_user.
+    - workers (int): The number of worker processes. Default is 4.
+    - max_queue_size (int): How many requests may wait for a free worker before new ones are rejected with ServerBusyError. Default is 64.
+    - tool_user_kwargs (dict, optional): Keyword arguments for ToolUser, used when the toolset is a list of tools.
+    - model_base_url (str, optional): Overrides the model API base URL in the workers.
+    """
+
+    def __init__(self, toolset, workers=4, max_queue_size=64, tool_user_kwargs=None, model_base_url=None):
+        self.toolset = toolset
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.tool_user_kwargs = tool_user_kwargs
+        self.model_base_url = model_base_url
+        self._capacity = threading.BoundedSemaphore(workers + max_queue_size)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._executor = None
+
+    def start(self):
+        """Starts the worker processes and waits until each of them has built its toolset."""
+
+        # spawn rather than fork, so workers never inherit the server's threads or half-initialized clients.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.toolset, self.tool_user_kwargs, self.model_base_url)
+        )
+        for future in [self._executor.submit(_worker_ready) for _ in range(self.workers)]:
+            future.result()
+        return self
+
+    def submit(self, method, params):
+        """Queues a request and returns a Future for its result, or raises ServerBusyError if the queue is full."""
+
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method}, expected one of {METHODS}")
+        if not self._capacity.acquire(blocking=False):
+            raise ServerBusyError(f"All {self.workers} workers are busy and {self.max_queue_size} requests are already queued.")
+        with self._in_flight_lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(_handle_in_worker, method, params)
+        except BaseException:
+            self._request_done(None)
+            raise
+        future.add_done_callback(self._request_done)
+        return future
+
+    def _request_done(self, _future):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+        self._capacity.release()
+
+    def health(self):
+        with self._in_flight_lock:
+            in_flight = self._in_flight
+        return {"status": "ok", "workers": self.workers, "in_flight": in_flight, "max_queue_size": self.max_queue_size}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+def make_http_server(tool_user_server, host="127.0.0.1", port=8080):
+    """Returns a ThreadingHTTPServer exposing tool_user_server. Call serve_forever() on it to start serving."""
+
+    class ToolUserRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/health":
+                self._respond(200, tool_user_server.health())
+            else:
+                self._respond(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            method = self.path.rsplit("/", 1)[-1]
+            if not self.path.startswith("/v1/") or method not in METHODS:
+                self._respond(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except json.JSONDecodeError as e:
+                self._respond(400, {"error": f"Invalid JSON body: {e}"})
+                return
+            try:
+                result = tool_user_server.submit(method, params).result()
+            except ServerBusyError as e:
+                self._respond(503, {"error": str(e)})
+                return
+            except Exception as e:
+                self._respond(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._respond(200, {"result": result})
+
+        def _respond(self, status, body):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 503:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), ToolUserRequestHandler)
+
+def serve_stdio(tool_user_server, input_stream=sys.stdin, output_stream=sys.stdout):
+    """Serves JSON line requests from input_stream until it is closed, writing each response to output_stream as soon as it is ready."""
+
+    output_lock = threading.Lock()
+    responded = [] # One Event per accepted request, set once its response has been written
+
+    def respond(body):
+        with output_lock:
+            output_stream.write(json.dumps(body, default=str) + "\n")
+            output_stream.flush()
+
+    def respond_when_done(request_id, future, done):
+        try:
+            respond({"id": request_id, "result": future.result()})
+        except Exception as e:
+            respond({"id": request_id, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            done.set()
+
+    for line in input_stream:
+        if not line.strip():
+            continue
+        request = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            future = tool_user_server.submit(request["method"], request.get("params", {}))
+        except Exception as e:
+            respond({"id": request.get("id") if isinstance(request, dict) else None, "error": f"{type(e).__name__}: {e}"})
+            continue
+        done = threading.Event()
+        responded.append(done)
+        future.add_done_callback(lambda f, request_id=request_id, done=done: respond_when_done(request_id, f, done))
+
+    # Wait for the responses to be written, not just for the results: done callbacks run after waiters on the future are woken.
+    for done in responded:
+        done.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tool_use_package.serve", description="Serve a toolset behind a local JSON API with a pool of worker processes.")
+    parser.add_argument("--toolset", required=True, help="module:attribute of a list of tools, a ToolUser, or a function returning either.")
+    parser.add_argument("--transport", choices=["http", "stdio"], default="http")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-queue-size", type=int, default=64)
+    parser.add_argument("--model", default="default", help="The model for toolsets given as a list of tools.")
+    parser.add_argument("--model-base-url", default=None, help="Send model requests to this base URL instead, e.g. a local fake endpoint.")
+    args = parser.parse_args(argv)
+
+    with ToolUserServer(args.toolset, workers=args.workers, max_queue_size=args.max_queue_size, tool_user_kwargs={"model": args.model}, model_base_url=args.model_base_url) as tool_user_server:
+        if args.transport == "stdio":
+            serve_stdio(tool_user_server)
+            return
+        http_server = make_http_server(tool_user_server, args.host, args.port)
+        print(f"Serving {args.toolset} with {args.workers} workers on http://{args.host}:{http_server.server_address[1]}", file=sys.stderr)
+        try:
+            http_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            http_server.server_close()
+
+if __name__ == "__main__":
+    main()
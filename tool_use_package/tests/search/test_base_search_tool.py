@@ -0,0 +1,198 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from ...resources import get_tokenizer
+from ...tools.search.base_search_tool import BaseSearchResult, BaseSearchTool, allocate_token_budget
+from ...tools.search.search_cache import SearchResultCache
+from ...tools.search.near_duplicates import MinHasher, remove_near_duplicates
+from ...tools.search.vector_search.embedders.base_embedder import BaseEmbedder, Embedding
+from ...tools.search.vector_search.vector_search_tool import VectorSearchTool
+from ...tools.search.vector_search.vectorstores.base_vector_store import BaseVectorStore
+
+class FakeSearchTool(BaseSearchTool):
+    """Searches a dict of query -> list of (source, content), counting calls."""
+
+    def __init__(self, corpus, barrier=None, **kwargs):
+        super().__init__("search_fake", "Searches a fake corpus.", [{"name": "query", "type": "str", "description": "The query."}, {"name": "n_search_results_to_use", "type": "int", "description": "How many results."}], **kwargs)
+        self.corpus = corpus
+        self.barrier = barrier
+        self.calls = []
+
+    def raw_search(self, query, n_search_results_to_use):
+        self.calls.append(query)
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5) # Only passes if the queries run concurrently
+        return [BaseSearchResult(content=content, source=source) for source, content in self.corpus.get(query, [])[:n_search_results_to_use]]
+
+CORPUS = {
+    "rockets": [("a.com", "Rockets fly."), ("b.com", "Starship is a rocket.")],
+    "starship": [("b.com", "Starship is a rocket."), ("c.com", "Starship launched in 2023.")],
+}
+
+class TestMultiQuerySearch(unittest.TestCase):
+    def test_single_query_is_unchanged(self):
+        tool = FakeSearchTool(CORPUS)
+        self.assertEqual(tool.use_tool("rockets", 1), '\n<search_results>\n<item index="1">\n<source>a.com</source>\n<page_content>\nRockets fly.\n</page_content>\n</item>\n</search_results>')
+
+    def test_queries_run_concurrently_and_merge_by_rank(self):
+        tool = FakeSearchTool(CORPUS, barrier=threading.Barrier(2))
+        result = tool.use_tool('["rockets", "starship"]', 3)
+        self.assertEqual(sorted(tool.calls), ["rockets", "starship"])
+        sources = [line for line in result.splitlines() if line.startswith("<source>")]
+        self.assertEqual(sources, ["<source>a.com</source>", "<source>b.com</source>", "<source>c.com</source>"])
+
+    def test_merged_results_keep_n_search_results_to_use(self):
+        result = FakeSearchTool(CORPUS).use_tool(["rockets", "starship"], 2)
+        sources = [line for line in result.splitlines() if line.startswith("<source>")]
+        self.assertEqual(sources, ["<source>a.com</source>", "<source>b.com</source>"])
+        self.assertEqual(result.count("<search_results>"), 1)
+
+    def test_tokenizer_can_be_assigned(self):
+        class TokenizerSettingTool(FakeSearchTool):
+            def __init__(self, corpus):
+                super().__init__(corpus)
+                self.tokenizer = "custom tokenizer"
+
+        self.assertEqual(TokenizerSettingTool(CORPUS).tokenizer, "custom tokenizer")
+        self.assertIs(FakeSearchTool(CORPUS).tokenizer, get_tokenizer())
+
+    def test_parse_queries(self):
+        self.assertEqual(BaseSearchTool._parse_queries(["a", "b", "a"]), ["a", "b"])
+        self.assertEqual(BaseSearchTool._parse_queries("[not a list"), ["[not a list"])
+        self.assertEqual(BaseSearchTool._parse_queries("[1, 2]"), ["[1, 2]"])
+
+class TestTokenBudget(unittest.TestCase):
+    def test_allocate_token_budget_water_fills(self):
+        self.assertEqual(allocate_token_budget([1000, 10, 1000], 310, [1, 1, 1]), [150, 10, 150])
+        self.assertEqual(allocate_token_budget([1000, 1000], 300, [2, 1]), [200, 100])
+        self.assertEqual(allocate_token_budget([10, 20], 300, [1, 1]), [10, 20])
+
+    def test_results_fit_the_budget_weighted_by_rank(self):
+        corpus = {"q": [("a.com", " ".join(f"word{i}" for i in range(3000))), ("b.com", "A short result."), ("c.com", " ".join(f"term{i}" for i in range(3000)))]}
+        tool = FakeSearchTool(corpus, max_output_tokens=600)
+        result = tool.use_tool("q", 3)
+        tokenizer = get_tokenizer()
+        self.assertLessEqual(len(tokenizer.encode(result).ids), 610)
+        self.assertIn("A short result.", result)
+        first, third = result.split("<page_content>")[1], result.split("<page_content>")[3]
+        self.assertGreater(len(first), len(third))
+
+    def test_results_under_budget_are_unchanged(self):
+        self.assertEqual(FakeSearchTool(CORPUS, max_output_tokens=10000).use_tool("rockets", 2), FakeSearchTool(CORPUS).use_tool("rockets", 2))
+
+class TestNearDuplicates(unittest.TestCase):
+    ARTICLE = " ".join(f"The launch of flight {i} went well and the booster landed on the pad as planned." for i in range(20))
+
+    def test_min_hash_estimates_similarity(self):
+        min_hasher = MinHasher()
+        sketch = min_hasher.sketch(self.ARTICLE)
+        self.assertEqual(MinHasher.similarity(sketch, min_hasher.sketch(self.ARTICLE.upper())), 1.0)
+        self.assertLess(MinHasher.similarity(sketch, min_hasher.sketch("Something else entirely, about cooking pasta at home tonight.")), 0.2)
+        self.assertIsNone(min_hasher.sketch(""))
+
+    def test_syndicated_copies_are_removed(self):
+        corpus = {"launch": [
+            ("news.com", self.ARTICLE),
+            ("other.com", "A different article about rockets, engines, and what comes next for the program."),
+            ("mirror.com", "Syndicated from news.com: " + self.ARTICLE.replace("flight 19", "flight nineteen")),
+            ("empty.com", ""),
+            ("empty2.com", ""),
+        ]}
+        result = FakeSearchTool(corpus).use_tool("launch", 5)
+        self.assertNotIn("mirror.com", result)
+        self.assertIn("other.com", result)
+        self.assertIn("empty2.com", result)
+        self.assertIn("mirror.com", FakeSearchTool(corpus, near_duplicate_threshold=None).use_tool("launch", 5))
+
+    def test_threshold(self):
+        results = [BaseSearchResult(content="one two three four five six seven eight", source="a"), BaseSearchResult(content="one two three four five six nine ten", source="b")]
+        self.assertEqual(len(remove_near_duplicates(results, threshold=0.9)), 2)
+        self.assertEqual(len(remove_near_duplicates(results, threshold=0.1)), 1)
+
+class TestSearchResultCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "search_cache.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, **kwargs):
+        return SearchResultCache(path=self.path, clock=lambda: self.now, **kwargs)
+
+    def test_repeated_searches_hit_memory_then_disk_after_restart(self):
+        cache = self.make_cache()
+        tool = FakeSearchTool(CORPUS, search_cache=cache)
+        first = tool.use_tool("rockets", 2)
+        self.assertEqual(tool.use_tool("  Rockets ", 2), first)
+        self.assertEqual(tool.use_tool("rockets", 1).count("<item"), 1) # Fewer results are served from the same entry
+        self.assertEqual(tool.calls, ["rockets"])
+        self.assertEqual(cache.stats()["memory_hits"], 2)
+        cache.close()
+
+        restarted_cache = self.make_cache()
+        restarted_tool = FakeSearchTool(CORPUS, search_cache=restarted_cache)
+        self.assertEqual(restarted_tool.use_tool("rockets", 2), first)
+        self.assertEqual(restarted_tool.calls, [])
+        self.assertEqual(restarted_cache.stats()["disk_hits"], 1)
+        restarted_cache.close()
+
+    def test_only_missing_queries_are_searched(self):
+        tool = FakeSearchTool(CORPUS, search_cache=SearchResultCache())
+        tool.use_tool("rockets", 2)
+        tool.use_tool(["rockets", "starship"], 2)
+        self.assertEqual(tool.calls, ["rockets", "starship"])
+
+    def test_vector_tools_over_different_stores_do_not_share_results(self):
+        class FakeEmbedder(BaseEmbedder):
+            def embed(self, text):
+                return Embedding([0.0], text)
+
+            def embed_batch(self, texts):
+                return [self.embed(text) for text in texts]
+
+        class FakeVectorStore(BaseVectorStore):
+            def __init__(self, source):
+                self.source = source
+
+            def upsert(self, embeddings):
+                pass
+
+            def query(self, query_embedding, n_search_results_to_use=10):
+                return [BaseSearchResult(content=f"From {self.source}.", source=self.source)]
+
+        cache = SearchResultCache()
+        embedder = FakeEmbedder()
+        parameters = FakeSearchTool(CORPUS).parameters
+        first, second = (VectorSearchTool("search_vectors", "Searches vectors.", parameters, FakeVectorStore(source), embedder, search_cache=cache) for source in ("a.com", "b.com"))
+        self.assertIn("a.com", first.use_tool("q", 1))
+        self.assertIn("b.com", second.use_tool("q", 1))
+        self.assertNotEqual(first.cache_namespace, second.cache_namespace)
+
+    def test_entries_expire_by_backend_ttl(self):
+        cache = self.make_cache(ttls={"fakesearchtool": 60})
+        tool = FakeSearchTool(CORPUS, search_cache=cache)
+        tool.use_tool("rockets", 2)
+        self.now += 59
+        tool.use_tool("rockets", 2)
+        self.now += 2
+        tool.use_tool("rockets", 2)
+        self.assertEqual(tool.calls, ["rockets", "rockets"])
+        cache.close()
+
+    def test_disk_tier_evicts_least_recently_used(self):
+        cache = self.make_cache(max_disk_bytes=300, max_memory_entries=1)
+        results = [BaseSearchResult(content="x" * 100, source="a.com")]
+        for i in range(5):
+            self.now += 1
+            cache.put("fake:", f"query {i}", 1, results)
+        self.assertLessEqual(cache.stats()["disk_bytes"], 300)
+        self.assertIsNone(cache.get("fake:", "query 0", 1))
+        self.assertIsNotNone(cache.get("fake:", "query 4", 1))
+        cache.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from ...background_loop import get_background_loop
+from ...circuit_breaker import CircuitBreaker, get_circuit_breaker
+from ...tools.search.brave_search_tool import BraveAPI, BraveAPIError, BraveRateLimitError
+
+class FakeBraveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    queries = []
+    delay = 0.0
+    status = 200
+    body = None
+    rate_limit_headers = {}
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)["q"][0]
+        self.queries.append(query)
+        time.sleep(self.delay)
+        body = self.body if self.body is not None else json.dumps({"query": {"original": query}}).encode() if self.status == 200 else b"Invalid subscription token"
+        self.send_response(self.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in self.rate_limit_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestBraveAPI(unittest.TestCase):
+    def setUp(self):
+        FakeBraveHandler.queries = []
+        FakeBraveHandler.delay = 0.0
+        FakeBraveHandler.status = 200
+        FakeBraveHandler.body = None
+        FakeBraveHandler.rate_limit_headers = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBraveHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/search"
+        self.apis = []
+        self.api = self.make_api()
+        get_circuit_breaker("brave_api").reset()
+
+    def tearDown(self):
+        for api in self.apis:
+            get_background_loop().run(api.close())
+        self.server.shutdown()
+        self.server.server_close()
+        get_circuit_breaker("brave_api").reset()
+
+    def make_api(self, **kwargs):
+        api = BraveAPI("key", url=self.url, **{"requests_per_second": 100, **kwargs})
+        self.apis.append(api)
+        return api
+
+    def search_all(self, queries):
+        async def search_all():
+            return await asyncio.gather(*(self.api.search_async(query) for query in queries))
+        return get_background_loop().run(search_all())
+
+    def test_identical_in_flight_queries_share_a_request(self):
+        FakeBraveHandler.delay = 0.2
+        responses = self.search_all(["q", "q", "other", "q"])
+        self.assertEqual([response["query"]["original"] for response in responses], ["q", "q", "other", "q"])
+        self.assertEqual(sorted(FakeBraveHandler.queries), ["other", "q"])
+
+    def test_requests_are_rate_limited(self):
+        self.api = self.make_api(requests_per_second=4)
+        start = time.monotonic()
+        self.search_all([f"q{i}" for i in range(6)])
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+
+    def test_exhausted_quota_fails_fast(self):
+        FakeBraveHandler.rate_limit_headers = {"X-RateLimit-Limit": "100, 2000", "X-RateLimit-Remaining": "99, 0", "X-RateLimit-Reset": "1, 86400"}
+        self.api.search("q")
+        with self.assertRaises(BraveRateLimitError):
+            self.api.search("other")
+
+    def test_errors_are_raised(self):
+        FakeBraveHandler.status = 422
+        with self.assertRaisesRegex(BraveAPIError, "422"):
+            self.api.search("q")
+        self.assertEqual(len(FakeBraveHandler.queries), 1)
+
+        FakeBraveHandler.status = 503
+        self.api = self.make_api(max_retries=1)
+        with self.assertRaisesRegex(BraveAPIError, "503"):
+            self.api.search("q")
+        self.assertEqual(len(FakeBraveHandler.queries), 3)
+
+    def test_invalid_json_counts_as_a_failure(self):
+        now = [0.0]
+        self.api = self.make_api(max_retries=0)
+        self.api.circuit_breaker = breaker = CircuitBreaker("brave_api_test", minimum_calls=1, recovery_timeout=30, clock=lambda: now[0])
+        FakeBraveHandler.body = b"{not json"
+        with self.assertRaises(BraveAPIError):
+            self.api.search("q")
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # The half-open probe fails the same way, and must give its slot back so the breaker can recover.
+        now[0] += 30
+        with self.assertRaises(BraveAPIError):
+            self.api.search("q")
+        now[0] += 30
+        FakeBraveHandler.body = None
+        self.assertEqual(self.api.search("q")["query"]["original"], "q")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+if __name__ == "__main__":
+    unittest.main()
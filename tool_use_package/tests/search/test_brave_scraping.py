@@ -0,0 +1,213 @@
+import copy
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ...background_loop import get_background_loop
+from ...tools.search.brave_search_tool import BraveSearchTool
+from ...tools.search.page_cache import PageCache
+from ...tools.search.search_cache import SearchResultCache
+from ...tools.search.web_fetcher import WebPageFetcher
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    pages = {
+        "/fast": ("text/html; charset=utf-8", "<html><body><p>Fast page content.</p></body></html>"),
+        "/slow": ("text/html; charset=utf-8", "<html><body><p>Slow page content.</p></body></html>"),
+        "/plain": ("text/plain", "Plain <b>text</b>."),
+        "/report.pdf": ("application/pdf", "%PDF-1.4 not a web page"),
+        "/big": ("text/html", "<html><body>" + "<p>Paragraph.</p>" * 100000 + "</body></html>"),
+    }
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(1.5)
+        content_type, page = self.pages.get(self.path, ("text/html", None))
+        body = (page or "Not found").encode()
+        self.send_response(200 if page else 404)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class RevalidatingPageHandler(PageHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        cache_control = "no-store" if self.path == "/private" else "max-age=60"
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            # /revoked stops letting clients store it after its first response.
+            self.send_header("Cache-Control", "no-store" if self.path == "/revoked" else cache_control)
+            self.end_headers()
+            return
+        body = b"<html><body><p>Cacheable page.</p></body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeBraveAPI:
+    def __init__(self, search_response):
+        self.search_response = search_response
+        self.queries = []
+
+    def search(self, query):
+        self.queries.append(query)
+        return copy.deepcopy(self.search_response) # raw_search pops items off the response
+
+class BraveScrapingTestCase(unittest.TestCase):
+    """Runs BraveSearchTool against a local web server, with the Brave API itself faked."""
+
+    handler = PageHandler
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tool = self.make_tool()
+
+    def tearDown(self):
+        self.tool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_tool(self, **kwargs):
+        tool = BraveSearchTool(brave_api_key="key", truncate_to_n_tokens=None, **kwargs)
+        tool.api = FakeBraveAPI(self.search_response(["/fast", "/slow", "/missing"]))
+        return tool
+
+    def search_response(self, paths):
+        return {
+            "mixed": {"main": [{"type": "web"} for _ in paths]},
+            "web": {"results": [{"url": f"{self.base_url}{path}", "title": path, "description": f"Description of {path}."} for path in paths]}
+        }
+
+class TestBraveScraping(BraveScrapingTestCase):
+    def make_tool(self, **kwargs):
+        return super().make_tool(scrape_deadline=0.5, **kwargs)
+
+    def test_pages_past_the_deadline_fall_back_to_their_description(self):
+        start = time.monotonic()
+        results = self.tool.raw_search("q", 3)
+        self.assertLess(time.monotonic() - start, 1.4)
+        self.assertIn("Web Page Content: Fast page content.", results[0].content)
+        self.assertTrue(results[1].content.endswith("Web Page Description: Description of /slow."))
+        self.assertTrue(results[2].content.endswith("Web Page Description: Description of /missing."))
+
+    def test_searches_with_unscraped_pages_are_cached_briefly(self):
+        now = [1000.0]
+        self.tool.search_cache = SearchResultCache(clock=lambda: now[0])
+        self.tool.api = FakeBraveAPI(self.search_response(["/fast", "/slow"]))
+        self.tool.use_tool("slow", 2)
+        now[0] += 59
+        self.tool.use_tool("slow", 2)
+        now[0] += 2
+        self.tool.use_tool("slow", 2)
+        self.assertEqual(self.tool.api.queries, ["slow", "slow"])
+
+        self.tool.api = FakeBraveAPI(self.search_response(["/fast"]))
+        self.tool.use_tool("fast", 1)
+        now[0] += 61
+        self.tool.use_tool("fast", 1)
+        self.assertEqual(self.tool.api.queries, ["fast"])
+
+    def test_session_is_reused_across_searches(self):
+        self.tool.raw_search("q", 1)
+        session = self.tool.page_fetcher._session
+        self.tool.raw_search("q", 1)
+        self.assertIs(self.tool.page_fetcher._session, session)
+        self.assertFalse(session.closed)
+
+class TestWebPageFetcher(BraveScrapingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fetcher = WebPageFetcher(max_page_bytes=1000)
+
+    def tearDown(self):
+        get_background_loop().run(self.fetcher.close())
+        super().tearDown()
+
+    def fetch(self, path):
+        return get_background_loop().run(self.fetcher.fetch_text(self.base_url + path))
+
+    def test_html_is_reduced_to_text(self):
+        self.assertEqual(self.fetch("/fast"), "Fast page content.")
+
+    def test_plain_text_is_returned_as_is(self):
+        self.assertEqual(self.fetch("/plain"), "Plain <b>text</b>.")
+
+    def test_other_content_types_are_skipped(self):
+        self.assertIsNone(self.fetch("/report.pdf"))
+
+    def test_extraction_runs_off_the_event_loop(self):
+        threads = []
+        self.fetcher.extractor = lambda html: threads.append(threading.current_thread()) or "extracted"
+        self.assertEqual(self.fetch("/fast"), "extracted")
+        self.assertIsNot(threads[0], get_background_loop()._thread)
+
+    def test_long_pages_are_cut_off(self):
+        text = self.fetch("/big")
+        self.assertTrue(text.startswith("Paragraph.\nParagraph."))
+        self.assertLessEqual(text.count("Paragraph."), 1000 // len("<p>Paragraph.</p>"))
+        # The connection left mid-body was dropped, so the next fetch still works.
+        self.assertEqual(self.fetch("/fast"), "Fast page content.")
+
+class TestPageCaching(BraveScrapingTestCase):
+    handler = RevalidatingPageHandler
+
+    def setUp(self):
+        self.now = 1000.0
+        self.directory = tempfile.TemporaryDirectory()
+        self.page_cache = PageCache(os.path.join(self.directory.name, "pages.db"), clock=lambda: self.now)
+        RevalidatingPageHandler.requests = []
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.page_cache.close()
+        self.directory.cleanup()
+
+    def make_tool(self, **kwargs):
+        return super().make_tool(page_cache=self.page_cache, **kwargs)
+
+    def fetch(self, path):
+        return get_background_loop().run(self.tool.page_fetcher.fetch_text(self.base_url + path))
+
+    def test_fresh_pages_are_served_from_the_cache_and_stale_ones_revalidated(self):
+        self.assertEqual(self.fetch("/page"), "Cacheable page.")
+        self.assertEqual(self.fetch("/page"), "Cacheable page.")
+        self.assertEqual(RevalidatingPageHandler.requests, [("/page", None)])
+
+        self.now += 61
+        self.assertEqual(self.fetch("/page"), "Cacheable page.")
+        self.assertEqual(RevalidatingPageHandler.requests[1:], [("/page", '"v1"')])
+        self.assertEqual(self.fetch("/page"), "Cacheable page.")
+        self.assertEqual(len(RevalidatingPageHandler.requests), 2)
+        self.assertEqual(self.page_cache.stats()["revalidated"], 1)
+
+    def test_no_store_pages_are_not_cached(self):
+        self.fetch("/private")
+        self.fetch("/private")
+        self.assertEqual(RevalidatingPageHandler.requests, [("/private", None), ("/private", None)])
+
+    def test_pages_revalidated_as_no_store_are_dropped(self):
+        self.fetch("/revoked")
+        self.now += 61
+        self.assertEqual(self.fetch("/revoked"), "Cacheable page.")
+        self.assertEqual(self.fetch("/revoked"), "Cacheable page.")
+        self.assertEqual(RevalidatingPageHandler.requests, [("/revoked", None), ("/revoked", '"v1"'), ("/revoked", None)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+
+from ...tools.search.base_search_tool import BaseSearchResult
+from ...tools.search.federated_search_tool import FederatedSearchTool
+from .test_base_search_tool import FakeSearchTool
+
+PARAMETERS = [{"name": "query", "type": "str", "description": "The query."}, {"name": "n_search_results_to_use", "type": "int", "description": "How many results."}]
+
+class SlowSearchTool(FakeSearchTool):
+    def __init__(self, corpus, delay, name, fail=False):
+        super().__init__(corpus)
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+
+    def raw_search(self, query, n_search_results_to_use):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("backend down")
+        return super().raw_search(query, n_search_results_to_use)
+
+class TestFederatedSearchTool(unittest.TestCase):
+    def test_reciprocal_rank_fusion(self):
+        a, b, c = (BaseSearchResult(content=name, source=f"{name}.com") for name in "abc")
+        fused = FederatedSearchTool.reciprocal_rank_fusion([[a, b], [c, b], [b]])
+        self.assertEqual([result.source for result in fused], ["b.com", "a.com", "c.com"])
+
+    def test_slow_and_failing_children_are_left_out(self):
+        children = [
+            SlowSearchTool({"q": [("es.com", "From Elasticsearch."), ("shared.com", "Shared page.")]}, 0.0, "search_elasticsearch"),
+            SlowSearchTool({"q": [("shared.com", "Shared page."), ("web.com", "From the web.")]}, 0.05, "search_web"),
+            SlowSearchTool({"q": [("slow.com", "Too slow.")]}, 2.0, "search_slow"),
+            SlowSearchTool({"q": [("down.com", "Never seen.")]}, 0.0, "search_down", fail=True),
+        ]
+        tool = FederatedSearchTool("search_everything", "Searches every backend.", PARAMETERS, children, timeout=1, child_timeouts={"search_slow": 0.3})
+
+        start = time.monotonic()
+        result = tool.use_tool("q", 3)
+        self.assertLess(time.monotonic() - start, 1)
+        sources = [line for line in result.splitlines() if line.startswith("<source>")]
+        self.assertEqual(sources, ["<source>shared.com</source>", "<source>es.com</source>", "<source>web.com</source>"])
+
+    def test_hung_children_do_not_pile_up_threads(self):
+        children = [
+            SlowSearchTool({"q": [("es.com", "From Elasticsearch.")]}, 0.0, "search_elasticsearch"),
+            SlowSearchTool({"q": [("hung.com", "Never arrives.")]}, 1.0, "search_hung"),
+        ]
+        tool = FederatedSearchTool("search_everything", "Searches every backend.", PARAMETERS, children, timeout=0.05, max_concurrent_queries=1)
+        threads_before = threading.active_count()
+        for _ in range(5):
+            self.assertIn("es.com", tool.use_tool("q", 1))
+        self.assertLessEqual(threading.active_count() - threads_before, 2)
+        tool.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from ...tools.search.html_extractors import HTML_EXTRACTORS, _is_installed, extract_text_bs4, get_html_extractor
+
+PAGE = """<!DOCTYPE html><html><head><title>Title &amp; more</title><style>p { color: red; }</style><script>var tracking = 1;</script></head>
+<body><nav><a href="/">Home</a></nav><!-- a comment --><h1>Heading</h1><p>Some <b>bold</b> text.</p><footer>Copyright</footer></body></html>"""
+
+XHTML_PAGE = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml"><head><title>XHTML</title></head><body><p>Before<nav>Menu</nav>after <!-- note -->the menu.</p></body></html>"""
+
+class TestHTMLExtractors(unittest.TestCase):
+    def test_boilerplate_is_stripped(self):
+        self.assertEqual(extract_text_bs4(PAGE), "Title & more\nHeading\nSome\nbold\ntext.")
+
+    def test_xhtml(self):
+        self.assertEqual(extract_text_bs4(XHTML_PAGE), "XHTML\nBefore\nafter\nthe menu.")
+
+    def test_installed_extractors_agree(self):
+        fast_extractors = [name for name in HTML_EXTRACTORS if name != "bs4" and _is_installed(name)]
+        if not fast_extractors:
+            self.skipTest("Neither selectolax nor lxml is installed, so there is nothing to compare bs4 with.")
+        for name in fast_extractors:
+            with self.subTest(extractor=name):
+                for page in (PAGE, XHTML_PAGE, "<p>a<nav>x</nav>tail</p>", ""):
+                    self.assertEqual(HTML_EXTRACTORS[name](page), extract_text_bs4(page))
+
+    def test_get_html_extractor(self):
+        self.assertIn(get_html_extractor(), HTML_EXTRACTORS.values())
+        self.assertIs(get_html_extractor("bs4"), extract_text_bs4)
+        with self.assertRaises(ValueError):
+            get_html_extractor("regex")
+
+if __name__ == "__main__":
+    unittest.main()
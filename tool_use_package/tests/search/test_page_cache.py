@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+from ...tools.search.page_cache import PageCache, freshness_lifetime
+
+class TestFreshnessLifetime(unittest.TestCase):
+    def lifetime(self, **headers):
+        return freshness_lifetime({name.replace("_", "-"): value for name, value in headers.items()}, default_ttl=3600, max_ttl=86400)
+
+    def test_cache_control(self):
+        self.assertEqual(self.lifetime(Cache_Control="public, max-age=600"), 600)
+        self.assertEqual(self.lifetime(Cache_Control="max-age=31536000"), 86400)
+        self.assertEqual(self.lifetime(Cache_Control="no-cache"), 0)
+        self.assertIsNone(self.lifetime(Cache_Control="private, no-store"))
+
+    def test_expires(self):
+        self.assertEqual(self.lifetime(Date="Mon, 01 Jan 2024 00:00:00 GMT", Expires="Mon, 01 Jan 2024 00:05:00 GMT"), 300)
+        self.assertEqual(self.lifetime(Date="Mon, 01 Jan 2024 00:00:00 GMT", Expires="0"), 0)
+
+    def test_heuristic_freshness(self):
+        self.assertEqual(self.lifetime(Date="Mon, 01 Jan 2024 01:40:00 GMT", Last_Modified="Mon, 01 Jan 2024 00:00:00 GMT"), 600)
+        self.assertEqual(self.lifetime(Date="Mon, 01 Jan 2024 00:00:00 GMT", Last_Modified="Mon, 01 Jan 2023 00:00:00 GMT"), 3600)
+        self.assertEqual(self.lifetime(), 3600)
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "pages.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, **kwargs):
+        return PageCache(self.path, clock=lambda: self.now, **kwargs)
+
+    def test_pages_go_stale_and_are_refreshed(self):
+        cache = self.make_cache()
+        cache.put("https://a.com", "Text", {"Cache-Control": "max-age=60", "ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+        self.assertTrue(cache.get("https://a.com").fresh)
+
+        self.now += 61
+        page = cache.get("https://a.com")
+        self.assertFalse(page.fresh)
+        self.assertEqual(page.conditional_headers(), {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+        cache.refresh("https://a.com", {"Cache-Control": "max-age=60", "ETag": '"v2"'})
+        page = cache.get("https://a.com")
+        self.assertTrue(page.fresh)
+        self.assertEqual((page.etag, page.last_modified), ('"v2"', "Mon, 01 Jan 2024 00:00:00 GMT"))
+        self.assertIsNone(cache.get("https://b.com"))
+        self.assertEqual(cache.stats()["fresh_hits"], 2)
+        cache.close()
+
+    def test_no_store_on_revalidation_drops_the_page(self):
+        cache = self.make_cache()
+        cache.put("https://a.com", "Text", {"Cache-Control": "max-age=60", "ETag": '"v1"'})
+        self.now += 61
+        cache.refresh("https://a.com", {"Cache-Control": "no-store"})
+        self.assertIsNone(cache.get("https://a.com"))
+        self.assertEqual(cache.stats()["disk_bytes"], 0)
+        cache.close()
+
+    def test_survives_restarts_and_evicts_least_recently_used(self):
+        cache = self.make_cache(max_disk_bytes=250)
+        for i in range(3):
+            self.now += 1
+            cache.put(f"https://{i}.com", "x" * 100, {})
+        cache.close()
+
+        restarted = self.make_cache(max_disk_bytes=250)
+        self.assertIsNone(restarted.get("https://0.com"))
+        self.assertEqual(restarted.get("https://2.com").text, "x" * 100)
+        self.assertEqual(restarted.stats()["disk_bytes"], 200)
+        restarted.close()
+
+if __name__ == "__main__":
+    unittest.main()
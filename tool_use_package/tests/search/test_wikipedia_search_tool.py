@@ -0,0 +1,51 @@
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from ...tools.search import wikipedia_search_tool
+from ...tools.search.wikipedia_search_tool import WikipediaSearchTool
+
+TITLES = ["Odyssey", "Odysseus", "Homer", "Iliad", "Ithaca", "Penelope"]
+
+class FakeWikipedia:
+    """Stands in for the wikipedia package: every page takes delay seconds to load, or delays[title], and the titles in failing raise."""
+
+    def __init__(self, delay=0.1, delays=None, failing=()):
+        self.delay = delay
+        self.delays = delays or {}
+        self.failing = failing
+
+    def search(self, query):
+        return TITLES
+
+    def page(self, title):
+        time.sleep(self.delays.get(title, self.delay))
+        if title in self.failing:
+            raise ConnectionError(f"{title} failed to load")
+        return SimpleNamespace(content=f"The {title} page.", url=f"https://en.wikipedia.org/wiki/{title}")
+
+class TestWikipediaSearchTool(unittest.TestCase):
+    def search(self, fake_wikipedia, n_search_results_to_use, **kwargs):
+        tool = WikipediaSearchTool(truncate_to_n_tokens=None, **kwargs)
+        with mock.patch.object(wikipedia_search_tool, "wikipedia", fake_wikipedia):
+            start = time.monotonic()
+            results = tool.raw_search("odyssey", n_search_results_to_use)
+        return [result.source.rsplit("/", 1)[1] for result in results], time.monotonic() - start
+
+    def test_pages_are_fetched_concurrently_in_order(self):
+        titles, elapsed = self.search(FakeWikipedia(delay=0.2, delays={"Odyssey": 0.4}), 4)
+        self.assertEqual(titles, ["Odyssey", "Odysseus", "Homer", "Iliad"])
+        self.assertLess(elapsed, 0.6)
+
+    def test_failed_and_slow_pages_are_replaced_by_the_next_titles(self):
+        titles, elapsed = self.search(FakeWikipedia(failing=["Odysseus"], delays={"Homer": 5}), 3, page_timeout=0.3)
+        self.assertEqual(titles, ["Odyssey", "Iliad", "Ithaca"])
+        self.assertLess(elapsed, 1)
+
+    def test_parallelism_is_bounded(self):
+        _, elapsed = self.search(FakeWikipedia(delay=0.2), 4, max_concurrent_pages=2)
+        self.assertGreaterEqual(elapsed, 0.4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+
+from ..circuit_breaker import CircuitBreaker, CircuitBreakerOpenError, get_circuit_breaker, circuit_breaker_states
+from ..tool_user import ToolUser
+from ..tools.base_tool import BaseTool
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def fail():
+    raise ConnectionError("backend down")
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker("test_backend", failure_rate_threshold=0.5, minimum_calls=4, window_size=10, recovery_timeout=30, clock=self.clock)
+
+    def trip(self):
+        for _ in range(4):
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(fail)
+
+    def test_opens_after_failure_rate_exceeded(self):
+        self.trip()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitBreakerOpenError):
+            self.breaker.call(lambda: 1)
+
+    def test_stays_closed_below_failure_rate(self):
+        for _ in range(3):
+            self.breaker.call(lambda: 1)
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(fail)
+            self.breaker.call(lambda: 1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_success_closes(self):
+        self.trip()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_failure_reopens(self):
+        self.trip()
+        self.clock.now += 30
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(fail)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.stats()["retry_after"], 30)
+
+    def test_half_open_rejection_reports_recovery_time(self):
+        self.trip()
+        self.clock.now += 30
+        with self.breaker.guard():
+            with self.assertRaises(CircuitBreakerOpenError) as context:
+                self.breaker.call(lambda: 1)
+        self.assertEqual(context.exception.retry_after, 30)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_probe_failing_fast_on_a_nested_breaker_frees_the_probe_slot(self):
+        inner = CircuitBreaker("inner_backend", minimum_calls=1, recovery_timeout=1000, clock=self.clock)
+        with self.assertRaises(ConnectionError):
+            inner.call(fail)
+        self.trip()
+        self.clock.now += 30
+        with self.assertRaises(CircuitBreakerOpenError) as context:
+            with self.breaker.guard():
+                inner.call(lambda: 1)
+        self.assertEqual(context.exception.breaker_name, "inner_backend")
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_interrupted_probe_frees_the_probe_slot(self):
+        self.trip()
+        self.clock.now += 30
+        with self.assertRaises(KeyboardInterrupt):
+            with self.breaker.guard():
+                raise KeyboardInterrupt()
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+
+    def test_registry_shares_breakers(self):
+        breaker = get_circuit_breaker("shared_test_backend")
+        self.assertIs(breaker, get_circuit_breaker("shared_test_backend"))
+        self.assertEqual(circuit_breaker_states()["shared_test_backend"]["state"], CircuitBreaker.CLOSED)
+
+class TestToolUserCircuitBreaker(unittest.TestCase):
+    def test_open_breaker_error_injected_back_to_claude(self):
+        class FlakyTool(BaseTool):
+            def use_tool(self, query):
+                raise ConnectionError("backend down")
+
+        breaker = CircuitBreaker("flaky_tool", minimum_calls=1)
+        tool = FlakyTool("flaky", "A flaky tool.", [{"name": "query", "type": "str", "description": "The query."}], circuit_breaker=breaker)
+        tool_user = ToolUser([tool])
+        completion = "<function_calls><invoke><tool_name>flaky</tool_name><parameters><query>hi</query></parameters></invoke></function_calls>"
+
+        with self.assertRaises(ConnectionError):
+            tool_user._parse_function_calls(completion, True)
+        parsed = tool_user._parse_function_calls(completion, True)
+        self.assertEqual(parsed["status"], "ERROR")
+        self.assertIn("flaky_tool backend is currently unavailable", parsed["message"])
+
+    def test_streamed_output_counts_against_the_breaker(self):
+        class StreamingTool(BaseTool):
+            def use_tool(self, fail):
+                yield "partial "
+                if fail:
+                    raise ConnectionError("backend down mid-stream")
+                yield "output"
+
+        breaker = CircuitBreaker("streaming_tool", minimum_calls=2, failure_rate_threshold=0.5)
+        tool = StreamingTool("stream", "Streams output.", [{"name": "fail", "type": "bool", "description": "Whether to fail."}], circuit_breaker=breaker)
+        tool_user = ToolUser([tool])
+
+        self.assertEqual(tool_user._use_tool(tool, {"fail": False}), "partial output")
+        self.assertEqual(breaker.stats()["calls_in_window"], 1)
+        with self.assertRaises(ConnectionError):
+            tool_user._use_tool(tool, {"fail": True})
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+if __name__ == "__main__":
+    unittest.main()
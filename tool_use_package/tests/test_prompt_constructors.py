@@ -1,12 +1,15 @@
 import unittest
+from unittest.mock import patch
 
+from .. import prompt_constructors
 from ..prompt_constructors import (
     construct_use_tools_prompt,
     construct_successful_function_run_injection_prompt,
     construct_error_function_run_injection_prompt,
     construct_format_tool_for_claude_prompt,
     construct_format_sql_tool_for_claude_prompt,
-    construct_prompt_from_messages
+    construct_prompt_from_messages,
+    PromptRenderer
 )
 from .prompts import (
     test_use_tools_prompt,
@@ -51,5 +54,66 @@ class TestPromptConstructors(unittest.TestCase):
         tool_db_dialect = 'SQLite'
         self.assertEqual(construct_format_sql_tool_for_claude_prompt(tool_name, tool_description, tool_parameters, tool_db_schema, tool_db_dialect), test_format_sql_tool_for_claude_prompt)
 
+class TestPromptRenderer(unittest.TestCase):
+    def setUp(self):
+        self.messages = [
+            {"role": "user", "content": "If Maggie has 3 apples and eats 1, how many apples does maggie have left?"},
+            {"role": "tool_inputs", "content": "Let's think this through.", "tool_inputs": [{"tool_name": "perform_subtraction", "tool_arguments": {"a": 3, "b": 1}}]},
+            {"role": "tool_outputs", "tool_outputs": [{"tool_name": "perform_subtraction", "tool_result": 2}], "tool_error": None},
+            {"role": "assistant", "content": "Maggie has 2 apples left."},
+            {"role": "user", "content": "And if she eats another?"},
+            {"role": "user", "content": "Please use your tools."},
+            {"role": "tool_inputs", "content": "", "tool_inputs": [{"tool_name": "perform_subtraction", "tool_arguments": {"a": 2, "b": 1}}]},
+            {"role": "tool_outputs", "tool_outputs": None, "tool_error": "Something went wrong."}
+        ]
+
+    def test_incremental_render_matches_full_render(self):
+        renderer = PromptRenderer()
+        for i in range(1, len(self.messages) + 1):
+            self.assertEqual(renderer.render(self.messages[:i]), construct_prompt_from_messages(self.messages[:i]))
+
+    def test_only_new_messages_validated(self):
+        renderer = PromptRenderer()
+        renderer.render(self.messages[:3])
+        with self.assertRaises(ValueError):
+            renderer.render(self.messages[:3] + [{"role": "robot", "content": "Beep."}])
+
+    def test_changed_messages_rerendered(self):
+        renderer = PromptRenderer()
+        renderer.render(self.messages)
+        edited = [dict(message) for message in self.messages]
+        edited[3]["content"] = "Maggie has two apples left."
+        self.assertEqual(renderer.render(edited), construct_prompt_from_messages(edited))
+        self.messages[0]["content"] = "Hi Claude."
+        self.assertEqual(renderer.render(self.messages), construct_prompt_from_messages(self.messages))
+        self.assertEqual(renderer.render(self.messages[:2]), construct_prompt_from_messages(self.messages[:2]))
+
+    def test_nested_edits_rerendered(self):
+        renderer = PromptRenderer()
+        renderer.render(self.messages[:3])
+        self.messages[1]["tool_inputs"][0]["tool_arguments"]["a"] = 4
+        self.assertEqual(renderer.render(self.messages[:3]), construct_prompt_from_messages(self.messages[:3]))
+
+    def test_interleaved_conversations_reuse_their_prefixes(self):
+        renderer = PromptRenderer()
+        other = [{"role": "user", "content": "What is 2 + 2?"}, {"role": "assistant", "content": "4."}, {"role": "user", "content": "And 3 + 3?"}]
+        expected = [(construct_prompt_from_messages(self.messages[:i]), construct_prompt_from_messages(other[:i])) for i in range(1, len(other) + 1)]
+        with patch.object(prompt_constructors, "construct_message_prompt", wraps=prompt_constructors.construct_message_prompt) as render_message:
+            for i in range(1, len(other) + 1):
+                self.assertEqual((renderer.render(self.messages[:i]), renderer.render(other[:i])), expected[i-1])
+            self.assertEqual(render_message.call_count, 2 * len(other))
+
+    def test_least_recently_used_conversations_are_dropped(self):
+        renderer = PromptRenderer(max_conversations=2)
+        conversations = [[{"role": "user", "content": f"Question {i}?"}] for i in range(3)]
+        for conversation in conversations:
+            renderer.render(conversation)
+        with patch.object(prompt_constructors, "construct_message_prompt", wraps=prompt_constructors.construct_message_prompt) as render_message:
+            renderer.render(conversations[2])
+            renderer.render(conversations[1])
+            self.assertEqual(render_message.call_count, 0)
+            renderer.render(conversations[0])
+            self.assertEqual(render_message.call_count, 1)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+
+from ..rate_limiter import TokenBucket, RateLimitScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTokenBucket(unittest.TestCase):
+    def test_acquire_and_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, period=60, clock=clock)
+        self.assertEqual(bucket.try_acquire(60), 0)
+        self.assertEqual(bucket.try_acquire(10), 10)
+        clock.now += 10
+        self.assertEqual(bucket.try_acquire(10), 0)
+
+    def test_update_from_server(self):
+        bucket = TokenBucket(100, clock=FakeClock())
+        bucket.update(capacity=50, remaining=5)
+        self.assertEqual(bucket.capacity, 50)
+        self.assertEqual(bucket.wait_time(5), 0)
+        self.assertGreater(bucket.wait_time(6), 0)
+
+class TestRateLimitScheduler(unittest.TestCase):
+    def test_unlimited_until_headers_arrive(self):
+        scheduler = RateLimitScheduler()
+        with scheduler.request(1000, 1000):
+            pass
+        self.assertEqual(scheduler.stats()["limits"], {})
+        scheduler.update_from_headers({"anthropic-ratelimit-requests-limit": "50", "anthropic-ratelimit-requests-remaining": "3", "anthropic-ratelimit-output-tokens-limit": "8000"})
+        self.assertEqual(scheduler.stats()["limits"], {"requests": 50, "output_tokens": 8000})
+
+    def test_unused_output_tokens_refunded(self):
+        clock = FakeClock()
+        scheduler = RateLimitScheduler(output_tokens_per_minute=1000, clock=clock)
+        with scheduler.request(10, 1000) as reservation:
+            reservation.record_usage(10, 100)
+        self.assertEqual(scheduler.wait_time(10, 900), 0)
+        self.assertGreater(scheduler.wait_time(10, 1000), 0)
+
+    def test_failed_call_refunds_its_reservation(self):
+        scheduler = RateLimitScheduler(input_tokens_per_minute=1000, output_tokens_per_minute=1000, clock=FakeClock())
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                with scheduler.request(500, 1000):
+                    raise ConnectionError("connection reset")
+        self.assertEqual(scheduler.wait_time(500, 1000), 0)
+
+    def test_rate_limited_call_keeps_its_charge(self):
+        class RateLimitError(Exception):
+            response = type("Response", (), {"status_code": 429, "headers": {}})()
+
+        scheduler = RateLimitScheduler(output_tokens_per_minute=1000, clock=FakeClock())
+        with self.assertRaises(RateLimitError):
+            with scheduler.request(10, 1000):
+                raise RateLimitError()
+        self.assertEqual(scheduler.wait_time(10, 1000), 60)
+
+    def test_retry_after_pauses_requests(self):
+        scheduler = RateLimitScheduler()
+        scheduler.update_from_headers({"retry-after": "0.2"})
+        start = time.monotonic()
+        with scheduler.request(1, 1):
+            pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_interactive_requests_scheduled_before_batch(self):
+        scheduler = RateLimitScheduler(requests_per_minute=600)
+        for _ in range(600):
+            with scheduler.request(1, 1):
+                pass
+
+        order = []
+        def make_request(priority):
+            with scheduler.request(1, 1, priority):
+                order.append(priority)
+
+        threads = [threading.Thread(target=make_request, args=(priority,)) for priority in ("batch", "batch", "interactive")]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+        # The interactive request arrived last but jumps the queue of waiting batch requests.
+        self.assertEqual(order, ["interactive", "batch", "batch"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from ..resources import ResourceRegistry, shared_resources
+from ..tools.search.elasticsearch_search_tool import ElasticsearchSearchTool
+
+class TestResourceRegistry(unittest.TestCase):
+    def test_factory_runs_once_across_threads(self):
+        registry = ResourceRegistry()
+        calls = []
+        def factory():
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get("client", factory))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_failed_factory_not_cached(self):
+        registry = ResourceRegistry()
+        def failing_factory():
+            raise ConnectionError("down")
+        with self.assertRaises(ConnectionError):
+            registry.get("client", failing_factory)
+        self.assertNotIn("client", registry)
+        self.assertEqual(registry.get("client", lambda: 1), 1)
+
+class TestLazyElasticsearchTool(unittest.TestCase):
+    def setUp(self):
+        shared_resources.clear()
+
+    def make_tool(self, index):
+        return ElasticsearchSearchTool("search", "Search.", [], elasticsearch_cloud_id="cloud", elasticsearch_api_key_id="key_id", elasticsearch_api_key="key", elasticsearch_index=index)
+
+    def test_tools_connect_lazily_and_share_client(self):
+        with patch("tool_use_package.tools.search.elasticsearch_search_tool.Elasticsearch") as elasticsearch_class:
+            client = MagicMock()
+            client.indices.get_mapping.side_effect = lambda index: MagicMock(body={index: {"mappings": {"properties": {"text": {}}}}})
+            elasticsearch_class.return_value = client
+
+            first_tool, second_tool = self.make_tool("index_a"), self.make_tool("index_b")
+            elasticsearch_class.assert_not_called()
+
+            first_tool.warmup()
+            self.assertIs(second_tool.client, first_tool.client)
+            elasticsearch_class.assert_called_once()
+            self.assertEqual(client.indices.exists.call_count, 2)
+
+if __name__ == "__main__":
+    unittest.main()
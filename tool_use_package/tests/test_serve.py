@@ -0,0 +1,136 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..serve import ToolUserServer, make_http_server, serve_stdio
+from ..tools.base_tool import BaseTool
+
+class PrintingTool(BaseTool):
+    def use_tool(self, query):
+        print("Searching...", query)
+        os.system("echo from a subprocess")
+        return query
+
+def build_printing_tools():
+    return [PrintingTool("echo", "Echoes the query.", [{"name": "query", "type": "str", "description": "The query."}])]
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    """A fake Messages API endpoint. It asks to add 2 and 3, then answers with the function result it was given."""
+
+    delay = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(FakeModelHandler.delay)
+        prompt = body["messages"][-1]["content"]
+        if "<function_results>" in prompt:
+            text, stop_sequence = "The answer is 5.", None
+        else:
+            text, stop_sequence = "<function_calls><invoke><tool_name>perform_addition</tool_name><parameters><a>2</a><b>3</b></parameters></invoke>", "</function_calls>"
+        response = {
+            "id": "msg_test", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "stop_sequence" if stop_sequence else "end_turn", "stop_sequence": stop_sequence,
+            "usage": {"input_tokens": 10, "output_tokens": 10}
+        }
+        data = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestToolUserServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+        cls.model_server = ThreadingHTTPServer(("127.0.0.1", 0), FakeModelHandler)
+        threading.Thread(target=cls.model_server.serve_forever, daemon=True).start()
+        cls.tool_user_server = ToolUserServer(
+            "tool_use_package.calculator_example:tool_user",
+            workers=1,
+            max_queue_size=0,
+            model_base_url=f"http://127.0.0.1:{cls.model_server.server_address[1]}"
+        ).start()
+        cls.http_server = make_http_server(cls.tool_user_server, port=0)
+        threading.Thread(target=cls.http_server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.http_server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.http_server.shutdown()
+        cls.http_server.server_close()
+        cls.tool_user_server.close()
+        cls.model_server.shutdown()
+        cls.model_server.server_close()
+
+    def setUp(self):
+        FakeModelHandler.delay = 0
+
+    def post(self, path, body):
+        request = urllib.request.Request(f"{self.url}{path}", data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def test_use_tools_manual(self):
+        result = self.post("/v1/use_tools", {"messages": [{"role": "user", "content": "What is 2 + 3?"}]})
+        self.assertEqual(result["result"]["role"], "tool_inputs")
+        self.assertEqual(result["result"]["tool_inputs"], [{"tool_name": "perform_addition", "tool_arguments": {"a": 2.0, "b": 3.0}}])
+
+    def test_use_tools_automatic(self):
+        result = self.post("/v1/use_tools", {"messages": [{"role": "user", "content": "What is 2 + 3?"}], "execution_mode": "automatic"})
+        self.assertEqual(result["result"], "The answer is 5.")
+
+    def test_execute_tool_inputs(self):
+        tool_inputs_message = {"role": "tool_inputs", "content": "", "tool_inputs": [{"tool_name": "perform_addition", "tool_arguments": {"a": 2, "b": 3}}]}
+        result = self.post("/v1/execute_tool_inputs", {"tool_inputs_message": tool_inputs_message})
+        self.assertEqual(result["result"], {"role": "tool_outputs", "tool_outputs": [{"tool_name": "perform_addition", "tool_result": 5}], "tool_error": None})
+
+    def test_rejects_requests_when_full(self):
+        FakeModelHandler.delay = 0.5
+        future = self.tool_user_server.submit("use_tools", {"messages": [{"role": "user", "content": "What is 2 + 3?"}]})
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.post("/v1/use_tools", {"messages": [{"role": "user", "content": "What is 2 + 3?"}]})
+        self.assertEqual(context.exception.code, 503)
+        future.result()
+
+    def test_stdio(self):
+        requests = io.StringIO(
+            json.dumps({"id": 1, "method": "use_tools", "params": {"messages": [{"role": "user", "content": "What is 2 + 3?"}], "execution_mode": "automatic"}}) + "\n"
+            + json.dumps({"id": 2, "method": "not_a_method", "params": {}}) + "\n"
+        )
+        responses = io.StringIO()
+        serve_stdio(self.tool_user_server, requests, responses)
+        responses = {response["id"]: response for response in map(json.loads, responses.getvalue().splitlines())}
+        self.assertEqual(responses[1]["result"], "The answer is 5.")
+        self.assertIn("Unknown method", responses[2]["error"])
+
+class TestServeStdioProcess(unittest.TestCase):
+    def test_tool_prints_do_not_reach_stdout(self):
+        tool_inputs_message = {"role": "tool_inputs", "content": "", "tool_inputs": [{"tool_name": "echo", "tool_arguments": {"query": "hi"}}]}
+        request = json.dumps({"id": 1, "method": "execute_tool_inputs", "params": {"tool_inputs_message": tool_inputs_message}}) + "\n"
+        process = subprocess.run(
+            [sys.executable, "-m", "tool_use_package.serve", "--toolset", f"{__name__}:build_printing_tools", "--transport", "stdio", "--workers", "1"],
+            input=request, capture_output=True, text=True, timeout=60,
+            cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+            env={**os.environ, "ANTHROPIC_API_KEY": os.environ.get("ANTHROPIC_API_KEY", "test")}
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        responses = [json.loads(line) for line in process.stdout.splitlines()]
+        self.assertEqual(responses, [{"id": 1, "result": {"role": "tool_outputs", "tool_outputs": [{"tool_name": "echo", "tool_result": "hi"}], "tool_error": None}}])
+        self.assertIn("Searching... hi", process.stderr)
+        self.assertIn("from a subprocess", process.stderr)
+
+if __name__ == "__main__":
+    unittest.main()
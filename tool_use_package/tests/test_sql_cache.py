@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import unittest
+
+from ..tools.sql_cache import SQLResultCache, is_read_query, normalize_sql, referenced_tables, sqlite_data_version
+from ..tools.sql_connections import sqlite_connection_factory
+from ..tools.sql_tool import SQLTool
+
+class TestSQLParsing(unittest.TestCase):
+    def test_normalize_sql_ignores_case_whitespace_and_comments(self):
+        self.assertEqual(normalize_sql("SELECT  name\n FROM Employee_Data -- everyone\n WHERE name = 'John X';"), normalize_sql("select name from employee_data where name='John X'"))
+        self.assertNotEqual(normalize_sql("SELECT 1 WHERE 'a' = 'A'"), normalize_sql("SELECT 1 WHERE 'a' = 'a'"))
+
+    def test_referenced_tables(self):
+        self.assertEqual(referenced_tables('SELECT * FROM a x, main.b AS y LEFT JOIN "C" ON x.id = y.id'), {"a", "b", "c"})
+        self.assertEqual(referenced_tables("CREATE UNIQUE INDEX IF NOT EXISTS by_name ON employee_data (name)"), {"employee_data"})
+        self.assertEqual(referenced_tables("INSERT OR IGNORE INTO employee_data(id) VALUES (3)"), {"employee_data"})
+        self.assertEqual(referenced_tables("DELETE FROM employee_data WHERE id = 1"), {"employee_data"})
+
+    def test_is_read_query(self):
+        self.assertTrue(is_read_query("WITH c AS (SELECT * FROM t) SELECT * FROM c;"))
+        self.assertFalse(is_read_query("SELECT 1; DELETE FROM t"))
+        self.assertFalse(is_read_query("WITH c AS (SELECT 1) DELETE FROM t"))
+
+class TestSQLToolResultCache(unittest.TestCase):
+    def setUp(self):
+        conn = sqlite3.connect('test_cache.db')
+        conn.execute("CREATE TABLE employee_data (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        conn.execute("CREATE TABLE office_data (id INTEGER PRIMARY KEY, city TEXT NOT NULL)")
+        conn.executemany("INSERT INTO employee_data VALUES (?, ?)", [(1, 'John'), (2, 'Jane')])
+        conn.commit()
+        conn.close()
+        self.result_cache = SQLResultCache(data_version=sqlite_data_version('test_cache.db'))
+        self.sql_tool = SQLTool("execute_sqlite3_query", "Runs a query.", [{"name": "sql_query", "type": "str", "description": "The query to run."}], "",
+                                connection_factory=sqlite_connection_factory('test_cache.db'), result_cache=self.result_cache)
+
+    def tearDown(self):
+        self.sql_tool.close()
+        os.remove('test_cache.db')
+
+    def count_employees(self, sql_query="SELECT count(1) FROM employee_data"):
+        return self.sql_tool.use_tool(sql_query)[0][0]
+
+    def test_repeated_query_is_a_hit(self):
+        self.assertEqual(self.count_employees(), 2)
+        self.assertEqual(self.count_employees("select COUNT(1)\n  from employee_data;"), 2)
+        self.assertEqual(self.result_cache.stats()["hits"], 1)
+        self.assertEqual(self.result_cache.stats()["misses"], 1)
+
+    def test_write_invalidates_only_referenced_tables(self):
+        # data_version would also see the tool's own write and clear everything.
+        self.result_cache.data_version = None
+        self.count_employees()
+        self.sql_tool.use_tool("SELECT count(1) FROM office_data")
+        self.sql_tool.use_tool("INSERT INTO employee_data VALUES (3, 'Jim')")
+        self.assertEqual(self.count_employees(), 3)
+        self.sql_tool.use_tool("SELECT count(1) FROM office_data")
+        self.assertEqual(self.result_cache.stats()["hits"], 1)
+
+    def test_write_under_a_view_invalidates_everything(self):
+        self.result_cache.data_version = None
+        self.sql_tool.use_tool("CREATE VIEW employee_names AS SELECT name FROM employee_data")
+        self.assertEqual(self.count_employees("SELECT count(*) FROM employee_names"), 2)
+        self.sql_tool.use_tool("SELECT count(1) FROM office_data")
+        self.sql_tool.use_tool("INSERT INTO employee_data VALUES (3, 'Jim')")
+        self.assertEqual(self.count_employees("SELECT count(*) FROM employee_names"), 3)
+        # office_data has nothing depending on it, so writing to it keeps the other entries.
+        self.sql_tool.use_tool("INSERT INTO office_data VALUES (1, 'Paris')")
+        self.assertEqual(self.count_employees("SELECT count(*) FROM employee_names"), 3)
+        self.assertEqual(self.result_cache.stats()["hits"], 1)
+
+    def test_write_to_a_table_with_a_trigger_invalidates_everything(self):
+        self.result_cache.data_version = None
+        self.sql_tool.use_tool("CREATE TRIGGER count_hires AFTER INSERT ON employee_data BEGIN INSERT INTO office_data VALUES (NEW.id, 'HQ'); END")
+        self.assertEqual(self.count_employees("SELECT count(1) FROM office_data"), 0)
+        self.sql_tool.use_tool("INSERT INTO employee_data VALUES (3, 'Jim')")
+        self.assertEqual(self.count_employees("SELECT count(1) FROM office_data"), 1)
+
+    def test_external_write_invalidates_through_data_version(self):
+        self.assertEqual(self.count_employees(), 2)
+        conn = sqlite3.connect('test_cache.db')
+        conn.execute("INSERT INTO employee_data VALUES (3, 'Jim')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.count_employees(), 3)
+        self.assertEqual(self.result_cache.stats()["hits"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import unittest
+
+from ..tools.base_tool import ToolError
+from ..tools.sql_connections import sqlite_connection_factory
+from ..tools.sql_guards import QueryPlanRejectedError, QueryTimeoutError, SQLGuard
+from ..tools.sql_tool import SQLTool
+
+class TestSQLGuard(unittest.TestCase):
+    def setUp(self):
+        conn = sqlite3.connect('test_guards.db')
+        conn.execute("CREATE TABLE employee_data (id INTEGER PRIMARY KEY, name TEXT NOT NULL, age INTEGER NOT NULL)")
+        conn.executemany("INSERT INTO employee_data VALUES (?, ?, ?)", [(i, f"Employee {i}", 20 + i % 40) for i in range(1, 2001)])
+        conn.commit()
+        conn.close()
+        self.guard = SQLGuard(max_scan_rows=1000)
+        self.sql_tool = SQLTool("execute_sqlite3_query", "Runs a query.", [{"name": "sql_query", "type": "str", "description": "The query to run."}], "",
+                                connection_factory=sqlite_connection_factory('test_guards.db'), guard=self.guard)
+
+    def tearDown(self):
+        self.sql_tool.close()
+        os.remove('test_guards.db')
+
+    def test_indexed_and_limited_queries_run(self):
+        self.assertEqual(self.sql_tool.use_tool("SELECT name FROM employee_data WHERE id = 7")[0][0], "Employee 7")
+        self.assertEqual(len(self.sql_tool.use_tool("SELECT * FROM employee_data LIMIT 5")), 5)
+
+    def test_large_full_scan_is_rejected_before_running(self):
+        with self.assertRaises(QueryPlanRejectedError) as context:
+            self.sql_tool.use_tool("SELECT avg(age) FROM employee_data WHERE name LIKE '%9%'")
+        self.assertIsInstance(context.exception, ToolError)
+        self.assertIn("employee_data (~2000 rows)", str(context.exception))
+
+    def test_cross_join_multiplies_scans(self):
+        self.guard.max_scan_rows = 100000
+        with self.assertRaises(QueryPlanRejectedError) as context:
+            self.sql_tool.use_tool("SELECT count(*) FROM employee_data a, employee_data b WHERE a.age > b.age")
+        self.assertIn("about 4000000 rows", str(context.exception))
+
+    def test_full_scan_warning(self):
+        self.guard.on_full_scan = "warn"
+        result = self.sql_tool.use_tool("SELECT count(*) FROM employee_data WHERE age > 30")
+        self.assertEqual(result[0][0], 1450)
+        self.assertIn("Warning: this query needed a full scan of employee_data", str(result))
+
+    def test_long_running_query_is_interrupted(self):
+        self.guard.on_full_scan = None
+        self.guard.max_vm_steps = 100000
+        with self.assertRaises(QueryTimeoutError) as context:
+            self.sql_tool.use_tool("WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM counter) SELECT count(*) FROM counter")
+        self.assertIn("stopped after 100000 steps", str(context.exception))
+        # The connection is still usable afterwards.
+        self.assertEqual(self.sql_tool.use_tool("SELECT count(1) FROM employee_data WHERE id < 10")[0][0], 9)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from ..tools.sql_result import SQLResult, format_table
+
+class TestSQLResultFormatting(unittest.TestCase):
+    def test_delimited_table_with_headers(self):
+        result = SQLResult([(1, "John", None), (2, "Jane | Doe", 36)], ["id", "name", "age"])
+        self.assertEqual(str(result), "id|name|age\n1|John|NULL\n2|Jane \\| Doe|36")
+
+    def test_repeats_are_collapsed(self):
+        rows = [("Engineering", "London", 3), ("Engineering", "Tokyo", 3), ("Sales", "Tokyo", 12)]
+        self.assertEqual(
+            format_table(["department", "city", "n"], rows),
+            'department|city|n\nEngineering|London|3\n"|Tokyo|3\nSales|"|12\n(" = same value as the row above)'
+        )
+        self.assertNotIn('"', format_table(["department", "city", "n"], rows, collapse_repeats=False))
+
+    def test_markdown_and_cell_width(self):
+        table = format_table(["id", "bio"], [(1, "x" * 50)], style="markdown", max_cell_chars=10)
+        self.assertEqual(table, "| id | bio |\n|---|---|\n| 1 | xxxxxxxxx… |")
+
+    def test_repr_style_and_notes(self):
+        result = SQLResult([(1, "John")], ["id", "name"], truncation_reason="row limit", total_rows=5, style="repr", warnings=["Warning: slow."])
+        self.assertEqual(str(result), "[(1, 'John')]\n[Showing the first 1 of 5 rows (stopped at the row limit). Add a LIMIT, filter or aggregate to see other rows.]\nWarning: slow.")
+        self.assertEqual(str(SQLResult([], ["id"])), "id\n(no rows)")
+
+if __name__ == "__main__":
+    unittest.main()
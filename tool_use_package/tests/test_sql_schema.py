@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import unittest
+
+from ..prompt_constructors import construct_use_tools_prompt
+from ..tools.sql_connections import sqlite_connection_factory
+from ..tools.sql_tool import SQLTool
+
+class TestSQLSchemaIntrospection(unittest.TestCase):
+    def setUp(self):
+        conn = sqlite3.connect('test_schema.db')
+        conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT NOT NULL, city TEXT)")
+        conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id), total REAL)")
+        for i in range(20):
+            conn.execute(f"CREATE TABLE audit_log_{i} (id INTEGER PRIMARY KEY, event TEXT)")
+        conn.commit()
+        conn.close()
+        self.sql_tool = SQLTool("execute_sqlite3_query", "Runs a query.", [{"name": "sql_query", "type": "str", "description": "The query to run."}],
+                                connection_factory=sqlite_connection_factory('test_schema.db'), max_schema_tables=3)
+
+    def tearDown(self):
+        self.sql_tool.close()
+        os.remove('test_schema.db')
+
+    def test_schema_is_introspected_and_rendered_compactly(self):
+        prompt = self.sql_tool.format_tool_for_claude()
+        self.assertIn("orders(id INTEGER PK, customer_id INTEGER REFERENCES customers(id), total REAL)", prompt)
+        self.assertIn("audit_log_19(id INTEGER PK, event TEXT)", prompt)
+
+    def test_schema_is_pruned_to_relevant_tables(self):
+        prompt = self.sql_tool.format_tool_for_claude_for_query("What is the total of all orders?")
+        self.assertIn("orders(id INTEGER PK", prompt)
+        self.assertIn("customers(id INTEGER PK, name TEXT, city TEXT)", prompt) # Referenced by orders
+        self.assertNotIn("audit_log_3(", prompt)
+        self.assertIn("-- Other tables (columns not shown): audit_log_0", prompt)
+
+        self.assertIn("orders(id INTEGER PK", construct_use_tools_prompt("\n\nHuman: What is the total of all orders?", [self.sql_tool], 'user', query="What is the total of all orders?"))
+
+    def test_refresh_schema(self):
+        self.sql_tool.format_tool_for_claude()
+        conn = sqlite3.connect('test_schema.db')
+        conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, price REAL)")
+        conn.commit()
+        conn.close()
+        self.assertNotIn("products(", self.sql_tool.format_tool_for_claude())
+        self.sql_tool.refresh_schema()
+        self.assertIn("products(id INTEGER PK, price REAL)", self.sql_tool.format_tool_for_claude())
+
+if __name__ == "__main__":
+    unittest.main()
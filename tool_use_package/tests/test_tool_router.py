@@ -0,0 +1,53 @@
+import unittest
+
+from ..tool_router import BM25ToolRouter, EmbeddingToolRouter
+from ..tool_user import ToolUser
+from ..relevance import BM25Index
+from ..calculator_example import addition_tool, subtraction_tool
+from ..weather_tool_example import weather_tool
+from ..tools.search.vector_search.embedders.base_embedder import BaseEmbedder, Embedding
+
+class TestBM25Index(unittest.TestCase):
+    def test_top_k(self):
+        index = BM25Index(["the weather in a city", "add two numbers", "subtract two numbers"])
+        self.assertEqual(index.top_k("what is the weather today", 2), [0])
+        self.assertEqual(index.top_k("numbers please add", 1), [1])
+        self.assertEqual(index.top_k("banana", 3), [])
+
+class TestToolRouter(unittest.TestCase):
+    def setUp(self):
+        self.tools = [addition_tool, subtraction_tool, weather_tool]
+
+    def test_bm25_router_selects_relevant_tools_in_registration_order(self):
+        router = BM25ToolRouter(top_k=2)
+        selected = router.select_tools(self.tools, "What should I wear in San Francisco given the weather?")
+        self.assertEqual(selected, [weather_tool])
+        selected = router.select_tools(self.tools, "weather, then subtraction")
+        self.assertEqual(selected, [subtraction_tool, weather_tool])
+
+    def test_pinned_and_required_tools_always_selected(self):
+        router = BM25ToolRouter(top_k=1, pinned_tool_names=["perform_addition"])
+        selected = router.select_tools(self.tools, "weather", required_tool_names={"perform_subtraction"})
+        self.assertEqual(selected, self.tools)
+
+    def test_embedding_router(self):
+        class KeywordEmbedder(BaseEmbedder):
+            dim = 2
+            def embed(self, text):
+                return self.embed_batch([text])[0]
+            def embed_batch(self, texts):
+                return [Embedding(embedding=[float("weather" in text), float("subtract" in text.lower())], text=text) for text in texts]
+
+        router = EmbeddingToolRouter(KeywordEmbedder(), top_k=1)
+        self.assertEqual(router.select_tools(self.tools, "how is the weather"), [weather_tool])
+
+    def test_tool_user_uses_router(self):
+        tool_user = ToolUser(self.tools, tool_router=BM25ToolRouter(top_k=1))
+        messages = [
+            {"role": "user", "content": "What is 5 minus 3? Use subtraction."},
+            {"role": "tool_inputs", "content": "", "tool_inputs": [{"tool_name": "perform_addition", "tool_arguments": {"a": 1, "b": 2}}]}
+        ]
+        self.assertEqual(tool_user._select_tools(messages), [addition_tool, subtraction_tool])
+
+if __name__ == "__main__":
+    unittest.main()
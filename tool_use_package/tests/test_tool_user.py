@@ -1,6 +1,13 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
 
 from ..tool_user import ToolUser
+from ..tools.base_tool import BaseTool
+from ..tools.sql_tool import SQLTool
 from ..calculator_example import addition_tool, subtraction_tool
 from ..prompt_constructors import construct_successful_function_run_injection_prompt, construct_error_function_run_injection_prompt
 
@@ -40,5 +47,102 @@ class TestToolUser(unittest.TestCase):
         b = 305.0
         self.assertEqual(self.tool_user._parse_function_calls(f"some text that might go here<function_calls><invoke><tool_name>perform_addition</tool_name><parameters><a>{a}</a><b>{b}</b></parameters></invoke></function_calls>some more text that might go here...", True), {"status": "SUCCESS", "invoke_results": [{'tool_name': 'perform_addition', 'tool_result': addition_tool.use_tool(a, b)}], 'content': 'some text that might go here'})
 
+class TestStreamingTools(unittest.TestCase):
+    def setUp(self):
+        self.chunks_produced = 0
+        self.generator_closed = False
+        test_case = self
+
+        class CountingTool(BaseTool):
+            def use_tool(self, n):
+                try:
+                    for i in range(n):
+                        test_case.chunks_produced += 1
+                        yield f"chunk {i} "
+                finally:
+                    test_case.generator_closed = True
+
+        self.tool = CountingTool("count", "Counts up to n.", [{"name": "n", "type": "int", "description": "How far to count."}])
+
+    def test_stream_consumed_in_full_without_budget(self):
+        tool_user = ToolUser([self.tool])
+        self.assertEqual(tool_user._use_tool(self.tool, {"n": 3}), "chunk 0 chunk 1 chunk 2 ")
+        self.assertEqual(self.chunks_produced, 3)
+
+    def test_stream_cut_off_at_budget(self):
+        tool_user = ToolUser([self.tool], max_tool_output_tokens=10)
+        result = tool_user._use_tool(self.tool, {"n": 100000})
+        self.assertTrue(result.endswith("[Output truncated after 10 tokens.]"))
+        self.assertLess(self.chunks_produced, 10)
+        self.assertTrue(self.generator_closed)
+
+    def test_tool_budget_overrides_tool_user_budget(self):
+        self.tool.max_output_tokens = 5
+        tool_user = ToolUser([self.tool], max_tool_output_tokens=1000)
+        result = tool_user._use_tool(self.tool, {"n": 1000})
+        self.assertTrue(result.endswith("[Output truncated after 5 tokens.]"))
+        self.assertLess(self.chunks_produced, 5)
+
+class TestExecuteToolInputs(unittest.TestCase):
+    def setUp(self):
+        class SleepTool(BaseTool):
+            def use_tool(self, seconds):
+                time.sleep(seconds)
+                return seconds
+
+        self.sleep_tool = SleepTool("sleep", "Sleeps for some seconds.", [{"name": "seconds", "type": "float", "description": "How long to sleep."}])
+        self.tool_user = ToolUser([self.sleep_tool, addition_tool])
+
+    def test_tools_run_concurrently(self):
+        message = {"role": "tool_inputs", "content": "", "tool_inputs": [{"tool_name": "sleep", "tool_arguments": {"seconds": 0.3}}] * 3}
+        start = time.monotonic()
+        tool_outputs_message = self.tool_user.execute_tool_inputs(message)
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(tool_outputs_message, {"role": "tool_outputs", "tool_outputs": [{"tool_name": "sleep", "tool_result": 0.3}] * 3, "tool_error": None})
+
+    def test_timeout_returns_tool_error(self):
+        message = {"role": "tool_inputs", "content": "", "tool_inputs": [{"tool_name": "perform_addition", "tool_arguments": {"a": 1, "b": 2}}, {"tool_name": "sleep", "tool_arguments": {"seconds": 1}}]}
+        tool_outputs_message = self.tool_user.execute_tool_inputs(message, timeout=0.1)
+        self.assertIsNone(tool_outputs_message['tool_outputs'])
+        self.assertEqual(tool_outputs_message['tool_error'], "<tool_name>sleep</tool_name> did not finish within 0.1 seconds.")
+
+    def test_tools_run_on_a_long_lived_pool(self):
+        class ThreadTool(BaseTool):
+            def use_tool(self):
+                return threading.current_thread()
+
+        tool = ThreadTool("thread", "Returns its thread.", [])
+        tool_user = ToolUser([tool], max_tool_workers=1)
+        message = {"role": "tool_inputs", "content": "", "tool_inputs": [{"tool_name": "thread", "tool_arguments": {}}]}
+        threads = [tool_user.execute_tool_inputs(message, timeout=5)['tool_outputs'][0]['tool_result'] for _ in range(2)]
+        self.assertIs(threads[0], threads[1])
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_sqlite_db_conn_runs_in_the_calling_thread(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        conn = sqlite3.connect(os.path.join(directory.name, "test.db"))
+        self.addCleanup(conn.close)
+        conn.execute("CREATE TABLE numbers (n INTEGER)")
+        conn.execute("INSERT INTO numbers VALUES (1), (2)")
+        conn.commit()
+        sql_tool = SQLTool("query", "Runs SQL.", [{"name": "sql_query", "type": "str", "description": "The query."}], db_conn=conn)
+        tool_user = ToolUser([sql_tool, self.sleep_tool])
+
+        sql_input = {"tool_name": "query", "tool_arguments": {"sql_query": "SELECT count(*) FROM numbers"}}
+        for tool_inputs, timeout in (([sql_input], 5), ([sql_input, sql_input, {"tool_name": "sleep", "tool_arguments": {"seconds": 0.01}}], None)):
+            tool_outputs_message = tool_user.execute_tool_inputs({"role": "tool_inputs", "content": "", "tool_inputs": tool_inputs}, timeout=timeout)
+            self.assertIsNone(tool_outputs_message['tool_error'])
+            self.assertEqual(len(tool_outputs_message['tool_outputs']), len(tool_inputs))
+
+    def test_unknown_tool_returns_tool_error(self):
+        message = {"role": "tool_inputs", "content": "", "tool_inputs": [{"tool_name": "perform_multiplication", "tool_arguments": {"a": 1, "b": 2}}]}
+        tool_outputs_message = self.tool_user.execute_tool_inputs(message)
+        self.assertEqual(tool_outputs_message['tool_error'], "No tool named <tool_name>perform_multiplication</tool_name> available.")
+
+    def test_rejects_other_roles(self):
+        with self.assertRaises(ValueError):
+            self.tool_user.execute_tool_inputs({"role": "assistant", "content": "Hi"})
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
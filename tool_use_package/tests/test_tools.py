@@ -1,9 +1,12 @@
 import unittest
 import os
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from ..calculator_example import addition_tool, subtraction_tool
 from ..tools.sql_tool import SQLTool
+from ..tools.sql_connections import ReadOnlyQueryError, sqlite_connection_factory
 from ..weather_tool_example import weather_tool
 
 class TestCalculatorTools(unittest.TestCase):
@@ -58,6 +61,84 @@ class TestSQLTool(unittest.TestCase):
         self.assertEqual(len(use_result), 1)
         self.assertEqual(use_result[0][0], 2)
 
+    def insert_employees(self, n):
+        self.sql_tool.db_conn.executemany("INSERT INTO employee_data VALUES (?, ?, ?)", [(i, f"Employee {i}", 20 + i % 40) for i in range(3, n + 3)])
+        self.sql_tool.db_conn.commit()
+
+    def test_sql_use_tool_stops_at_row_limit(self):
+        self.insert_employees(998)
+        self.sql_tool.max_rows = 10
+        self.sql_tool.count_rows_limit = 500
+        use_result = self.sql_tool.use_tool("SELECT * FROM employee_data")
+        self.assertEqual(len(use_result), 10)
+        self.assertEqual(use_result.columns, ["id", "name", "age"])
+        self.assertEqual((use_result.truncation_reason, use_result.total_rows, use_result.total_rows_is_exact), ("row limit", 500, False))
+        self.assertIn("[Showing the first 10 of at least 500 rows (stopped at the row limit).", str(use_result))
+
+        self.sql_tool.count_rows_limit = 10000
+        use_result = self.sql_tool.use_tool("SELECT * FROM employee_data")
+        self.assertEqual((use_result.total_rows, use_result.total_rows_is_exact), (1000, True))
+
+    def test_sql_use_tool_stops_at_token_budget(self):
+        self.insert_employees(998)
+        self.sql_tool.max_output_tokens = 100
+        use_result = self.sql_tool.use_tool("SELECT * FROM employee_data")
+        self.assertTrue(0 < len(use_result) < 20)
+        self.assertEqual(use_result.truncation_reason, "output token budget")
+
+    def make_tool_with_factory(self, connection_factory, **kwargs):
+        return SQLTool(self.sql_tool.name, self.sql_tool.description, self.sql_tool.parameters, self.sql_tool.db_schema, connection_factory=connection_factory, **kwargs)
+
+    def test_read_only_tool_queries_concurrently(self):
+        sql_tool = self.make_tool_with_factory(sqlite_connection_factory('test.db', read_only=True, wal=True), read_only=True)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            counts = list(executor.map(lambda _: sql_tool.use_tool("SELECT count(1) FROM employee_data")[0][0], range(32)))
+        self.assertEqual(counts, [2] * 32)
+        with self.assertRaises(sqlite3.OperationalError):
+            sql_tool.use_tool("DELETE FROM employee_data")
+        sql_tool.close()
+
+        conn = sqlite3.connect('test.db')
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        conn.close()
+
+    def test_read_only_tool_cannot_change_the_schema(self):
+        self.sql_tool.read_only = True
+        with self.assertRaises(sqlite3.OperationalError):
+            self.sql_tool.use_tool("DROP TABLE employee_data")
+        with self.assertRaises(sqlite3.OperationalError):
+            self.sql_tool.use_tool("CREATE TABLE scratch (x INTEGER)")
+        self.assertEqual(self.sql_tool.use_tool("SELECT count(1) FROM employee_data")[0][0], 2)
+
+        conn = sqlite3.connect('test.db')
+        self.assertEqual(conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall(), [("employee_data",)])
+        conn.close()
+        # The connection itself is still writable outside the tool.
+        self.insert_employees(1)
+
+    def test_read_only_tool_rejects_writes_for_other_dialects(self):
+        sql_tool = self.make_tool_with_factory(lambda: sqlite3.connect('test.db', check_same_thread=False), db_dialect="Snowflake", read_only=True)
+        self.assertEqual(sql_tool.use_tool("SELECT count(1) FROM employee_data")[0][0], 2)
+        with self.assertRaises(ReadOnlyQueryError):
+            sql_tool.use_tool("DROP TABLE employee_data")
+        self.assertEqual(sql_tool.use_tool("SELECT count(1) FROM employee_data")[0][0], 2)
+        sql_tool.close()
+
+    def test_pool_never_opens_more_than_pool_size_connections(self):
+        opened = []
+        lock = threading.Lock()
+        def connection_factory():
+            with lock:
+                opened.append(1)
+            return sqlite3.connect('test.db', check_same_thread=False)
+
+        sql_tool = self.make_tool_with_factory(connection_factory, db_dialect="PostgreSQL", pool_size=2)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            counts = list(executor.map(lambda _: sql_tool.use_tool("SELECT count(1) FROM employee_data")[0][0], range(32)))
+        self.assertEqual(counts, [2] * 32)
+        self.assertLessEqual(len(opened), 2)
+        sql_tool.close()
+
 class TestWeatherTool(unittest.TestCase):
     def test_weather_use_tool(self):
         use_result = weather_tool.use_tool("San Francisco")
@@ -0,0 +1,86 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+
+from .relevance import BM25Index
+
+class BaseToolRouter(ABC):
+    """
+    Picks which of a ToolUser's tools to describe in the system prompt for a conversation, so very large toolsets do not cost tens of thousands of input tokens per request.
+
+    Attributes:
+    -----------
+    - top_k (int): The maximum number of relevant tools to include, on top of the pinned tools. Default is 5.
+    - pinned_tool_names (list, optional): Names of tools that are always included.
+
+    Selected tools are always returned in the order they were registered with the ToolUser (not by score), so the same selection always renders the same system prompt and prompt caching stays effective.
+    Tools that were already called earlier in the conversation stay selected, so Claude can keep using them.
+
+    Usage:
+    ------
+    Subclass and implement `_rank_tools()`, or use BM25ToolRouter / EmbeddingToolRouter, and pass an instance to ToolUser(tools, tool_router=router).
+    """
+
+    def __init__(self, top_k=5, pinned_tool_names=None):
+        self.top_k = top_k
+        self.pinned_tool_names = set(pinned_tool_names or [])
+        self._lock = threading.Lock()
+        self._indexed_tools = None
+
+    def select_tools(self, tools, query, required_tool_names=()):
+        """Returns the pinned, required and top_k most relevant of tools for the query, in their original order."""
+
+        with self._lock:
+            if self._indexed_tools is None or len(self._indexed_tools) != len(tools) or any(a is not b for a, b in zip(self._indexed_tools, tools)):
+                self._index_tools(tools)
+                self._indexed_tools = list(tools)
+
+        selected = set(self._rank_tools(query)[:self.top_k]) if query else set()
+        return [tool for i, tool in enumerate(tools) if i in selected or tool.name in self.pinned_tool_names or tool.name in required_tool_names]
+
+    @staticmethod
+    def _tool_document(tool):
+        parameters = " ".join(f"{parameter['name']} {parameter['description']}" for parameter in tool.parameters)
+        return f"{tool.name} {tool.description} {parameters}"
+
+    @abstractmethod
+    def _index_tools(self, tools):
+        """Builds whatever index _rank_tools needs over tools."""
+
+    @abstractmethod
+    def _rank_tools(self, query):
+        """Returns the indices of relevant tools for the query, most relevant first."""
+
+class BM25ToolRouter(BaseToolRouter):
+    """Routes with a local BM25 index over each tool's name, description and parameters. Needs no network access or extra dependencies."""
+
+    def _index_tools(self, tools):
+        self._index = BM25Index([BaseToolRouter._tool_document(tool) for tool in tools])
+
+    def _rank_tools(self, query):
+        return self._index.top_k(query, self.top_k)
+
+class EmbeddingToolRouter(BaseToolRouter):
+    """Routes by cosine similarity between embeddings of the query and of each tool's name, description and parameters, using any BaseEmbedder."""
+
+    def __init__(self, embedder, top_k=5, pinned_tool_names=None):
+        """
+        :param embedder: The BaseEmbedder to embed tools and queries with. Tools are embedded once, queries once per request.
+        :param top_k: The maximum number of relevant tools to include.
+        :param pinned_tool_names: Names of tools that are always included.
+        """
+        super().__init__(top_k, pinned_tool_names)
+        self.embedder = embedder
+
+    def _index_tools(self, tools):
+        self._tool_embeddings = [embedding.embedding for embedding in self.embedder.embed_batch([BaseToolRouter._tool_document(tool) for tool in tools])]
+
+    def _rank_tools(self, query):
+        query_embedding = self.embedder.embed(query).embedding
+        similarities = [EmbeddingToolRouter._cosine_similarity(query_embedding, tool_embedding) for tool_embedding in self._tool_embeddings]
+        return sorted(range(len(similarities)), key=lambda i: -similarities[i])
+
+    @staticmethod
+    def _cosine_similarity(a, b):
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
@@ -3,9 +3,17 @@ from anthropic_bedrock import AnthropicBedrock
 import re
 import builtins
 import ast
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait
 
-from .prompt_constructors import construct_use_tools_prompt, construct_successful_function_run_injection_prompt, construct_error_function_run_injection_prompt, construct_prompt_from_messages
+from .prompt_constructors import construct_use_tools_prompt, construct_successful_function_run_injection_prompt, construct_error_function_run_injection_prompt, construct_prompt_from_messages, validate_messages, PromptRenderer
 from .messages_api_converters import convert_completion_to_messages, convert_messages_completion_object_to_completions_completion_object
+from .tools.base_tool import ToolError
+from .rate_limiter import get_default_scheduler
+from .resources import get_tokenizer
 
 class ToolUser:
     """
@@ -18,6 +26,13 @@ class ToolUser:
     - max_retries (int, optional): The maximum number of times to retry in case of an error while interacting with a tool. Default is 3.
     - client: An instance of the Anthropic/AWS Bedrock API client. You must have set your Anthropic API Key or AWS Bedrock API keys as environment variables.
     - model: The name of the model (default Claude-2.1).
+    - max_tool_output_tokens (int, optional): The default output token budget for tools whose use_tool returns an iterator of chunks. Overridden per tool by BaseTool.max_output_tokens. If None, streamed output is consumed in full.
+    - tool_timeout (float, optional): Seconds to wait for the tools requested in a single function call block, which are run concurrently. Tools that do not finish in time are reported to Claude as an error. If None, there is no timeout.
+      Tools that are not thread safe (see BaseTool.thread_safe) run in the calling thread instead, and are not subject to the timeout.
+    - max_tool_workers (int, optional): The number of threads in the pool tools are run on, which lives as long as this ToolUser so that per-thread resources (like SQLTool's per-thread connections) are reused. Default is 8.
+    - tool_router (BaseToolRouter, optional): If provided, only the tools it selects as relevant to the conversation are described in the system prompt. All tools can still be called. If None, every tool is described.
+    - rate_limit_scheduler (RateLimitScheduler, optional): The scheduler every API call waits on to stay under rate limits. Defaults to the process-wide scheduler shared by all ToolUser instances.
+    - priority (str, optional): 'interactive' (default) or 'batch'. Interactive calls are scheduled ahead of batch calls when close to the rate limits.
     - current_prompt (str): The current prompt being used in the interaction. Is added to as Claude interacts with tools.
     - current_num_retries (int): The current number of retries that have been attempted. Resets to 0 after a successful function call.
     
@@ -31,10 +46,18 @@ class ToolUser:
     To use this class, you should instantiate it with a list of tools (tool_user = ToolUser(tools)). You then interact with it as you would the normal claude API, by providing a prompt to tool_user.use_tools(prompt) and expecting a completion in return.
     """
 
-    def __init__(self, tools, temperature=0, max_retries=3, first_party=True, model="default"):
+    def __init__(self, tools, temperature=0, max_retries=3, first_party=True, model="default", max_tool_output_tokens=None, tool_timeout=None, tool_router=None, rate_limit_scheduler=None, priority="interactive", max_tool_workers=8):
         self.tools = tools
         self.temperature = temperature
         self.max_retries = max_retries
+        self.max_tool_output_tokens = max_tool_output_tokens
+        self.tool_timeout = tool_timeout
+        self.max_tool_workers = max_tool_workers
+        self._tool_executor = None
+        self._tool_executor_lock = threading.Lock()
+        self.tool_router = tool_router
+        self.rate_limit_scheduler = rate_limit_scheduler if rate_limit_scheduler is not None else get_default_scheduler()
+        self.priority = priority
         self.first_party = first_party
         if first_party:
             if model == "default":
@@ -50,6 +73,7 @@ class ToolUser:
             self.client = AnthropicBedrock()
         self.current_prompt = None
         self.current_num_retries = 0
+        self._prompt_renderer = PromptRenderer()
 
     
     def use_tools(self, messages, verbose=0, execution_mode="manual", max_tokens_to_sample=2000, temperature=1):
@@ -61,8 +85,8 @@ class ToolUser:
         if execution_mode not in ["manual", "automatic"]:
             raise ValueError(f"Error: execution_mode must be either 'manual' or 'automatic'. Provided Value: {execution_mode}")
         
-        prompt = ToolUser._construct_prompt_from_messages(messages)
-        constructed_prompt = construct_use_tools_prompt(prompt, self.tools, messages[-1]['role'])
+        prompt = self._prompt_renderer.render(messages)
+        constructed_prompt = construct_use_tools_prompt(prompt, self._select_tools(messages), messages[-1]['role'], query=self._conversation_query(messages))
         # print(constructed_prompt)
         self.current_prompt = constructed_prompt
         if verbose == 1:
@@ -141,6 +165,22 @@ class ToolUser:
 
 
     
+    def _select_tools(self, messages):
+        """Returns the tools to describe in the system prompt for this conversation."""
+
+        if self.tool_router is None:
+            return self.tools
+        
+        query = self._conversation_query(messages)
+        used_tool_names = {tool_input['tool_name'] for message in messages if message['role'] == 'tool_inputs' for tool_input in message['tool_inputs']}
+        return self.tool_router.select_tools(self.tools, query, used_tool_names)
+
+    @staticmethod
+    def _conversation_query(messages):
+        """Returns the user's side of the conversation, which tool routing and tool formatting use to judge what is relevant."""
+
+        return "\n".join(message['content'] for message in messages if message['role'] == 'user')
+
     def _parse_function_calls(self, last_completion, evaluate_function_calls):
         """Parses the function calls from the model's response if present, validates their format, and invokes them."""
 
@@ -152,12 +192,12 @@ class ToolUser:
         if not invoke_calls['invokes']:
             return {"status": "DONE"}
         
-        # Parse the query's invoke calls and get it's results
-        invoke_results = []
+        # Parse the query's invoke calls and validate them
+        tool_calls = []
         for invoke_call in invoke_calls['invokes']:
             # Find the correct tool instance
             tool_name = invoke_call['tool_name']
-            tool = next((t for t in self.tools if t.name == tool_name), None)
+            tool = self._get_tool(tool_name)
             if tool is None:
                 return {"status": "ERROR", "message": f"No tool named <tool_name>{tool_name}</tool_name> available."}
             
@@ -173,19 +213,155 @@ class ToolUser:
             if missing:
                 return {"status": "ERROR", "message": f"Missing required parameters {parameter_names} for <tool_name>{tool_name}</tool_name>."}
             
-            # Convert values and call tool
+            # Convert values
             converted_params = {}
             for name, value in parameters:
                 param_def = next(p for p in tool.parameters if p['name'] == name)
                 type_ = param_def['type']
                 converted_params[name] = ToolUser._convert_value(value, type_)
-            
-            if not evaluate_function_calls:
-                invoke_results.append({"tool_name": tool_name, "tool_arguments": converted_params})
+            tool_calls.append((tool, converted_params))
+        
+        if not evaluate_function_calls:
+            invoke_results = [{"tool_name": tool.name, "tool_arguments": converted_params} for tool, converted_params in tool_calls]
+            return {"status": "SUCCESS", "invoke_results": invoke_results, "content": invoke_calls['prefix_content']}
+
+        # Call the tools, concurrently if there are several
+        execution = self._execute_tools(tool_calls, self.tool_timeout)
+        if execution['status'] == 'ERROR':
+            return execution
+        
+        return {"status": "SUCCESS", "invoke_results": execution['invoke_results'], "content": invoke_calls['prefix_content']}
+
+    def execute_tool_inputs(self, tool_inputs_message, timeout=None):
+        """
+        Executes the tools requested by a tool_inputs message (as returned by use_tools in manual mode) concurrently, and returns the tool_outputs message to append to messages.
+        - timeout (float, optional): Seconds to wait for all of the tools to finish. Defaults to this ToolUser's tool_timeout. A tool that does not finish in time is reported to Claude as a tool_error.
+        """
+
+        validate_messages([tool_inputs_message])
+        if tool_inputs_message['role'] != 'tool_inputs':
+            raise ValueError(f"execute_tool_inputs expects a message with role='tool_inputs', got {tool_inputs_message['role']}")
+        
+        tool_calls = []
+        for tool_input in tool_inputs_message['tool_inputs']:
+            tool_name = tool_input['tool_name']
+            tool = self._get_tool(tool_name)
+            if tool is None:
+                return {"role": "tool_outputs", "tool_outputs": None, "tool_error": f"No tool named <tool_name>{tool_name}</tool_name> available."}
+            tool_calls.append((tool, tool_input['tool_arguments']))
+        
+        execution = self._execute_tools(tool_calls, timeout if timeout is not None else self.tool_timeout)
+        if execution['status'] == 'ERROR':
+            tool_outputs_message = {"role": "tool_outputs", "tool_outputs": None, "tool_error": execution['message']}
+        else:
+            tool_outputs_message = {"role": "tool_outputs", "tool_outputs": execution['invoke_results'], "tool_error": None}
+        
+        validate_messages([tool_outputs_message])
+        return tool_outputs_message
+
+    def _get_tool(self, tool_name):
+        return next((t for t in self.tools if t.name == tool_name), None)
+
+    def _execute_tools(self, tool_calls, timeout=None):
+        """
+        Calls each (tool, tool_arguments) pair, running them concurrently on the ToolUser's thread pool when there is more than one (or a timeout), and returns their results in order.
+        Tools that are not thread safe always run in the calling thread, after the others have been started.
+        A ToolError or a timeout is returned as an ERROR status for the first tool (in request order) that hit one; other exceptions are raised.
+        Note that Python threads can not be killed, so a tool that times out keeps running in the background until it returns.
+        """
+
+        start = time.monotonic()
+        run_concurrently = len(tool_calls) > 1 or timeout is not None
+        futures = {}
+        if run_concurrently:
+            executor = self._get_tool_executor()
+            futures = {i: executor.submit(self._use_tool, tool, tool_arguments) for i, (tool, tool_arguments) in enumerate(tool_calls) if tool.thread_safe}
+
+        inline_outcomes = {}
+        for i, (tool, tool_arguments) in enumerate(tool_calls):
+            if i in futures:
+                continue
+            try:
+                inline_outcomes[i] = (self._use_tool(tool, tool_arguments), None)
+            except Exception as e:
+                inline_outcomes[i] = (None, e)
+
+        not_done = set()
+        if futures:
+            _, not_done = wait(futures.values(), timeout=None if timeout is None else max(0, start + timeout - time.monotonic()))
+
+        invoke_results = []
+        for i, (tool, _) in enumerate(tool_calls):
+            if i in futures:
+                if futures[i] in not_done:
+                    return {"status": "ERROR", "message": f"<tool_name>{tool.name}</tool_name> did not finish within {timeout} seconds."}
+                result, error = None, futures[i].exception()
+                if error is None:
+                    result = futures[i].result()
             else:
-                invoke_results.append({"tool_name": tool_name, "tool_result": tool.use_tool(**converted_params)})
+                result, error = inline_outcomes[i]
+            if isinstance(error, ToolError):
+                return {"status": "ERROR", "message": str(error)}
+            if error is not None:
+                raise error
+            invoke_results.append({"tool_name": tool.name, "tool_result": result})
         
-        return {"status": "SUCCESS", "invoke_results": invoke_results, "content": invoke_calls['prefix_content']}
+        return {"status": "SUCCESS", "invoke_results": invoke_results}
+
+    def _get_tool_executor(self):
+        """The thread pool tools are run on, created on first use and kept for the ToolUser's lifetime."""
+
+        with self._tool_executor_lock:
+            if self._tool_executor is None:
+                self._tool_executor = ThreadPoolExecutor(max_workers=self.max_tool_workers, thread_name_prefix="tool-user")
+            return self._tool_executor
+    
+    def _use_tool(self, tool, tool_arguments):
+        """Calls tool.use_tool (through its circuit breaker, if any), consuming streamed (iterator) output only up to the tool's output token budget."""
+
+        # The breaker covers consuming streamed output too, since that is where a streaming tool does its work (and fails).
+        with tool.circuit_breaker.guard() if tool.circuit_breaker is not None else nullcontext():
+            tool_result = tool.use_tool(**tool_arguments)
+            if not isinstance(tool_result, Iterator):
+                return tool_result
+
+            max_tokens = tool.max_output_tokens if tool.max_output_tokens is not None else self.max_tool_output_tokens
+            return self._collect_streamed_output(tool_result, max_tokens)
+
+    def _collect_streamed_output(self, chunks, max_tokens):
+        """Joins the string chunks of a streaming tool, stopping and closing the iterator once max_tokens tokens have been collected."""
+
+        collected = []
+        try:
+            if max_tokens is None:
+                return "".join(str(chunk) for chunk in chunks)
+
+            tokenizer = self._get_tokenizer()
+            n_tokens = 0
+            for chunk in chunks:
+                chunk_ids = tokenizer.encode(str(chunk)).ids
+                if n_tokens + len(chunk_ids) > max_tokens:
+                    collected.append(tokenizer.decode(chunk_ids[:max_tokens - n_tokens]))
+                    collected.append(f"\n[Output truncated after {max_tokens} tokens.]")
+                    break
+                collected.append(str(chunk))
+                n_tokens += len(chunk_ids)
+        finally:
+            # Closing a generator raises GeneratorExit inside it, so any work after the last pulled chunk is never done.
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+        return "".join(collected)
+
+    def _get_tokenizer(self):
+        return get_tokenizer()
+
+    def warmup(self):
+        """Eagerly initializes every tool's backend resources (see BaseTool.warmup), for deployments that prefer to pay start-up costs before the first request."""
+
+        get_tokenizer()
+        for tool in self.tools:
+            tool.warmup()
     
     def _construct_next_injection(self, invoke_results):
         """Constructs the next prompt based on the results of the previous function call invocations."""
@@ -203,15 +379,18 @@ class ToolUser:
             raise ValueError(f"Unrecognized status from invoke_results, {invoke_results['status']}.")
     
     def _complete(self, prompt, max_tokens_to_sample, temperature):
-        if self.first_party:
-            return self._messages_complete(prompt, max_tokens_to_sample, temperature)
-        else:
-            return self._completions_complete(prompt, max_tokens_to_sample, temperature)
+        # Roughly 4 characters per token. The estimate is corrected with the real usage once the response arrives.
+        estimated_input_tokens = len(prompt) // 4 + 1
+        with self.rate_limit_scheduler.request(estimated_input_tokens, max_tokens_to_sample, self.priority) as reservation:
+            if self.first_party:
+                return self._messages_complete(prompt, max_tokens_to_sample, temperature, reservation)
+            else:
+                return self._completions_complete(prompt, max_tokens_to_sample, temperature, reservation)
     
-    def _messages_complete(self, prompt, max_tokens_to_sample, temperature):
+    def _messages_complete(self, prompt, max_tokens_to_sample, temperature, reservation):
         messages = convert_completion_to_messages(prompt)
         if 'system' not in messages:
-            completion = self.client.messages.create(
+            raw_completion = self.client.messages.with_raw_response.create(
                 model=self.model,
                 max_tokens=max_tokens_to_sample,
                 temperature=temperature,
@@ -219,7 +398,7 @@ class ToolUser:
                 messages=messages['messages']
             )
         else:
-            completion = self.client.messages.create(
+            raw_completion = self.client.messages.with_raw_response.create(
                 model=self.model,
                 max_tokens=max_tokens_to_sample,
                 temperature=temperature,
@@ -227,17 +406,21 @@ class ToolUser:
                 messages=messages['messages'],
                 system=messages['system']
             )
+        reservation.record_headers(raw_completion.headers)
+        completion = raw_completion.parse()
+        reservation.record_usage(completion.usage.input_tokens, completion.usage.output_tokens)
         return convert_messages_completion_object_to_completions_completion_object(completion)
 
-    def _completions_complete(self, prompt, max_tokens_to_sample, temperature):
-        completion = self.client.completions.create(
+    def _completions_complete(self, prompt, max_tokens_to_sample, temperature, reservation):
+        raw_completion = self.client.completions.with_raw_response.create(
             model=self.model,
             max_tokens_to_sample=max_tokens_to_sample,
             temperature=temperature,
             stop_sequences=["</function_calls>", "\n\nHuman:"],
             prompt=prompt
         )
-        return completion
+        reservation.record_headers(raw_completion.headers)
+        return raw_completion.parse()
     
     @staticmethod
     def _function_calls_valid_format_and_invoke_extraction(last_completion):
@@ -2,6 +2,9 @@ from abc import ABC, abstractmethod
 
 from ..prompt_constructors import construct_format_tool_for_claude_prompt
 
+class ToolError(Exception):
+    """An error raised from use_tool whose message should be shown to Claude as a tool error, rather than propagated to the caller."""
+
 class BaseTool(ABC):
     """
     An abstract base class for defining custom tools that can be represented as Python functions.
@@ -11,6 +14,10 @@ class BaseTool(ABC):
     - name (str): The name of the tool.
     - description (str): A short description of what the tool does.
     - parameters (list): A list of parameters that the tool requires, each parameter should be a dictionary with 'name', 'type', and 'description' key/value pairs.
+    - max_output_tokens (int, optional): The maximum number of tokens of output to pull from a streaming tool (see below). If None, the ToolUser's max_tool_output_tokens is used. Search tools apply it to their formatted results instead.
+    - circuit_breaker (CircuitBreaker, optional): If provided, ToolUser calls use_tool through this breaker so a failing tool fails fast with an error shown to Claude.
+    - thread_safe (bool): Whether use_tool may be called from ToolUser's worker threads. Tools holding resources bound to one thread (like a sqlite3 connection
+      created with the default check_same_thread=True) should set it to False, and ToolUser then always calls them from the thread that called it. Default is True.
 
     Notes/TODOs:
     ------
@@ -20,12 +27,18 @@ class BaseTool(ABC):
     Usage:
     ------
     To use this class, you should subclass it and provide an implementation for the `use_tool` abstract method.
+    `use_tool` may either return its whole result or return an iterator (e.g. be a generator) of string chunks. Streamed chunks are only
+    pulled by ToolUser until the tool's output token budget is reached, after which the iterator is closed so the remaining work is never done.
     """
 
-    def __init__(self, name, description, parameters):
+    thread_safe = True
+
+    def __init__(self, name, description, parameters, max_output_tokens=None, circuit_breaker=None):
         self.name = name
         self.description = description
         self.parameters = parameters
+        self.max_output_tokens = max_output_tokens
+        self.circuit_breaker = circuit_breaker
     
     @abstractmethod
     def use_tool(self):
@@ -33,7 +46,20 @@ class BaseTool(ABC):
        
         pass
     
+    def warmup(self):
+        """Eagerly initializes any backend resources (clients, connections, tokenizers) the tool would otherwise set up lazily on first use. Does nothing by default."""
+
+        pass
+
     def format_tool_for_claude(self):
         """Returns a formatted representation of the tool suitable for the Claude system prompt."""
         
-        return construct_format_tool_for_claude_prompt(self.name, self.description, self.parameters)
\ No newline at end of file
+        return construct_format_tool_for_claude_prompt(self.name, self.description, self.parameters)
+
+    def format_tool_for_claude_for_query(self, query):
+        """
+        Returns a formatted representation of the tool tailored to query (the user's side of the conversation so far), e.g. describing only the parts
+        of a large database schema that matter for it. Defaults to format_tool_for_claude(), so tools only need to override this if they can use the query.
+        """
+
+        return self.format_tool_for_claude()
\ No newline at end of file
@@ -1,7 +1,12 @@
-from dataclasses import dataclass
+import ast
+from dataclasses import dataclass, replace
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 from ..base_tool import BaseTool
+from ...resources import get_tokenizer
+from .near_duplicates import remove_near_duplicates
 
 @dataclass
 class BaseSearchResult:
@@ -12,8 +17,55 @@ class BaseSearchResult:
     content: str
     source: str
 
+def allocate_token_budget(lengths: list[int], budget: int, weights: list[float]) -> list[int]:
+    """
+    Splits budget tokens between results of the given token lengths, in proportion to their weights, by water-filling: a result that needs less than
+    its share gets exactly what it needs, and what it leaves over is shared again between the rest, until every remaining result is capped at its share.
+    Returns the number of tokens each result may keep.
+    """
+
+    allocations = [0] * len(lengths)
+    remaining = set(i for i, length in enumerate(lengths) if length > 0)
+    budget_left = max(0, budget)
+    while remaining and budget_left > 0:
+        total_weight = sum(weights[i] for i in remaining)
+        shares = {i: budget_left * weights[i] / total_weight for i in remaining}
+        satisfied = [i for i in remaining if lengths[i] <= shares[i]]
+        if not satisfied:
+            for i in remaining:
+                allocations[i] = int(shares[i])
+            break
+        for i in satisfied:
+            allocations[i] = lengths[i]
+            budget_left -= lengths[i]
+            remaining.discard(i)
+    return allocations
+
 class BaseSearchTool(BaseTool):
-    """A search tool that can run a query and return a formatted string of search results."""
+    """
+    A search tool that can run a query and return a formatted string of search results.
+
+    use_tool also accepts a list of queries (or a string holding a list literal, which is how Claude passes one), so Claude can search several
+    angles on a topic in one invoke. The queries run concurrently, up to max_concurrent_queries at a time, and their results are merged by rank
+    (every query's first result, then every query's second, ...) with duplicates removed, into a single <search_results> block of at most
+    n_search_results_to_use results.
+
+    Pass search_cache (a SearchResultCache) to reuse the raw results of earlier identical searches, across tools, conversations and (with its disk tier) restarts.
+
+    Pass max_output_tokens to cap the tokens of all the results together, however many Claude asks for. The budget is split between results by rank
+    (result i is weighted 1/sqrt(i + 1)), and short results hand what they do not use on to longer ones, see allocate_token_budget. Results whose
+    share would be under min_tokens_per_result tokens are left out.
+
+    Results that are near-duplicates of a higher ranked result (mirrored or syndicated pages, overlapping chunks) are removed before formatting:
+    near_duplicate_threshold is the estimated Jaccard similarity of their word shingles, via MinHash, at which a result counts as a duplicate. None keeps every result.
+    """
+
+    def __init__(self, name, description, parameters, max_concurrent_queries=4, search_cache=None, min_tokens_per_result=50, near_duplicate_threshold=0.8, **kwargs):
+        super().__init__(name, description, parameters, **kwargs)
+        self.max_concurrent_queries = max_concurrent_queries
+        self.search_cache = search_cache
+        self.min_tokens_per_result = min_tokens_per_result
+        self.near_duplicate_threshold = near_duplicate_threshold
 
     @abstractmethod
     def raw_search(self, query: str, n_search_results_to_use: int):
@@ -24,10 +76,137 @@ class BaseSearchTool(BaseTool):
         :param n_search_results_to_use: The number of results to return.
         """
     
-    def use_tool(self, query: str, n_search_results_to_use: int):
-        raw_search_results = self.raw_search(query, n_search_results_to_use)
+    @property
+    def tokenizer(self):
+        """The Anthropic tokenizer, loaded on first use and shared by every tool in the process, unless a tokenizer was assigned to this tool."""
+
+        tokenizer = getattr(self, "_tokenizer", None)
+        return tokenizer if tokenizer is not None else get_tokenizer()
+
+    @tokenizer.setter
+    def tokenizer(self, tokenizer):
+        self._tokenizer = tokenizer
+
+    def warmup(self):
+        if getattr(self, "truncate_to_n_tokens", None) is not None or self.max_output_tokens is not None:
+            get_tokenizer()
+
+    def use_tool(self, query: str | list[str], n_search_results_to_use: int):
+        queries = BaseSearchTool._parse_queries(query)
+        results_per_query = self._search(queries, n_search_results_to_use)
+        raw_search_results = results_per_query[0] if len(queries) == 1 else BaseSearchTool._merge_results(results_per_query)
+        if self.near_duplicate_threshold is not None:
+            raw_search_results = remove_near_duplicates(raw_search_results, self.near_duplicate_threshold)
+        # The merged results of several queries hold up to n_search_results_to_use results each, keep the best n_search_results_to_use overall.
+        raw_search_results = raw_search_results[:n_search_results_to_use]
+        if self.max_output_tokens is not None:
+            raw_search_results = self._fit_to_token_budget(raw_search_results, self.max_output_tokens)
         displayable_search_results = BaseSearchTool._format_results_full(raw_search_results)
         return displayable_search_results
+
+    def _fit_to_token_budget(self, raw_search_results: list[BaseSearchResult], max_output_tokens: int) -> list[BaseSearchResult]:
+        """Truncates the results' contents so that, formatted, they take about max_output_tokens tokens in total."""
+
+        if not raw_search_results:
+            return raw_search_results
+
+        encodings = self.tokenizer.encode_batch([result.content for result in raw_search_results])
+        lengths = [len(encoding.ids) for encoding in encodings]
+        # The <search_results> markup and sources cost tokens too, whatever the contents are cut to.
+        overhead = len(self.tokenizer.encode(BaseSearchTool._format_results_full([replace(result, content="") for result in raw_search_results])).ids)
+        if sum(lengths) + overhead <= max_output_tokens:
+            return raw_search_results
+
+        weights = [1 / (i + 1) ** 0.5 for i in range(len(raw_search_results))]
+        allocations = allocate_token_budget(lengths, max_output_tokens - overhead, weights)
+        # Drop results whose share is too small to be useful, and give their share to the rest.
+        kept = [i for i, allocation in enumerate(allocations) if allocation >= min(self.min_tokens_per_result, lengths[i])] or [0]
+        if len(kept) < len(raw_search_results):
+            raw_search_results = [raw_search_results[i] for i in kept]
+            encodings = [encodings[i] for i in kept]
+            lengths = [lengths[i] for i in kept]
+            overhead = len(self.tokenizer.encode(BaseSearchTool._format_results_full([replace(result, content="") for result in raw_search_results])).ids)
+            allocations = allocate_token_budget(lengths, max_output_tokens - overhead, weights[:len(kept)])
+
+        return [
+            result if allocation >= length else replace(result, content=self.tokenizer.decode(encoding.ids[:allocation]).strip())
+            for result, encoding, length, allocation in zip(raw_search_results, encodings, lengths, allocations)
+        ]
+
+    @property
+    def cache_namespace(self) -> str:
+        """
+        Identifies this tool's backend and settings in the search cache, as "<backend>:<details>". Tools with the same namespace share cached results,
+        and the backend part picks the cache TTL. Subclasses should include whatever changes their results, e.g. the index searched.
+        """
+
+        return f"{type(self).__name__.lower()}:{self.name}:{getattr(self, 'truncate_to_n_tokens', None)}"
+
+    def cache_ttl(self, raw_search_results: list[BaseSearchResult]) -> Optional[float]:
+        """
+        Seconds the search cache should keep raw_search_results for, or None for the cache's TTL for this tool's backend.
+        Override this to cache degraded results (e.g. ones a backend only partly answered) for a shorter time, or 0 to not cache them.
+        """
+
+        return None
+
+    def _search(self, queries: list[str], n_search_results_to_use: int) -> list[list[BaseSearchResult]]:
+        """Returns the raw search results of each query, from the search cache where possible. Only the misses are searched."""
+
+        results = {}
+        if self.search_cache is not None:
+            for query in queries:
+                cached = self.search_cache.get(self.cache_namespace, query, n_search_results_to_use)
+                if cached is not None:
+                    results[query] = cached
+        misses = [query for query in queries if query not in results]
+        if misses:
+            fetched = [self.raw_search(misses[0], n_search_results_to_use)] if len(misses) == 1 else self.raw_search_many(misses, n_search_results_to_use)
+            for query, query_results in zip(misses, fetched):
+                results[query] = query_results
+                if self.search_cache is not None:
+                    self.search_cache.put(self.cache_namespace, query, n_search_results_to_use, query_results, ttl=self.cache_ttl(query_results))
+        return [results[query] for query in queries]
+
+    def raw_search_many(self, queries: list[str], n_search_results_to_use: int) -> list[list[BaseSearchResult]]:
+        """
+        Runs several queries concurrently and returns the raw search results of each, in the order of queries.
+        Override this for backends with a native batch or async API.
+        """
+
+        with ThreadPoolExecutor(max_workers=max(1, min(len(queries), self.max_concurrent_queries))) as executor:
+            return list(executor.map(lambda query: self.raw_search(query, n_search_results_to_use), queries))
+
+    @staticmethod
+    def _parse_queries(query) -> list[str]:
+        """Returns the list of queries in query, which is either a single query, a list of queries, or a string holding a list literal like '["a", "b"]'."""
+
+        if isinstance(query, str) and query.strip().startswith("[") and query.strip().endswith("]"):
+            try:
+                parsed = ast.literal_eval(query.strip())
+            except (ValueError, SyntaxError):
+                parsed = None
+            if isinstance(parsed, list) and parsed and all(isinstance(q, str) for q in parsed):
+                query = parsed
+        queries = [query] if isinstance(query, str) else [str(q) for q in query]
+        # Drop repeated queries, keeping the first.
+        return list(dict.fromkeys(queries))
+
+    @staticmethod
+    def _merge_results(results_per_query: list[list[BaseSearchResult]]) -> list[BaseSearchResult]:
+        """Interleaves the results of several queries by rank, dropping results already seen (the same source with the same content)."""
+
+        merged = []
+        seen = set()
+        for rank in range(max((len(results) for results in results_per_query), default=0)):
+            for results in results_per_query:
+                if rank >= len(results):
+                    continue
+                key = (results[rank].source, results[rank].content)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(results[rank])
+        return merged
     
     @staticmethod
     def _format_results(raw_search_results:list[BaseSearchResult]):
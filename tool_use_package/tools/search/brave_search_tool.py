@@ -1,35 +1,168 @@
+import asyncio
 import os
+import time
 from typing import Optional
-from anthropic import Anthropic
-import requests
-import asyncio
-from tenacity import retry, wait_exponential, stop_after_attempt
-from bs4 import BeautifulSoup
+
 import aiohttp
 
 # Import our base search tool from which all other search tools inherit. We use this pattern to make building new search tools easy.
 from .base_search_tool import BaseSearchResult, BaseSearchTool
+from .web_fetcher import WebPageFetcher
+from ..base_tool import ToolError
+from ...background_loop import get_background_loop
+from ...circuit_breaker import get_circuit_breaker
+from ...rate_limiter import TokenBucket
+from ...resources import shared_resources
+
+# Bytes of HTML to download per token of page content we keep. Markup, scripts and styles usually make up most of a page,
+# so this leaves plenty of room for the text we truncate to.
+HTML_BYTES_PER_TOKEN = 100
+
+BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+
+class BraveAPIError(ToolError):
+    """Raised when a Brave search fails. Since it is a ToolError, ToolUser injects it back to Claude instead of an empty result."""
+
+class BraveRateLimitError(BraveAPIError):
+    """Raised instead of waiting when Brave's rate limit will not reset for longer than the client is willing to wait (e.g. the monthly quota is used up)."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"The Brave search quota is used up for the next {retry_after:.0f} seconds, so do not call this tool again right now.")
 
 # Brave Searcher
 class BraveAPI:
-    def __init__(self, api_key: str):
+    """
+    An async client for the Brave web search API, running on the shared background event loop. Use get_brave_api(api_key) to share one client,
+    and so one connection pool, rate limit and set of in-flight searches, between every tool using the same subscription.
+
+    - Requests go through a client-side token bucket of requests_per_second (1 on the free plan, 20 on Base), so concurrent searches queue
+      briefly instead of hitting 429s. The bucket adapts to the X-RateLimit-* headers Brave returns, and when a window's remaining count hits 0
+      every search waits for its X-RateLimit-Reset. Waits longer than max_rate_limit_wait seconds raise BraveRateLimitError instead.
+    - Identical queries that are already in flight share the one request.
+    - Server errors, 429s and network errors are retried up to max_retries times with exponential backoff, and count against the
+      process-wide "brave_api" circuit breaker. Failures raise BraveAPIError.
+    """
+
+    def __init__(self, api_key: str, requests_per_second=1, timeout=10, max_retries=3, max_rate_limit_wait=30, url=BRAVE_SEARCH_URL, clock=time.monotonic):
         self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self._clock = clock
+        self.rate_limit = TokenBucket(requests_per_second, period=1, clock=clock)
+        self._paused_until = 0.0
+        self._in_flight = {} # query -> task, only touched from the background loop
+        self._session = None
+        # Shared by every BraveAPI in the process, so once Brave looks down no conversation waits on retries.
+        self.circuit_breaker = get_circuit_breaker("brave_api")
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(10))
     def search(self, query: str) -> dict:
-        headers = {"Accept": "application/json", "X-Subscription-Token": self.api_key}
-        resp = requests.get(
-            "https://api.search.brave.com/res/v1/web/search",
-            params={"q": query,
-                    "count": 20 # Max number of results to return, can filter down later
-                    },
-            headers=headers,
-            timeout=60
-        )
-        if resp.status_code != 200:
-            print(f"Search request failed: {resp.text}")
-            return {}
-        return resp.json()
+        """Runs search_async on the background loop, for synchronous callers."""
+
+        return get_background_loop().run(self.search_async(query))
+
+    async def search_async(self, query: str) -> dict:
+        """Returns Brave's response to query. If the same query is already in flight, waits for its response instead of sending another request."""
+
+        task = self._in_flight.get(query)
+        if task is None:
+            task = self._in_flight[query] = asyncio.ensure_future(self._search(query))
+            task.add_done_callback(lambda _: self._in_flight.pop(query, None))
+        # Shielded, so one caller giving up does not cancel the request for the others.
+        return await asyncio.shield(task)
+
+    async def session(self) -> aiohttp.ClientSession:
+        """The client's session, created on first use. Only ever used from the background loop, so it needs no lock."""
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def _search(self, query: str) -> dict:
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 4))
+            await self._wait_for_rate_limit()
+            probe = self.circuit_breaker.before_call()
+            session = await self.session()
+            try:
+                async with session.get(
+                    self.url,
+                    params={"q": query,
+                            "count": 20 # Max number of results to return, can filter down later
+                            },
+                    headers={"Accept": "application/json", "X-Subscription-Token": self.api_key}
+                ) as response:
+                    self._update_rate_limit(response.headers)
+                    if response.status == 200:
+                        search_response = await response.json()
+                        self.circuit_breaker.record_success()
+                        return search_response
+                    body = await response.text()
+            except asyncio.CancelledError:
+                # Says nothing about Brave's health, but give back the probe slot before_call may have reserved, or a half-open breaker would wait for this call forever.
+                if probe is not None:
+                    self.circuit_breaker.release_probe(probe)
+                raise
+            except Exception as e:
+                # Network errors, timeouts, and 200 responses whose body is not valid JSON.
+                self.circuit_breaker.record_failure()
+                error = BraveAPIError(f"The Brave search request failed: {e!r}")
+                continue
+            # Server errors and rate limiting mean the backend is unhealthy, so count them against the breaker (and retry them).
+            if response.status >= 500 or response.status == 429:
+                self.circuit_breaker.record_failure()
+                error = BraveAPIError(f"The Brave search request failed with status {response.status}: {body[:500]}")
+                continue
+            self.circuit_breaker.record_success()
+            raise BraveAPIError(f"The Brave search request was rejected with status {response.status}: {body[:500]}")
+        raise error
+
+    async def _wait_for_rate_limit(self):
+        while True:
+            paused_for = self._paused_until - self._clock()
+            if paused_for > self.max_rate_limit_wait:
+                raise BraveRateLimitError(paused_for)
+            wait = paused_for if paused_for > 0 else self.rate_limit.try_acquire(1)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def _update_rate_limit(self, headers):
+        """
+        Adapts to Brave's rate limit headers, which hold one comma separated value per window, shortest first, e.g.
+        X-RateLimit-Limit: 1, 15000 / X-RateLimit-Remaining: 0, 14000 / X-RateLimit-Reset: 1, 1419704 (seconds until the window resets).
+        """
+
+        limits = BraveAPI._int_list_header(headers, "X-RateLimit-Limit")
+        remainings = BraveAPI._int_list_header(headers, "X-RateLimit-Remaining")
+        resets = BraveAPI._int_list_header(headers, "X-RateLimit-Reset")
+        if limits and remainings:
+            # The first window is per second, like the bucket.
+            self.rate_limit.update(capacity=limits[0], remaining=remainings[0])
+        for remaining, reset in zip(remainings, resets):
+            if remaining <= 0:
+                self._paused_until = max(self._paused_until, self._clock() + reset)
+
+    @staticmethod
+    def _int_list_header(headers, name) -> list[int]:
+        try:
+            return [int(value) for value in headers.get(name, "").split(",") if value.strip()]
+        except ValueError:
+            return []
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+def get_brave_api(api_key: str, **kwargs) -> BraveAPI:
+    """Returns the process-wide BraveAPI for api_key, creating it with kwargs if it does not exist yet."""
+
+    return shared_resources.get(("brave_api", api_key), lambda: BraveAPI(api_key, **kwargs))
 
 class BraveSearchTool(BaseSearchTool):
 
@@ -37,23 +170,45 @@ class BraveSearchTool(BaseSearchTool):
                  name="search_brave",
                  description="The search engine will search using the Brave search engine for web pages similar to your query. It returns for each page its url and the full page content. Use this tool if you want to make web searches about a topic.",
                  parameters=[
-                    {"name": "query", "type": "str", "description": "The search query to enter into the Brave search engine."},
+                    {"name": "query", "type": "str", "description": "The search query to enter into the Brave search engine. To search several angles at once, pass a list of queries instead, like [\"first query\", \"second query\"]."},
                     {"name": "n_search_results_to_use", "type": "int", "description": "The number of search results to return, where each search result is a website page."}
                  ],
                  brave_api_key=os.environ['BRAVE_API_KEY'],
-                 truncate_to_n_tokens=5000):
+                 truncate_to_n_tokens=5000,
+                 scrape_deadline=10,
+                 page_fetcher=None,
+                 page_cache=None,
+                 requests_per_second=1,
+                 snippet_cache_ttl=60,
+                 **kwargs):
         """
         :param name: The name of the tool.
         :param description: The description of the tool.
         :param parameters: The parameters for the tool.
         :param brave_api_key: The Brave API key to use for searching. Get one at https://api.search.brave.com/register.
         :param truncate_to_n_tokens: The number of tokens to truncate web page content to.
+        :param scrape_deadline: Seconds to spend scraping the result pages. Pages not scraped by then are described by Brave's snippet instead.
+        :param page_fetcher: The WebPageFetcher to scrape pages with. Defaults to one owned by this tool, with its own connection pool,
+        that downloads at most HTML_BYTES_PER_TOKEN bytes of a page per token of truncate_to_n_tokens.
+        :param page_cache: A PageCache for the default page_fetcher to cache scraped pages in, so repeat scrapes of a page cost a 304 or nothing.
+        :param requests_per_second: The request rate of the Brave subscription behind brave_api_key, 1 for the free plan. Only used by the first tool created for a key.
+        :param snippet_cache_ttl: Seconds search_cache keeps searches in which some page was not scraped and is only described by Brave's snippet,
+        so a scrape that missed scrape_deadline once is retried soon. 0 does not cache them at all.
+        :param kwargs: Passed on to BaseSearchTool, e.g. max_concurrent_queries or search_cache.
         """
-        super().__init__(name, description, parameters)
-        self.api = BraveAPI(brave_api_key)
+        super().__init__(name, description, parameters, **kwargs)
+        self.api = get_brave_api(brave_api_key, requests_per_second=requests_per_second)
+        self.snippet_cache_ttl = snippet_cache_ttl
         self.truncate_to_n_tokens = truncate_to_n_tokens
-        if truncate_to_n_tokens is not None:
-            self.tokenizer = Anthropic().get_tokenizer()
+        self.scrape_deadline = scrape_deadline
+        if page_fetcher is None:
+            fetcher_kwargs = {} if truncate_to_n_tokens is None else {"max_page_bytes": HTML_BYTES_PER_TOKEN * truncate_to_n_tokens}
+            page_fetcher = WebPageFetcher(page_cache=page_cache, **fetcher_kwargs)
+        self.page_fetcher = page_fetcher
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"brave:{self.truncate_to_n_tokens}"
 
     def parse_faq(self, faq: dict) -> BaseSearchResult:
         """
@@ -101,34 +256,36 @@ class BraveSearchTool(BaseSearchTool):
             .replace("&#x27;", "'")
         )
     
-    async def parse_web(self, web_item: dict, query: str) -> BaseSearchResult:
+    def parse_web(self, web_item: dict, content: Optional[str] = None) -> BaseSearchResult:
         """
         https://api.search.brave.com/app/documentation/responses#Search
+
+        Without the scraped page content, the result falls back to Brave's description of the page.
         """
         url = web_item.get("url", "")
         title = web_item.get("title", "")
         description = self.remove_strong(web_item.get("description", ""))
         snippet = (
-            f"Web Page Title: {title}"
-            f"Web Page URL: {url}"
+            f"Web Page Title: {title}\n"
+            f"Web Page URL: {url}\n"
             f"Web Page Description: {description}"
         )
-
-        try:
-            content = await self.__get_url_content(url)
-            if not content:
-                return BaseSearchResult(
-            source=url,
-            content=""
-            )
-            snippet+="\nWeb Page Content: " + self.truncate_page_content(content)
-        except:
-            print(f"Failed to scrape {url}")
+        if content:
+            snippet += "\nWeb Page Content: " + self.truncate_page_content(content)
         return BaseSearchResult(
             source=url,
             content=snippet
         )
 
+    @staticmethod
+    def is_snippet_only(result: BaseSearchResult) -> bool:
+        """Whether result is a web page described by Brave's snippet alone, because its page could not be scraped (see parse_web)."""
+
+        return result.content.startswith("Web Page Title: ") and "\nWeb Page Content: " not in result.content
+
+    def cache_ttl(self, raw_search_results: list[BaseSearchResult]) -> Optional[float]:
+        return self.snippet_cache_ttl if any(self.is_snippet_only(result) for result in raw_search_results) else None
+
     def truncate_page_content(self, page_content: str):
         if self.truncate_to_n_tokens is None:
             return page_content.strip()
@@ -167,23 +324,15 @@ class BraveSearchTool(BaseSearchTool):
 
         # Get the search results
         search_results: list[BaseSearchResult] = []
-        async_web_parser_loop = asyncio.get_event_loop()
-        web_parsing_tasks = [] # We'll queue up the web parsing tasks here, since they're costly
+        web_items_to_parse = {} # Index in search_results -> web item. We'll scrape these pages all at once below, since they're costly
 
         for item in correct_ordering:
             item_type = item.get("type")
             if item_type == "web":
                 web_item = web_items.pop(0)
-                ## We'll add a placeholder search result here, and then replace it with the parsed web result later
-                url = web_item.get("url", "")
-                placeholder_search_result = BaseSearchResult(
-                    source=url,
-                    content=f"Web Page Title: {web_item.get('title', '')}\nWeb Page URL: {url}\nWeb Page Description: {self.remove_strong(web_item.get('description', ''))}"
-                )
-                search_results.append(placeholder_search_result)
-                ## Queue up the web parsing task
-                task = async_web_parser_loop.create_task(self.parse_web(web_item, query))
-                web_parsing_tasks.append(task)
+                ## We'll add a placeholder search result here (Brave's description of the page), and then replace it with the scraped page later
+                web_items_to_parse[len(search_results)] = web_item
+                search_results.append(self.parse_web(web_item))
             elif item_type == "news":
                 parsed_news = self.parse_news(news_items.pop(0))
                 if parsed_news is not None:
@@ -194,26 +343,21 @@ class BraveSearchTool(BaseSearchTool):
             if len(search_results) >= n_search_results_to_use:
                 break
 
-        ## Replace the placeholder search results with the parsed web results
-        web_results = async_web_parser_loop.run_until_complete(asyncio.gather(*web_parsing_tasks))
-        web_results_urls = [web_result.source for web_result in web_results]
-        for i, search_result in enumerate(search_results):
-            url = search_result.source
-            if url in web_results_urls:
-                search_results[i] = web_results[web_results_urls.index(url)]
+        ## Scrape the pages concurrently on the shared background loop. Pages not scraped by the deadline keep their placeholder.
+        urls = [web_item.get("url", "") for web_item in web_items_to_parse.values()]
+        page_contents = get_background_loop().run(self.page_fetcher.fetch_all(urls, self.scrape_deadline))
+        for i, web_item in web_items_to_parse.items():
+            url = web_item.get("url", "")
+            if url in page_contents:
+                search_results[i] = self.parse_web(web_item, page_contents[url])
                 print("Reading content from: ", url)
 
         return search_results
 
-    async def __get_url_content(self, url: str) -> Optional[str]:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    text = soup.get_text(strip=True, separator='\n')
-                    return text
-        return None
+    def close(self):
+        """Closes the tool's pooled HTTP connections."""
+
+        get_background_loop().run(self.page_fetcher.close())
 
 if __name__ == "__main__":
     from ...tool_user import ToolUser
@@ -1,8 +1,8 @@
-from anthropic import Anthropic
 from elasticsearch import Elasticsearch
 
 # Import our base search tool from which all other search tools inherit. We use this pattern to make building new search tools easy.
 from .base_search_tool import BaseSearchResult, BaseSearchTool
+from ...resources import shared_resources
 
 # Elasticsearch Searcher Tool
 class ElasticsearchSearchTool(BaseSearchTool):
@@ -15,7 +15,8 @@ class ElasticsearchSearchTool(BaseSearchTool):
                 elasticsearch_api_key_id,
                 elasticsearch_api_key,
                 elasticsearch_index,
-                truncate_to_n_tokens = 5000):
+                truncate_to_n_tokens = 5000,
+                **kwargs):
         """
         :param name: The name of the tool.
         :param description: The description of the tool.
@@ -25,29 +26,49 @@ class ElasticsearchSearchTool(BaseSearchTool):
         :param elasticsearch_api_key: The api key for the Elasticsearch index.
         :param elasticsearch_index: The index to search over.
         :param truncate_to_n_tokens: The number of tokens to truncate the page content to. If None, the full page content is returned.
+        :param kwargs: Passed on to BaseSearchTool, e.g. max_concurrent_queries or search_cache.
         """
-        super().__init__(name, description, parameters)
+        super().__init__(name, description, parameters, **kwargs)
 
         self.index = elasticsearch_index
         self.cloud_id = elasticsearch_cloud_id
         self.api_key_id = elasticsearch_api_key_id
         self.api_key = elasticsearch_api_key
-        self._connect_to_elasticsearch()
 
         self.truncate_to_n_tokens = truncate_to_n_tokens
-        if truncate_to_n_tokens is not None:
-            self.tokenizer = Anthropic().get_tokenizer() 
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"elasticsearch:{self.cloud_id}:{self.index}:{self.truncate_to_n_tokens}"
+
+    @property
+    def client(self) -> Elasticsearch:
+        """The Elasticsearch client, connected and index-checked on first use. Tools on the same cluster share one client."""
+
+        return self._connect_to_elasticsearch()
     
-    def _connect_to_elasticsearch(self):
-        self.client = Elasticsearch(
-            cloud_id=self.cloud_id,
-            api_key=(self.api_key_id, self.api_key)
+    def _connect_to_elasticsearch(self) -> Elasticsearch:
+        client = shared_resources.get(
+            ("elasticsearch", self.cloud_id, self.api_key_id),
+            lambda: Elasticsearch(
+                cloud_id=self.cloud_id,
+                api_key=(self.api_key_id, self.api_key)
+            )
         )
-        if not self.client.indices.exists(index=self.index):
+        shared_resources.get(("elasticsearch_index_checked", self.cloud_id, self.api_key_id, self.index), lambda: self._check_index(client))
+        return client
+
+    def _check_index(self, client: Elasticsearch) -> bool:
+        if not client.indices.exists(index=self.index):
             raise ValueError(f"Elasticsearch Index {self.index} does not exist.")
-        index_mapping = self.client.indices.get_mapping(index=self.index)
+        index_mapping = client.indices.get_mapping(index=self.index)
         if "text" not in index_mapping.body[self.index]["mappings"]["properties"].keys():
             raise ValueError(f"Index {self.index} does not have a field called 'text'.")
+        return True
+
+    def warmup(self):
+        super().warmup()
+        self._connect_to_elasticsearch()
     
     def truncate_page_content(self, page_content: str) -> str:
         if self.truncate_to_n_tokens is None:
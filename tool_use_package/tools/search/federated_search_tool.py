@@ -0,0 +1,136 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .base_search_tool import BaseSearchResult, BaseSearchTool
+
+class FederatedSearchTool(BaseSearchTool):
+    """
+    A search tool that runs each query against several child search tools at once (e.g. Elasticsearch, a vector store and web search),
+    and merges their results with reciprocal rank fusion, so one invoke gets the best of every backend.
+
+    Each child gets child_timeouts[child.name] seconds (default: timeout), and the whole search never takes more than timeout seconds:
+    children that have not answered by then, or that fail, are left out and the results that did arrive are returned.
+    A slow child's search keeps running in the background until it finishes, but nothing waits for it. Children are searched on the tool's own
+    pool of len(search_tools) * max_concurrent_queries threads. A child already running max_concurrent_queries searches (e.g. because its backend
+    hangs) is left out of new searches until one finishes, so it ties up at most its share of the pool and never delays the other children.
+    Call close() to shut the pool down.
+
+    Reciprocal rank fusion scores a result sum(1 / (rrf_k + rank)) over the children that returned it, so results several backends agree on rise
+    to the top without having to compare the backends' incomparable scores. Results are matched across children by source: the first result
+    from a source in one child matches the first result from that source in another, and so on.
+    """
+
+    def __init__(self,
+                 name,
+                 description,
+                 parameters,
+                 search_tools: list[BaseSearchTool],
+                 timeout=10,
+                 child_timeouts=None,
+                 rrf_k=60,
+                 **kwargs):
+        """
+        :param name: The name of the tool.
+        :param description: The description of the tool.
+        :param parameters: The parameters for the tool.
+        :param search_tools: The child search tools to query.
+        :param timeout: Seconds to wait for the children in total.
+        :param child_timeouts: Seconds to wait for particular children, by tool name.
+        :param rrf_k: The reciprocal rank fusion constant. Larger values flatten the difference between high and low ranks.
+        :param kwargs: Passed on to BaseSearchTool, e.g. max_output_tokens.
+        """
+        super().__init__(name, description, parameters, **kwargs)
+        self.search_tools = search_tools
+        self.timeout = timeout
+        self.child_timeouts = child_timeouts or {}
+        self.rrf_k = rrf_k
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._in_flight = [0] * len(search_tools) # Searches running or queued on the pool, per child
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"federated:{self.name}:" + ",".join(search_tool.cache_namespace for search_tool in self.search_tools)
+
+    def raw_search(self, query: str, n_search_results_to_use: int) -> list[BaseSearchResult]:
+        results_per_child = self._search_children(query, n_search_results_to_use)
+        return self.reciprocal_rank_fusion(results_per_child, self.rrf_k)[:n_search_results_to_use]
+
+    def _search_children(self, query: str, n_search_results_to_use: int) -> list[list[BaseSearchResult]]:
+        """Returns the results of each child that answered in time, in the order of search_tools."""
+
+        start = time.monotonic()
+        executor = self._get_executor()
+        futures = {}
+        for i, search_tool in enumerate(self.search_tools):
+            with self._executor_lock:
+                busy = self._in_flight[i] >= self.max_concurrent_queries
+                if not busy:
+                    self._in_flight[i] += 1
+            if busy:
+                print(f"Search with {search_tool.name} is still busy with earlier searches, leaving it out.")
+                continue
+            try:
+                future = executor.submit(search_tool._search, [query], n_search_results_to_use)
+            except BaseException:
+                self._search_done(i)
+                raise
+            future.add_done_callback(lambda _, i=i: self._search_done(i))
+            futures[future] = i
+        deadlines = {future: start + min(self.child_timeouts.get(self.search_tools[i].name, self.timeout), self.timeout) for future, i in futures.items()}
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            for future in [future for future in pending if deadlines[future] <= now]:
+                print(f"Search with {self.search_tools[futures[future]].name} did not finish in time, leaving it out.")
+                future.cancel() # In case it is still queued behind hung searches
+                pending.discard(future)
+            if not pending:
+                break
+            _, pending = wait(pending, timeout=min(deadlines[future] for future in pending) - now, return_when=FIRST_COMPLETED)
+
+        results_per_child = []
+        for future, i in sorted(futures.items(), key=lambda item: item[1]):
+            if not future.done() or future.cancelled():
+                continue
+            try:
+                results_per_child.append(future.result()[0])
+            except Exception as e:
+                print(f"Search with {self.search_tools[i].name} failed, leaving it out: {e}")
+        return results_per_child
+
+    def _get_executor(self):
+        """The thread pool children are searched on, created on first use and kept until close()."""
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.search_tools)) * self.max_concurrent_queries, thread_name_prefix="federated-search")
+            return self._executor
+
+    def _search_done(self, i):
+        with self._executor_lock:
+            self._in_flight[i] -= 1
+
+    def close(self):
+        """Shuts down the pool children are searched on, without waiting for searches still running on it."""
+
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    @staticmethod
+    def reciprocal_rank_fusion(results_per_child: list[list[BaseSearchResult]], rrf_k=60) -> list[BaseSearchResult]:
+        """Merges ranked result lists by descending sum(1 / (rrf_k + rank)). Ties keep the order results were first seen in."""
+
+        scores = {}
+        first_seen = {}
+        for results in results_per_child:
+            occurrences = {}
+            for rank, result in enumerate(results, start=1):
+                occurrence = occurrences[result.source] = occurrences.get(result.source, 0) + 1
+                key = (result.source, occurrence) if result.source else (result.source, result.content)
+                scores[key] = scores.get(key, 0.0) + 1 / (rrf_k + rank)
+                first_seen.setdefault(key, result)
+        return [first_seen[key] for key in sorted(scores, key=lambda key: -scores[key])]
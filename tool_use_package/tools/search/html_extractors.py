@@ -0,0 +1,89 @@
+import importlib
+import re
+from typing import Callable, Optional
+
+from bs4 import BeautifulSoup
+
+XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+# Elements that hold page chrome or code rather than content. They are dropped before extracting text, so less junk reaches the tokenizer.
+BOILERPLATE_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "nav", "footer", "aside")
+
+def extract_text_bs4(html: str) -> str:
+    """Extracts the text of an HTML page with BeautifulSoup's pure-Python parser. Always available, but slow."""
+
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup.find_all(BOILERPLATE_TAGS):
+        element.decompose()
+    return soup.get_text(strip=True, separator="\n")
+
+def extract_text_lxml(html: str) -> str:
+    """Extracts the text of an HTML page with lxml (libxml2). Needs `pip install lxml`."""
+
+    import lxml.html
+    from lxml import etree
+
+    # lxml refuses str input that declares its own encoding, which XHTML pages often do. The text is already decoded, so the declaration can go.
+    html = XML_DECLARATION.sub("", html, count=1)
+    if not html.strip():
+        return ""
+    root = lxml.html.document_fromstring(html)
+    # Walk the tree rather than strip the boilerplate from it: stripping an element merges the text on either side of it into one line.
+    texts = []
+    skipped_depth = 0
+    for event, element in etree.iterwalk(root, events=("start", "end", "comment", "pi")):
+        if event in ("comment", "pi"):
+            # Reported once, with no start or end. Only their tail is text.
+            if not skipped_depth:
+                texts.append(element.tail)
+        elif event == "start":
+            if skipped_depth or element.tag in BOILERPLATE_TAGS:
+                skipped_depth += 1
+            else:
+                texts.append(element.text)
+        else:
+            if skipped_depth:
+                skipped_depth -= 1
+            if not skipped_depth and element is not root:
+                texts.append(element.tail)
+    return "\n".join(text.strip() for text in texts if text and text.strip())
+
+def extract_text_selectolax(html: str) -> str:
+    """Extracts the text of an HTML page with selectolax (lexbor). Needs `pip install selectolax`. The fastest of the extractors."""
+
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(BOILERPLATE_TAGS))
+    if tree.root is None:
+        return ""
+    return "\n".join(text for text in (node.text(deep=False, strip=True) for node in tree.root.traverse(include_text=True) if node.tag == "-text") if text)
+
+# Extractors by name, fastest first.
+HTML_EXTRACTORS = {
+    "selectolax": extract_text_selectolax,
+    "lxml": extract_text_lxml,
+    "bs4": extract_text_bs4,
+}
+_EXTRACTOR_MODULES = {"selectolax": "selectolax.lexbor", "lxml": "lxml.html", "bs4": "bs4"}
+
+def _is_installed(name: str) -> bool:
+    try:
+        importlib.import_module(_EXTRACTOR_MODULES[name])
+    except ImportError:
+        return False
+    return True
+
+def get_html_extractor(name: Optional[str] = None) -> Callable[[str], str]:
+    """
+    Returns the extractor called name (one of HTML_EXTRACTORS), or by default the fastest one whose parser is installed.
+    Every extractor drops BOILERPLATE_TAGS and comments, and returns the page's text nodes one per line.
+    """
+
+    if name is not None:
+        if name not in HTML_EXTRACTORS:
+            raise ValueError(f"Unknown HTML extractor {name!r}, expected one of {list(HTML_EXTRACTORS)}.")
+        if not _is_installed(name):
+            raise ImportError(f"The {name} HTML extractor needs `pip install {name}`.")
+        return HTML_EXTRACTORS[name]
+    return next(extractor for extractor_name, extractor in HTML_EXTRACTORS.items() if _is_installed(extractor_name))
@@ -0,0 +1,65 @@
+import re
+import zlib
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+class MinHasher:
+    """
+    Sketches texts with MinHash over word shingles, so the Jaccard similarity of two texts' shingle sets can be estimated from two small arrays.
+
+    Attributes:
+    -----------
+    - num_perm (int): The number of hash functions, i.e. the sketch size. More is more accurate (the error is about 1/sqrt(num_perm)). Default is 64.
+    - shingle_size (int): The number of consecutive words in each shingle. Default is 5.
+    """
+
+    def __init__(self, num_perm=64, shingle_size=5, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        words = re.findall(r"\w+", text.lower())
+        k = min(self.shingle_size, len(words))
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)} if k else set()
+
+    def sketch(self, text):
+        """Returns the MinHash signature of text, or None if it has no words."""
+
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        # (a * h + b) mod p for every hash function and shingle at once, then the minimum per hash function.
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def similarity(sketch_a, sketch_b):
+        """The estimated Jaccard similarity of the texts behind two sketches."""
+
+        return float(np.mean(sketch_a == sketch_b))
+
+def remove_near_duplicates(results, threshold=0.8, min_hasher=None):
+    """
+    Returns results without any result whose content is a near-duplicate (estimated Jaccard similarity of word shingles >= threshold) of a
+    result ranked above it. Order is preserved. Results with empty content are always kept.
+    """
+
+    min_hasher = min_hasher or _default_min_hasher
+    kept = []
+    kept_sketches = []
+    for result in results:
+        sketch = min_hasher.sketch(result.content)
+        if sketch is not None and any(MinHasher.similarity(sketch, kept_sketch) >= threshold for kept_sketch in kept_sketches):
+            continue
+        kept.append(result)
+        if sketch is not None:
+            kept_sketches.append(sketch)
+    return kept
+
+_default_min_hasher = MinHasher()
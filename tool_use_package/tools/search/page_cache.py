@@ -0,0 +1,165 @@
+import re
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+from .search_cache import SQLiteLRUStore
+
+@dataclass
+class CachedPage:
+    """
+    The text of a page as it was last fetched, with the validators to revalidate it with.
+
+    Attributes:
+    -----------
+    - text (str): The extracted text of the page.
+    - etag (str): The page's ETag header, if it had one.
+    - last_modified (str): The page's Last-Modified header, if it had one.
+    - fresh (bool): Whether the page can be used without asking the site. Stale pages should be revalidated with conditional_headers().
+    """
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fresh: bool = True
+
+    def conditional_headers(self) -> dict:
+        """Headers for a conditional GET, which the site answers with 304 Not Modified if the page has not changed."""
+
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def freshness_lifetime(headers: Mapping[str, str], default_ttl: float, max_ttl: float) -> Optional[float]:
+    """
+    How many seconds a response stays fresh, from its Cache-Control, Expires and Last-Modified headers, capped at max_ttl.
+    Returns None if the response must not be stored at all (Cache-Control: no-store).
+
+    Without explicit freshness, a page that has not changed in a long time is assumed to stay unchanged a while longer:
+    it stays fresh for a tenth of its age (the heuristic RFC 9111 suggests), up to default_ttl. Otherwise it stays fresh for default_ttl.
+    """
+
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    max_age = re.search(r"(?:^|[,\s])max-age\s*=\s*\"?(\d+)", cache_control)
+    if max_age is not None:
+        return min(float(max_age.group(1)), max_ttl)
+
+    date = _parse_http_date(headers.get("Date")) or time.time()
+    expires = headers.get("Expires")
+    if expires is not None:
+        expires_at = _parse_http_date(expires)
+        return min(max(expires_at - date, 0.0), max_ttl) if expires_at is not None else 0.0 # An invalid Expires means already expired
+    last_modified = _parse_http_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        return min(max(date - last_modified, 0.0) / 10, default_ttl, max_ttl)
+    return min(default_ttl, max_ttl)
+
+class PageCache:
+    """
+    An on-disk cache of scraped pages' extracted text, keyed by URL, so popular pages are not downloaded and parsed again for every search.
+
+    Each page is stored with its ETag and Last-Modified headers, and stays fresh for as long as its Cache-Control or Expires headers allow
+    (see freshness_lifetime), but never longer than max_ttl. Fresh pages are served without asking the site. Stale pages are kept, so they can
+    be revalidated with a conditional GET, which costs a 304 and no parsing if the page has not changed.
+
+    The cache is a SQLite file at path (see SQLiteLRUStore), so it survives restarts and is shared by worker processes. The least recently used
+    pages are evicted once the stored text takes more than max_disk_bytes. Every method may wait up to 10 seconds on a lock held by another process,
+    so async code should call them in an executor, as WebPageFetcher does.
+
+    Usage:
+    ------
+    tool = BraveSearchTool(page_cache=PageCache("page_cache.db"))
+    """
+
+    def __init__(self, path, max_disk_bytes=512 * 1024 * 1024, default_ttl=60 * 60, max_ttl=24 * 60 * 60, clock=time.time):
+        self.path = path
+        self.max_disk_bytes = max_disk_bytes
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._disk = SQLiteLRUStore(
+            path, "pages", "url", {"text": "TEXT NOT NULL", "etag": "TEXT", "last_modified": "TEXT"}, max_disk_bytes, keep_expired=True, clock=clock
+        )
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Returns the cached page at url, fresh or stale, or None if it is not cached."""
+
+        row = self._disk.get(url)
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            page = CachedPage(row["text"], row["etag"], row["last_modified"], fresh=row["expires_at"] > self._clock())
+            if page.fresh:
+                self.fresh_hits += 1
+            else:
+                self.stale_hits += 1
+        return page
+
+    def put(self, url: str, text: str, headers: Mapping[str, str]):
+        """Caches the text extracted from a 200 response for url, unless its headers forbid storing it."""
+
+        lifetime = freshness_lifetime(headers, self.default_ttl, self.max_ttl)
+        if lifetime is None:
+            self.delete(url)
+            return
+        values = {"text": text, "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        self._disk.put(url, values, len(text.encode()), self._clock() + lifetime)
+
+    def refresh(self, url: str, headers: Mapping[str, str]):
+        """Marks the cached page at url fresh again after the site answered a conditional GET with 304 Not Modified."""
+
+        lifetime = freshness_lifetime(headers, self.default_ttl, self.max_ttl)
+        with self._lock:
+            self.revalidated += 1
+        if lifetime is None:
+            # The site no longer lets the page be stored, so the stale copy must not be served again either.
+            self.delete(url)
+            return
+        # A 304 may carry updated validators, keep the old ones otherwise.
+        validators = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        self._disk.update(url, {**{column: value for column, value in validators.items() if value is not None}, "expires_at": self._clock() + lifetime})
+
+    def delete(self, url: str):
+        self._disk.delete(url)
+
+    def clear(self):
+        self._disk.clear()
+
+    def close(self):
+        self._disk.close()
+
+    def stats(self):
+        """Returns the cache's fresh hit, stale hit, revalidation and miss counts, and how many bytes of text it holds."""
+
+        with self._lock:
+            lookups = self.fresh_hits + self.stale_hits + self.misses
+            return {
+                "disk_bytes": self._disk.size_bytes,
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "fresh_hit_rate": self.fresh_hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+
+from .base_search_tool import BaseSearchResult
+
+# How long results stay fresh, in seconds, by backend (the part of a tool's cache_namespace before the first ':').
+DEFAULT_TTLS = {
+    "brave": 60 * 60,
+    "wikipedia": 24 * 60 * 60,
+    "elasticsearch": 5 * 60,
+    "vector": 5 * 60,
+}
+
+class SQLiteLRUStore:
+    """
+    A table of rows in a SQLite file, keyed by a text column, whose least recently used rows are evicted once their sizes add up to more than
+    max_bytes. The file is opened in WAL mode, so it can be shared by any number of processes. Used as the disk tier of SearchResultCache and PageCache.
+
+    Each row has the given columns (a dict of column name -> SQL type) plus its size, expiry time and last access time. Expired rows are dropped
+    when read and are evicted first, unless keep_expired is set (PageCache keeps stale pages to revalidate them).
+    Every method may wait up to 10 seconds on a lock held by another process.
+    """
+
+    def __init__(self, path, table, key_column, columns, max_bytes, keep_expired=False, clock=time.time):
+        self.path = path
+        self.table = table
+        self.key_column = key_column
+        self.columns = list(columns)
+        self.max_bytes = max_bytes
+        self.keep_expired = keep_expired
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        column_definitions = "".join(f"{name} {column_type}, " for name, column_type in columns.items())
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ({key_column} TEXT PRIMARY KEY, {column_definitions}size INTEGER NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)")
+        self._size_bytes = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+
+    @property
+    def size_bytes(self):
+        return self._size_bytes
+
+    def get(self, key):
+        """Returns the row stored under key as a dict of its columns and expires_at, marking it as just used, or None if there is none."""
+
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(self.columns)}, expires_at, size FROM {self.table} WHERE {self.key_column} = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[-2] <= now and not self.keep_expired:
+                self._delete(key, row[-1])
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE {self.key_column} = ?", (now, key))
+        return dict(zip(self.columns + ["expires_at"], row[:-1]))
+
+    def put(self, key, values, size, expires_at):
+        """Stores values (a dict with every column) under key, replacing any previous row, then evicts rows if the store is over max_bytes."""
+
+        with self._lock:
+            previous = self._conn.execute(f"SELECT size FROM {self.table} WHERE {self.key_column} = ?", (key,)).fetchone()
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({self.key_column}, {', '.join(self.columns)}, size, expires_at, accessed_at) VALUES ({', '.join('?' * (len(self.columns) + 4))})",
+                (key, *(values[column] for column in self.columns), size, expires_at, self._clock())
+            )
+            self._size_bytes += size - (previous[0] if previous else 0)
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+
+    def update(self, key, values):
+        """Sets some of the columns (or expires_at) of the row stored under key, if there is one, and marks it as just used."""
+
+        assignments = "".join(f"{column} = ?, " for column in values)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE {self.table} SET {assignments}accessed_at = ? WHERE {self.key_column} = ?",
+                (*values.values(), self._clock(), key)
+            )
+
+    def delete(self, key):
+        with self._lock:
+            previous = self._conn.execute(f"SELECT size FROM {self.table} WHERE {self.key_column} = ?", (key,)).fetchone()
+            if previous is not None:
+                self._delete(key, previous[0])
+
+    def _delete(self, key, size):
+        self._conn.execute(f"DELETE FROM {self.table} WHERE {self.key_column} = ?", (key,))
+        self._size_bytes -= size
+
+    def _evict(self):
+        """Deletes expired rows (unless keep_expired), then the least recently used ones, until the store is back under 90% of max_bytes."""
+
+        if not self.keep_expired:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (self._clock(),))
+        # Recount, since other processes sharing the file have been writing to it too.
+        self._size_bytes = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute(f"SELECT {self.key_column}, size FROM {self.table} ORDER BY accessed_at").fetchall() if self._size_bytes > target else []
+        evicted = []
+        for key, size in rows:
+            if self._size_bytes <= target:
+                break
+            evicted.append((key,))
+            self._size_bytes -= size
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE {self.key_column} = ?", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._size_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class SearchResultCache:
+    """
+    A two-tier cache of raw search results (lists of BaseSearchResult), shared by any number of search tools.
+
+    Tiers:
+    ------
+    - memory: A thread-safe LRU of up to max_memory_entries result lists. Hits cost microseconds.
+    - disk (optional): A SQLite file at path, so results survive restarts and are shared by worker processes. The least recently used entries
+      are evicted once the stored results take more than max_disk_bytes. Disk hits are copied into the memory tier.
+
+    Entries are keyed by the tool's cache_namespace (which identifies the backend, e.g. the Elasticsearch index) and the normalized query.
+    A cached search for n results also answers searches for fewer. Entries expire after the TTL for their backend: ttls[backend], falling back
+    to DEFAULT_TTLS and then default_ttl. Empty result lists are not cached, since they are usually a failed search.
+
+    Usage:
+    ------
+    cache = SearchResultCache(path="search_cache.db")
+    tool = WikipediaSearchTool(search_cache=cache)
+    """
+
+    def __init__(self, path=None, max_memory_entries=1024, max_disk_bytes=256 * 1024 * 1024, default_ttl=60 * 60, ttls=None, clock=time.time):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.default_ttl = default_ttl
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory = OrderedDict() # key -> (n_search_results, results, expires_at)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk = None
+        if path is not None:
+            self._disk = SQLiteLRUStore(
+                path, "search_results", "key", {"n_search_results": "INTEGER NOT NULL", "results": "TEXT NOT NULL"}, max_disk_bytes, clock=clock
+            )
+
+    @staticmethod
+    def make_key(namespace, query):
+        normalized_query = re.sub(r"\s+", " ", query.strip().lower())
+        return f"{namespace}\x00{normalized_query}"
+
+    def ttl_for(self, namespace):
+        return self.ttls.get(namespace.split(":", 1)[0], self.default_ttl)
+
+    def get(self, namespace, query, n_search_results):
+        """Returns the first n_search_results cached results for query, or None on a miss."""
+
+        key = SearchResultCache.make_key(namespace, query)
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[2] <= now:
+                del self._memory[key]
+                entry = None
+            if entry is not None and entry[0] >= n_search_results:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return list(entry[1][:n_search_results])
+
+        entry = self._disk_get(key)
+        with self._lock:
+            if entry is None or entry[0] < n_search_results:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._memory_put(key, entry)
+        return list(entry[1][:n_search_results])
+
+    def put(self, namespace, query, n_search_results, results, ttl=None):
+        """Caches the results of searching for n_search_results results for query, for ttl seconds if given (0 to not cache them) instead of the backend's TTL."""
+
+        if not results or (ttl is not None and ttl <= 0):
+            return
+        key = SearchResultCache.make_key(namespace, query)
+        entry = (n_search_results, list(results), self._clock() + (ttl if ttl is not None else self.ttl_for(namespace)))
+        with self._lock:
+            existing = self._memory.get(key)
+            if existing is not None and existing[0] > n_search_results and existing[2] > self._clock():
+                return
+            self._memory_put(key, entry)
+        self._disk_put(key, entry)
+
+    def _memory_put(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        if self._disk is None:
+            return None
+        row = self._disk.get(key)
+        if row is None:
+            return None
+        return (row["n_search_results"], [BaseSearchResult(**result) for result in json.loads(row["results"])], row["expires_at"])
+
+    def _disk_put(self, key, entry):
+        if self._disk is None:
+            return
+        n_search_results, results, expires_at = entry
+        serialized = json.dumps([asdict(result) for result in results])
+        self._disk.put(key, {"n_search_results": n_search_results, "results": serialized}, len(serialized.encode()), expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def stats(self):
+        """Returns the hit counts of each tier, the miss count, and how many entries are in memory and how many bytes on disk."""
+
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk.size_bytes if self._disk is not None else 0,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
@@ -1,3 +1,4 @@
+import uuid
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
 
@@ -19,6 +20,16 @@ class BaseEmbedder(ABC):
     An embedder that can embed a single text or a batch of texts.
     """
     dim: int
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Identifies the embedding model, for VectorSearchTool's search cache namespace: queries embedded by different models find different results.
+        Defaults to a key unique to this instance. Subclasses should override it.
+        """
+        if "_cache_key" not in self.__dict__:
+            self._cache_key = f"{type(self).__name__}:{uuid.uuid4().hex}"
+        return self._cache_key
     
     @abstractmethod
     def embed(self, text: str) -> Embedding:
@@ -37,4 +48,10 @@ class BaseEmbedder(ABC):
         :param texts: The texts to embed.
         """
         raise NotImplementedError()
+
+    def warmup(self) -> None:
+        """
+        Eagerly initializes anything the embedder would otherwise set up on first use. Does nothing by default.
+        """
+        pass
     
\ No newline at end of file
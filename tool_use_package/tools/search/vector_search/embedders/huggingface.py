@@ -1,8 +1,10 @@
-from tenacity import retry, wait_exponential, stop_after_attempt
+from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_not_exception_type
 import requests
 import json
 
 from .base_embedder import Embedding, BaseEmbedder
+from .....resources import shared_resources
+from .....circuit_breaker import CircuitBreakerOpenError, get_circuit_breaker
 
 class HuggingFaceEmbedder(BaseEmbedder):
 
@@ -16,25 +18,43 @@ class HuggingFaceEmbedder(BaseEmbedder):
 
         self.url = f"https://api-inference.huggingface.co/pipeline/feature-extraction/{self.model_name}"
         self.headers = {"Authorization": f"Bearer {self.api_key}"}
-        
-        config_url = f'https://huggingface.co/{model_name}/resolve/main/config.json'
+        self.circuit_breaker = get_circuit_breaker(f"huggingface:{self.model_name}")
+
+    @property
+    def cache_key(self) -> str:
+        return f"huggingface:{self.model_name}"
+
+    @property
+    def dim(self) -> int:
+        """
+        The embedding dimension, read from the model's config on first use and shared by every embedder for the same model.
+        """
+        return shared_resources.get(("huggingface_embedding_dim", self.model_name), self._fetch_embedding_dimension)
+
+    def _fetch_embedding_dimension(self) -> int:
+        config_url = f'https://huggingface.co/{self.model_name}/resolve/main/config.json'
         response = requests.get(config_url)
         if response.status_code == 200:
             config = json.loads(response.text)
-            embedding_dimension = config["hidden_size"]
+            return config["hidden_size"]
         else:
             raise RuntimeError(
-                f"Could not get config for model {model_name}"
+                f"Could not get config for model {self.model_name}"
             )
 
-        self.dim = embedding_dimension
+    def warmup(self) -> None:
+        self.dim
 
     def embed(self, text: str) -> Embedding:
         emb = self.embed_batch([text])
         return emb[0]
     
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(10))
+    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(10), retry=retry_if_not_exception_type(CircuitBreakerOpenError))
     def embed_batch(self, texts: list[str]) -> list[Embedding]:
+        embeddings = self.circuit_breaker.call(self._post_batch, texts)
+        return [Embedding(embedding=embedding, text=text) for embedding, text in zip(embeddings, texts)]
+
+    def _post_batch(self, texts: list[str]) -> list[list[float]]:
         response = requests.post(
             self.url,
             headers=self.headers,
@@ -47,4 +67,4 @@ class HuggingFaceEmbedder(BaseEmbedder):
             raise RuntimeError(
                 "The model is currently loading, please re-run the text."
             )
-        return [Embedding(embedding=embedding, text=text) for embedding, text in zip(embeddings, texts)]
\ No newline at end of file
+        return embeddings
\ No newline at end of file
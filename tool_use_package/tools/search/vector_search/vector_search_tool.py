@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 # Import the requisite ToolUser class
 from ....tool_user import ToolUser
@@ -18,15 +19,17 @@ class VectorSearchTool(BaseSearchTool):
                   description,
                   parameters,
                   vector_store,
-                  embedder = None):
+                  embedder = None,
+                  **kwargs):
         """
         :param name: The name of the tool.
         :param description: The description of the tool.
         :param parameters: The parameters for the tool.
         :param vector_store: The vector store to use for searching.
         :param embedder: The name of the embedder model to use. Defaults to a HuggingFace embedder with the model "sentence-transformers/paraphrase-MiniLM-L6-v2".
+        :param kwargs: Passed on to BaseSearchTool, e.g. max_concurrent_queries or search_cache.
         """
-        super().__init__(name, description, parameters)
+        super().__init__(name, description, parameters, **kwargs)
 
         if embedder is None:
             # Get your HuggingFace API key from https://huggingface.co/docs/api-inference/quicktour
@@ -34,9 +37,25 @@ class VectorSearchTool(BaseSearchTool):
         self.embedder = embedder
         self.vector_store = vector_store
 
+    @property
+    def cache_namespace(self) -> str:
+        return f"vector:{self.vector_store.cache_key}:{self.embedder.cache_key}"
+
     def raw_search(self, query: str, n_search_results_to_use: int) -> list[BaseSearchResult]:
         print("Query: ", query)
         print("Searching...")
         query_embedding = self.embedder.embed(query)
         search_results = self.vector_store.query(query_embedding, n_search_results_to_use=n_search_results_to_use)
         return search_results
+
+    def raw_search_many(self, queries: list[str], n_search_results_to_use: int) -> list[list[BaseSearchResult]]:
+        """Embeds all of the queries in one batch, then queries the vector store with each embedding concurrently."""
+
+        query_embeddings = self.embedder.embed_batch(queries)
+        with ThreadPoolExecutor(max_workers=max(1, min(len(queries), self.max_concurrent_queries))) as executor:
+            return list(executor.map(lambda query_embedding: self.vector_store.query(query_embedding, n_search_results_to_use=n_search_results_to_use), query_embeddings))
+
+    def warmup(self):
+        super().warmup()
+        self.embedder.warmup()
+        self.vector_store.warmup()
@@ -1,3 +1,4 @@
+import uuid
 from abc import ABC, abstractmethod
 
 from tool_use_package.tools.search.base_search_tool import BaseSearchResult
@@ -29,4 +30,20 @@ class BaseVectorStore(ABC):
         :param query_embedding: The embedding to query with.
         :param n_search_results_to_use: The number of results to return.
         """
-        raise NotImplementedError()
\ No newline at end of file
+        raise NotImplementedError()
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Identifies the data this vector store searches, for VectorSearchTool's search cache namespace: stores with the same key share cached results.
+        Defaults to a key unique to this instance, so stores that do not say which index they search never share results. Subclasses should override it.
+        """
+        if "_cache_key" not in self.__dict__:
+            self._cache_key = f"{type(self).__name__}:{uuid.uuid4().hex}"
+        return self._cache_key
+
+    def warmup(self) -> None:
+        """
+        Eagerly connects to the vector store, which would otherwise happen on first use. Does nothing by default.
+        """
+        pass
\ No newline at end of file
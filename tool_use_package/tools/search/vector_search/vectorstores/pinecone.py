@@ -4,6 +4,7 @@ from more_itertools import chunked
 from .base_vector_store import BaseVectorStore
 from tool_use_package.tools.search.vector_search.embedders.base_embedder import Embedding
 from ...base_search_tool import BaseSearchResult
+from .....resources import shared_resources
 
 import logging
 logger = logging.getLogger(__name__)
@@ -18,7 +19,7 @@ class PineconeVectorStore(BaseVectorStore):
     Pinecone vectorstores maintain a single embedding matrix.
     
     How it works:
-    - On init, the Pinecone index is loaded (this assumes that the Pinecone index already exists).
+    - On first use, the Pinecone index is loaded (this assumes that the Pinecone index already exists). Vector stores for the same index share one connection.
     - When upserting embeddings, the embeddings are upserted into the Pinecone index.
     -- The embeddings are stored as a list of ids, vectors, and metadatas. Metadatas are used to store the text data for each embedding; Pinecone indices do not store text data by default.
     -- The ids are the index of the embedding in the Pinecone index.
@@ -31,18 +32,32 @@ class PineconeVectorStore(BaseVectorStore):
         self.api_key = api_key
         self.environment = environment
         self.index = index
-        self.pinecone_index = self._init_pinecone_index()
-        self.pinecone_index_dimensions = self.pinecone_index.describe_index_stats().dimension
+
+    @property
+    def cache_key(self) -> str:
+        return f"pinecone:{self.environment}:{self.index}"
+
+    @property
+    def pinecone_index(self) -> pinecone.Index:
+        return shared_resources.get(("pinecone_index", self.api_key, self.environment, self.index), self._init_pinecone_index)
+
+    @property
+    def pinecone_index_dimensions(self) -> int:
+        return shared_resources.get(("pinecone_index_dimensions", self.api_key, self.environment, self.index), lambda: self.pinecone_index.describe_index_stats().dimension)
 
     def _init_pinecone_index(self):
-        pinecone.init(
+        # pinecone.init configures the client globally, so it only needs to run once per account and environment.
+        shared_resources.get(("pinecone", self.api_key, self.environment), lambda: pinecone.init(
             api_key=self.api_key,
             environment=self.environment,
-        )
+        ) or True)
         if self.index not in pinecone.list_indexes():
             raise ValueError(f"Pinecone index {self.index} does not exist")
         return pinecone.Index(self.index)
 
+    def warmup(self) -> None:
+        self.pinecone_index_dimensions
+
     def query(self, query_embedding: Embedding, n_search_results_to_use: int = 10) -> list[BaseSearchResult]:
         if len(query_embedding.embedding) != self.pinecone_index_dimensions:
             raise ValueError(f"Query embedding dimension {len(query_embedding.embedding)} does not match Pinecone index dimension {self.pinecone_index_dimensions}")
@@ -0,0 +1,136 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, Optional
+
+import aiohttp
+
+from .html_extractors import get_html_extractor
+from .page_cache import PageCache
+
+# Content types we extract text from. Anything else (PDFs, images, archives...) is skipped without downloading it.
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
+TEXT_CONTENT_TYPES = {"text/plain"}
+
+class WebPageFetcher:
+    """
+    Fetches web pages and extracts their text, through one long-lived aiohttp session, so connections, keep-alive and DNS lookups are reused across searches.
+
+    The session lives on the event loop that first uses it (for the search tools, the process-wide background loop, see get_background_loop),
+    and must only be used from that loop.
+
+    Attributes:
+    -----------
+    - max_connections (int): The size of the connection pool. Default is 100.
+    - max_connections_per_host (int): How many connections may be open to one host at a time, so a search does not hammer a site. Default is 4.
+    - connect_timeout (float): Seconds to wait to connect to a site. Default is 5.
+    - read_timeout (float): Seconds to wait for each read from a site. Default is 10.
+    - dns_cache_ttl (int): Seconds to cache DNS lookups for. Default is 300.
+    - max_page_bytes (int): How much of a page's body to download. Longer pages are cut off there, since only their start ends up in the
+    search results anyway. Default is 1MB.
+    - extractor (Callable[[str], str]): Turns a page's HTML into its text. Default is the fastest extractor installed, see get_html_extractor.
+    - extract_executor (Executor): Where extraction runs, so parsing never blocks the event loop (and the other pages' downloads).
+    Default is the event loop's default thread pool. Pass a ProcessPoolExecutor to parse several pages in parallel, the extractors are picklable.
+    - page_cache (PageCache): Caches pages' text on disk. Fresh pages are served from it, and stale ones revalidated with a conditional GET.
+    Default is no cache.
+    """
+
+    def __init__(self,
+                 max_connections=100,
+                 max_connections_per_host=4,
+                 connect_timeout=5,
+                 read_timeout=10,
+                 dns_cache_ttl=300,
+                 max_page_bytes=1_000_000,
+                 extractor: Optional[Callable[[str], str]] = None,
+                 extract_executor: Optional[Executor] = None,
+                 page_cache: Optional[PageCache] = None):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.max_page_bytes = max_page_bytes
+        self.extractor = extractor or get_html_extractor()
+        self.extract_executor = extract_executor
+        self.page_cache = page_cache
+        self._session = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use. Only ever called from one event loop, so it needs no lock."""
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections_per_host, ttl_dns_cache=self.dns_cache_ttl),
+                timeout=aiohttp.ClientTimeout(total=None, connect=self.connect_timeout, sock_read=self.read_timeout)
+            )
+        return self._session
+
+    async def fetch_text(self, url: str) -> Optional[str]:
+        """
+        Returns the text of the page at url, or None if it could not be fetched or is not a web page or plain text.
+        The headers are checked before any of the body is read, and at most max_page_bytes of the body are read.
+        """
+
+        loop = asyncio.get_running_loop()
+        # The page cache is a SQLite file that other processes may hold locked, so it is only ever used off the event loop.
+        cached = await loop.run_in_executor(None, self.page_cache.get, url) if self.page_cache is not None else None
+        if cached is not None and cached.fresh:
+            return cached.text
+
+        session = await self.session()
+        async with session.get(url, headers=cached.conditional_headers() if cached is not None else None) as response:
+            if response.status == 304 and cached is not None:
+                await loop.run_in_executor(None, self.page_cache.refresh, url, response.headers)
+                return cached.text
+            if response.status != 200:
+                return None
+            content_type = response.content_type # Defaults to application/octet-stream when the header is missing
+            if content_type not in HTML_CONTENT_TYPES | TEXT_CONTENT_TYPES and response.headers.get("Content-Type") is not None:
+                return None
+            body = await self.read_capped(response)
+            text = body.decode(response.charset or "utf-8", errors="replace")
+        if content_type not in TEXT_CONTENT_TYPES:
+            text = await loop.run_in_executor(self.extract_executor, self.extractor, text)
+        if self.page_cache is not None:
+            await loop.run_in_executor(None, self.page_cache.put, url, text, response.headers)
+        return text
+
+    async def read_capped(self, response: aiohttp.ClientResponse) -> bytes:
+        """Reads the response body, stopping after max_page_bytes."""
+
+        if response.content_length is not None and response.content_length <= self.max_page_bytes:
+            return await response.read()
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_page_bytes:
+                # The rest of the body is never read, so the connection can't be reused. Close it rather than return it to the pool.
+                response.close()
+                break
+        return b"".join(chunks)[:self.max_page_bytes]
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch_all(self, urls: list[str], deadline: Optional[float]) -> dict:
+        """Fetches urls concurrently, returning {url: text} for the pages that were fetched within deadline seconds. The rest are cancelled."""
+
+        tasks = {url: asyncio.ensure_future(self.fetch_text(url)) for url in dict.fromkeys(urls)}
+        if not tasks:
+            return {}
+        _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        for task in pending:
+            task.cancel()
+        texts = {}
+        for url, task in tasks.items():
+            if task in pending:
+                print(f"Gave up on {url} at the scrape deadline")
+            elif task.exception() is not None:
+                print(f"Failed to scrape {url}")
+            elif task.result():
+                texts[url] = task.result()
+        return texts
@@ -1,6 +1,7 @@
 # Import required external packages
+import time
 import wikipedia
-from anthropic import Anthropic
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 
 # Import our base search tool from which all other search tools inherit. We use this pattern to make building new search tools easy.
@@ -12,32 +13,73 @@ class WikipediaSearchTool(BaseSearchTool):
                  name="search_wikipedia",
                  description="The search_wikipedia tool will exclusively search over Wikipedia for pages similar to your query. It returns for each page its title and the full page content. Use this tool to get up-to-date and comprehensive information on a topic. Queries made to this tool should be as atomic as possible. The tool provides broad topic keywords rather than niche search topics. For example, if the query is 'Can you tell me about Odysseus's journey in the Odyssey?' the search query you make should be 'Odyssey'. Here's another example: if the query is 'Who created the first neural network?', your first query should be 'neural network'. As you can see, these queries are quite short. Think generalized keywords, not phrases.",
                  parameters=[
-                    {"name": "query", "type": "str", "description": "The search term to enter into the Wikipedia search engine. Remember to use broad topic keywords."},
+                    {"name": "query", "type": "str", "description": "The search term to enter into the Wikipedia search engine. Remember to use broad topic keywords. To search several topics at once, pass a list of search terms instead, like [\"first topic\", \"second topic\"]."},
                     {"name": "n_search_results_to_use", "type": "int", "description": "The number of search results to return, where each search result is a Wikipedia page."}
                 ],
-                 truncate_to_n_tokens=5000):
-        super().__init__(name, description, parameters)
+                 truncate_to_n_tokens=5000,
+                 max_concurrent_pages=5,
+                 page_timeout=10,
+                 **kwargs):
+        """
+        :param name: The name of the tool.
+        :param description: The description of the tool.
+        :param parameters: The parameters for the tool.
+        :param truncate_to_n_tokens: The number of tokens to truncate page content to.
+        :param max_concurrent_pages: How many pages to fetch from Wikipedia at once.
+        :param page_timeout: Seconds to wait for each page. Pages that take longer are skipped, like pages that fail to load.
+        :param kwargs: Passed on to BaseSearchTool, e.g. max_concurrent_queries or search_cache.
+        """
+        super().__init__(name, description, parameters, **kwargs)
         self.truncate_to_n_tokens = truncate_to_n_tokens
-        if truncate_to_n_tokens is not None:
-            self.tokenizer = Anthropic().get_tokenizer()
+        self.max_concurrent_pages = max_concurrent_pages
+        self.page_timeout = page_timeout
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"wikipedia:{self.truncate_to_n_tokens}"
     
     def raw_search(self, query: str, n_search_results_to_use: int):
         print("Query: ", query)
         results = wikipedia.search(query)
         search_results = []
 
-        for result in results:
-            if len(search_results) >= n_search_results_to_use:
-                break
-            try:
-                page = wikipedia.page(result)
-            except:
-                # the Wikipedia API is a little flaky, so we just skip over pages that fail to load
-                continue
+        for page in self._fetch_pages(results, n_search_results_to_use):
             search_results.append(BaseSearchResult(content=self.truncate_page_content(page.content), source=page.url))
             print("Reading content from: ", page.url)
         
         return search_results
+
+    def _fetch_pages(self, titles: list[str], n_pages: int) -> list:
+        """
+        Fetches the pages of the first n_pages titles that load, in the order of titles, up to max_concurrent_pages at a time.
+        The Wikipedia API is a little flaky, so a page that fails to load, or takes more than page_timeout seconds, is skipped and the next title fetched instead.
+        """
+
+        pages = {} # Index in titles -> page
+        # One thread per title, so threads stuck on pages we gave up on (wikipedia has no request timeout) never hold up the others.
+        executor = ThreadPoolExecutor(max_workers=max(1, len(titles)))
+        try:
+            pending = {} # future -> (index in titles, deadline)
+            next_index = 0
+            while True:
+                while next_index < len(titles) and len(pending) < self.max_concurrent_pages and len(pages) + len(pending) < n_pages:
+                    pending[executor.submit(wikipedia.page, titles[next_index])] = (next_index, time.monotonic() + self.page_timeout)
+                    next_index += 1
+                if not pending:
+                    break
+                wait(pending, timeout=max(0, min(deadline for _, deadline in pending.values()) - time.monotonic()), return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for future, (index, deadline) in list(pending.items()):
+                    if future.done():
+                        del pending[future]
+                        if future.exception() is None:
+                            pages[index] = future.result()
+                    elif deadline <= now:
+                        del pending[future]
+                        print(f"Gave up on the Wikipedia page {titles[index]} after {self.page_timeout} seconds")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return [pages[index] for index in sorted(pages)]
     
     def truncate_page_content(self, page_content: str):
         if self.truncate_to_n_tokens is None:
@@ -0,0 +1,209 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+# Quoted literals and identifiers, comments, whitespace, words (keywords, identifiers, numbers, parameters) and single punctuation characters.
+_SQL_TOKEN = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)|\s+|[\w$.:@?]+|.""", re.S)
+_READ_STATEMENTS = {"select", "values", "explain"}
+_WRITE_KEYWORDS = {"insert", "update", "delete", "replace", "merge", "create", "drop", "alter", "truncate"}
+_TABLE_KEYWORDS = {"from", "join", "into", "update", "table"}
+_TABLE_PREFIXES = {"if", "not", "exists", "only", "or", "ignore", "lateral"}
+_NOT_ALIASES = {
+    "select", "where", "set", "values", "default", "group", "order", "limit", "offset", "having", "window", "returning", "union", "except", "intersect",
+    "join", "left", "right", "inner", "outer", "cross", "natural", "full", "on", "using", "as"
+}
+
+def tokenize_sql(sql):
+    """Splits sql into tokens, dropping comments and whitespace. Quoted literals are kept verbatim, everything else is lowercased."""
+
+    tokens = []
+    for token in _SQL_TOKEN.findall(sql):
+        if token.isspace() or token.startswith("--") or token.startswith("/*"):
+            continue
+        tokens.append(token if token[0] in "'\"`[" else token.lower())
+    return tokens
+
+def normalize_sql(sql):
+    """
+    Returns a canonical form of sql, so trivially different spellings of one query share a cache entry: comments are dropped, whitespace is
+    collapsed, keywords and unquoted identifiers are lowercased, and trailing semicolons are removed. String literals are left untouched.
+    """
+
+    parts = []
+    previous = None
+    for token in tokenize_sql(sql):
+        if previous is not None and _is_word(previous) and _is_word(token):
+            parts.append(" ")
+        parts.append(token)
+        previous = token
+    return "".join(parts).rstrip(";")
+
+def is_read_query(sql):
+    """True if sql only reads data: a SELECT, VALUES or EXPLAIN statement, or a WITH query that does not modify anything."""
+
+    tokens = tokenize_sql(sql)
+    if not tokens:
+        return False
+    if tokens[0] == "with":
+        return not any(token in _WRITE_KEYWORDS for token in tokens)
+    return tokens[0] in _READ_STATEMENTS and ";" not in tokens[:-1]
+
+def referenced_tables(sql):
+    """Returns the (lowercased, unquoted) names of the tables sql reads from or writes to, as far as a keyword scan can tell."""
+
+    tokens = tokenize_sql(sql)
+    tables = set()
+    for i, token in enumerate(tokens):
+        # ON names a table in CREATE INDEX ... ON t(...), but after a JOIN it starts the join condition.
+        if token not in _TABLE_KEYWORDS and not (token == "on" and tokens[0] == "create" and "index" in tokens[:i]):
+            continue
+        j = i + 1
+        while True:
+            while j < len(tokens) and tokens[j] in _TABLE_PREFIXES:
+                j += 1
+            if j >= len(tokens) or not _is_word(tokens[j]) or tokens[j] in _NOT_ALIASES:
+                break
+            tables.add(_table_name(tokens[j]))
+            j += 1
+            # Skip an alias, then continue through a comma separated list of tables.
+            if j < len(tokens) and tokens[j] == "as":
+                j += 1
+            if j < len(tokens) and _is_word(tokens[j]) and tokens[j] not in _NOT_ALIASES:
+                j += 1
+            if j >= len(tokens) or tokens[j] != ",":
+                break
+            j += 1
+    return tables
+
+def _is_word(token):
+    return token[0] in "'\"`[" or token[0].isalnum() or token[0] in "_$:@?"
+
+def _table_name(token):
+    name = token.rsplit(".", 1)[-1] if token[0] not in "\"`[" else token
+    return name.strip("\"`[]").lower()
+
+class SQLResultCache:
+    """
+    A thread-safe LRU cache of SQL query results, keyed by the normalized query text and its parameters.
+
+    Only read queries (see is_read_query) are cached. Each entry remembers the tables its query referenced. When the tool runs a write that only
+    touches isolated tables (base tables that no view reads and no trigger fires on, which the tool knows from its introspected schema), just
+    the entries for those tables are dropped. Any other write (to a view, to a table a view or trigger depends on, DDL, or a write whose
+    tables cannot be told) clears the whole cache, since results that never name the written table can still change. Writes made by other
+    processes are caught with data_version, a function returning any value that changes whenever the database does
+    (e.g. sqlite_data_version('test.db'), which reads sqlite's PRAGMA data_version). It is checked on every lookup and the whole cache is cleared when it changes,
+    which includes after the tool's own writes when it uses a different connection.
+    Entries also expire after ttl seconds, if given.
+
+    Results depend on the tool's row and token limits, so do not share one cache between tools with different limits. Queries whose results change
+    without the data changing (e.g. ones using random() or the current time) should not be run through a cache.
+    """
+
+    def __init__(self, max_entries=256, ttl=None, data_version=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.data_version = data_version
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (result, tables, stored_at)
+        self._last_data_version = None
+        self.generation = 0 # Bumped by every invalidation, so a result read before a concurrent write is not cached after it.
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(sql, params=()):
+        return (normalize_sql(sql), tuple(params) if not isinstance(params, dict) else tuple(sorted(params.items())))
+
+    def get(self, sql, params=()):
+        """Returns the cached result for sql and params, or None on a miss."""
+
+        key = self.make_key(sql, params)
+        self._check_data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and self._clock() - entry[2] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def record(self, sql, result, params=(), generation=None, isolated_tables=None):
+        """
+        Records that the tool ran sql: caches its result if it was a read, or invalidates what it may have changed if it was a write.
+        Pass the cache's generation from before the query ran, so the result is not cached if something was invalidated in the meantime.
+        Pass isolated_tables (lowercased names) to let writes that only touch those tables keep the entries for other tables.
+        """
+
+        if not is_read_query(sql):
+            tables = referenced_tables(sql)
+            is_data_write = tokenize_sql(sql)[:1] not in (["create"], ["drop"], ["alter"])
+            self.invalidate(tables if tables and is_data_write and isolated_tables is not None and tables <= set(isolated_tables) else None)
+            return
+        key = self.make_key(sql, params)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (result, referenced_tables(sql), self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tables=None):
+        """Drops the entries that reference any of tables, or every entry if tables is None."""
+
+        with self._lock:
+            self.invalidations += 1
+            self.generation += 1
+            if tables is None:
+                self._entries.clear()
+                return
+            tables = {table.lower() for table in tables}
+            for key in [key for key, (_, entry_tables, _) in self._entries.items() if entry_tables & tables]:
+                del self._entries[key]
+
+    def _check_data_version(self):
+        if self.data_version is None:
+            return
+        version = self.data_version()
+        with self._lock:
+            changed = self._last_data_version is not None and version != self._last_data_version
+            self._last_data_version = version
+        if changed:
+            self.invalidate()
+
+    def stats(self):
+        """Returns the cache's hit, miss and invalidation counts and how many results it holds."""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
+
+def sqlite_data_version(database):
+    """
+    Returns a data_version function for SQLResultCache that reads PRAGMA data_version from a dedicated read-only connection to database.
+    The value changes whenever any other connection, in this process or another, commits a change to the file.
+    """
+
+    conn = sqlite3.connect(f"file:{quote(str(database))}?mode=ro", uri=True, check_same_thread=False)
+    lock = threading.Lock()
+
+    def data_version():
+        with lock:
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    return data_version
@@ -0,0 +1,232 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from .base_tool import ToolError
+from .sql_cache import is_read_query
+
+class ConnectionPoolExhaustedError(ToolError):
+    """Raised when no database connection became free within the pool timeout."""
+
+class ReadOnlyQueryError(ToolError):
+    """Raised when a read-only SQLTool is asked to run a statement that could modify a database whose driver cannot be made read-only."""
+
+class BaseConnectionManager:
+    """
+    Hands out DB-API connections to SQLTool, one query at a time.
+
+    Use connection() as a context manager. If the body raises, the connection is rolled back, and if even that fails the connection is
+    assumed broken and is closed and replaced on next use.
+    """
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            self._release(conn, broken=not _rollback(conn))
+            raise
+        self._release(conn, broken=False)
+
+    def _acquire(self):
+        raise NotImplementedError()
+
+    def _release(self, conn, broken):
+        raise NotImplementedError()
+
+    def close(self):
+        """Closes every connection the manager opened."""
+
+class SingleConnectionManager(BaseConnectionManager):
+    """Wraps one existing connection (SQLTool's db_conn) and serializes queries on it with a lock, since DB-API connections are generally not safe to share between threads."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        self._lock.acquire()
+        return self.conn
+
+    def _release(self, conn, broken):
+        self._lock.release()
+
+    def close(self):
+        with self._lock:
+            _close(self.conn)
+
+class ThreadLocalConnectionManager(BaseConnectionManager):
+    """
+    Opens one connection per thread with connection_factory, and reuses it for every query that thread makes. This suits sqlite3, where
+    connections are cheap and each one can only be used by the thread that created it, while separate connections can read the file in parallel.
+
+    Connections belonging to threads that have since exited are closed the next time a new connection is opened.
+    """
+
+    def __init__(self, connection_factory):
+        self.connection_factory = connection_factory
+        self._lock = threading.Lock()
+        self._connections = {}
+
+    def _acquire(self):
+        thread = threading.current_thread()
+        with self._lock:
+            conn = self._connections.get(thread)
+        if conn is not None:
+            return conn
+
+        conn = self.connection_factory()
+        with self._lock:
+            dead_threads = [other for other in self._connections if not other.is_alive()]
+            stale_connections = [self._connections.pop(other) for other in dead_threads]
+            self._connections[thread] = conn
+        for stale_conn in stale_connections:
+            _close(stale_conn)
+        return conn
+
+    def _release(self, conn, broken):
+        if broken:
+            with self._lock:
+                self._connections.pop(threading.current_thread(), None)
+            _close(conn)
+
+    def close(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            _close(conn)
+
+class ConnectionPool(BaseConnectionManager):
+    """
+    A bounded pool of connections opened on demand with connection_factory, for DB-API drivers whose connections are expensive to open.
+
+    At most max_size connections exist at once. A query that finds them all busy waits up to timeout seconds for one to be returned,
+    then raises ConnectionPoolExhaustedError.
+    """
+
+    def __init__(self, connection_factory, max_size=5, timeout=30):
+        self.connection_factory = connection_factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = queue.LifoQueue()
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise ConnectionPoolExhaustedError(f"All {self.max_size} database connections stayed busy for {self.timeout} seconds.")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self.connection_factory()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, conn, broken):
+        if broken:
+            _close(conn)
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                _close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+def make_connection_manager(db_conn=None, connection_factory=None, db_dialect=None, pool_size=5, pool_timeout=30):
+    """Picks the connection manager for SQLTool: a locked single connection for db_conn, per-thread connections for SQLite factories, and a bounded pool for any other factory."""
+
+    if (db_conn is None) == (connection_factory is None):
+        raise ValueError("Pass exactly one of db_conn or connection_factory.")
+    if db_conn is not None:
+        return SingleConnectionManager(db_conn)
+    if db_dialect is not None and "sqlite" in db_dialect.lower():
+        return ThreadLocalConnectionManager(connection_factory)
+    return ConnectionPool(connection_factory, max_size=pool_size, timeout=pool_timeout)
+
+def sqlite_connection_factory(database, read_only=False, wal=False, timeout=5.0):
+    """
+    Returns a function that opens a new sqlite3 connection to database, for use as SQLTool's connection_factory.
+
+    - read_only opens the file with mode=ro, so queries cannot modify it whatever SQL they contain.
+    - wal switches the database to write-ahead logging (once, on the first connection), so readers never wait for a writer and a writer never waits for readers.
+      WAL mode is stored in the database file, so this needs write access to it even when read_only is set.
+    - timeout is how many seconds a connection waits for a lock held by another connection.
+
+    Connections are opened with check_same_thread=False so that the tool can close them from any thread. Each is still only used by one thread at a time.
+    """
+
+    wal_enabled = threading.Event()
+
+    def enable_wal():
+        conn = sqlite3.connect(database, timeout=timeout)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+        wal_enabled.set()
+
+    def connect():
+        if wal and not wal_enabled.is_set():
+            enable_wal()
+        if read_only:
+            return sqlite3.connect(f"file:{quote(str(database))}?mode=ro", uri=True, timeout=timeout, check_same_thread=False)
+        return sqlite3.connect(database, timeout=timeout, check_same_thread=False)
+
+    return connect
+
+@contextmanager
+def read_only_session(conn, db_dialect, sql_query):
+    """
+    Context manager making conn refuse writes, DDL included, for whatever runs inside it. Rolling back afterwards is not enough on its own,
+    since DDL commits implicitly on many drivers (including Python's sqlite3 and MySQL).
+
+    - SQLite: PRAGMA query_only, restored to its previous value afterwards so a shared db_conn can still write outside the tool.
+    - PostgreSQL and MySQL/MariaDB: SET TRANSACTION READ ONLY, which only lasts until the transaction the caller rolls back. It needs a driver that
+      opens transactions implicitly (autocommit off), the DB-API default.
+    - Other dialects: statements that are not plain reads (see is_read_query) are rejected with ReadOnlyQueryError without being run.
+    """
+
+    dialect = db_dialect.lower()
+    if "sqlite" in dialect:
+        query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+        conn.execute("PRAGMA query_only = ON")
+        try:
+            yield
+        finally:
+            conn.execute(f"PRAGMA query_only = {int(query_only)}")
+        return
+
+    if "postgres" in dialect or "mysql" in dialect or "mariadb" in dialect:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SET TRANSACTION READ ONLY")
+        finally:
+            cursor.close()
+    elif not is_read_query(sql_query):
+        raise ReadOnlyQueryError(f"This tool is read-only and cannot run statements that modify the {db_dialect} database. Only SELECT queries are allowed.")
+    yield
+
+def _rollback(conn):
+    """Rolls back conn, returning False if that failed (e.g. because the connection is broken)."""
+
+    try:
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+def _close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
@@ -0,0 +1,181 @@
+import math
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from .base_tool import ToolError
+from .sql_cache import tokenize_sql
+
+class SQLGuardError(ToolError):
+    """Raised when SQLGuard stops a query. Since it is a ToolError, ToolUser shows the message to Claude so it can write a cheaper query."""
+
+class QueryPlanRejectedError(SQLGuardError):
+    """Raised before running a query whose plan scans too many rows."""
+
+class QueryTimeoutError(SQLGuardError):
+    """Raised when a query is interrupted for running too long."""
+
+# Error messages drivers use for statement timeouts (PostgreSQL, MySQL/MariaDB).
+_TIMEOUT_MESSAGES = ("statement timeout", "canceling statement", "maximum statement execution time exceeded", "max_statement_time exceeded")
+
+class SQLGuard:
+    """
+    Guardrails that keep a badly written query (an accidental cross join, a full scan of a huge table) from tying up the database.
+
+    Before a query runs (SQLite only), its EXPLAIN QUERY PLAN is checked. Tables the plan scans in full are sized with sqlite_stat1 if ANALYZE
+    has been run, or max(rowid) otherwise, and tables scanned together in a nested loop multiply. If a plan would scan more than max_scan_rows rows,
+    on_full_scan decides what happens: "reject" raises QueryPlanRejectedError without running the query, "warn" runs it and adds a warning to the
+    result Claude sees, and None skips the check. Scans of a single table under a LIMIT are allowed, since they stop early.
+
+    While a query runs, it is interrupted after max_execution_seconds seconds or (SQLite only) max_vm_steps virtual machine steps, raising QueryTimeoutError.
+    SQLite enforces this with a progress handler. PostgreSQL and MySQL/MariaDB get a statement timeout set on the connection before each query.
+    Other dialects are not limited.
+    """
+
+    def __init__(self, max_scan_rows=1000000, on_full_scan="reject", max_execution_seconds=30, max_vm_steps=None, progress_interval=1000, clock=time.monotonic):
+        if on_full_scan not in ("reject", "warn", None):
+            raise ValueError(f"on_full_scan must be 'reject', 'warn' or None, got {on_full_scan}")
+        self.max_scan_rows = max_scan_rows
+        self.on_full_scan = on_full_scan
+        self.max_execution_seconds = max_execution_seconds
+        self.max_vm_steps = max_vm_steps
+        self.progress_interval = progress_interval
+        self._clock = clock
+
+    def check_plan(self, conn, sql_query, db_dialect):
+        """Checks the query plan of sql_query, raising QueryPlanRejectedError or returning a list of warnings for Claude."""
+
+        if self.on_full_scan is None or "sqlite" not in db_dialect.lower():
+            return []
+
+        cursor = conn.cursor()
+        try:
+            try:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql_query}")
+                plan = cursor.fetchall()
+            except sqlite3.Error:
+                return [] # Let the query itself fail with its own, more useful, error.
+            tokens = tokenize_sql(sql_query)
+            scans = {} # parent id -> [(table, rows)]
+            for _, parent, _, detail in plan:
+                table = _scanned_table(detail)
+                if table is not None:
+                    scans.setdefault(parent, []).append((table, self._estimate_rows(cursor, _resolve_alias(table, tokens))))
+        finally:
+            cursor.close()
+
+        n_scans = sum(len(group) for group in scans.values())
+        if n_scans == 1 and "limit" in tokens and not any("TEMP B-TREE" in row[3] for row in plan):
+            return []
+
+        expensive = []
+        for group in scans.values():
+            known = [(table, rows) for table, rows in group if rows is not None]
+            estimated_rows = math.prod(rows for _, rows in known) if known else 0
+            if estimated_rows > self.max_scan_rows:
+                expensive.append((" x ".join(f"{table} (~{rows} rows)" for table, rows in known), estimated_rows))
+        if not expensive:
+            return []
+
+        description = "; ".join(f"a full scan of {tables}, about {estimated_rows} rows" for tables, estimated_rows in expensive)
+        if self.on_full_scan == "reject":
+            raise QueryPlanRejectedError(
+                f"This query was not run because its plan needs {description}, more than the limit of {self.max_scan_rows} rows. "
+                "Filter on indexed columns, join on keys, aggregate, or add a LIMIT."
+            )
+        return [f"Warning: this query needed {description}. Prefer filtering on indexed columns or adding a LIMIT."]
+
+    def _estimate_rows(self, cursor, table):
+        quoted_table = '"' + table.replace('"', '""') + '"'
+        try:
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,))
+            row = cursor.fetchone()
+            if row is not None and row[0]:
+                return int(row[0].split()[0])
+        except (sqlite3.Error, ValueError):
+            pass
+        try:
+            cursor.execute(f"SELECT max(rowid) FROM {quoted_table}")
+            row = cursor.fetchone()
+        except sqlite3.Error:
+            return None # e.g. a view or a WITHOUT ROWID table
+        return row[0] if row is not None and isinstance(row[0], int) else 0
+
+    @contextmanager
+    def limit_execution(self, conn, db_dialect):
+        """Context manager enforcing max_execution_seconds and max_vm_steps on whatever runs on conn inside it, including fetching rows."""
+
+        dialect = db_dialect.lower()
+        if "sqlite" in dialect:
+            with self._sqlite_progress_limit(conn):
+                yield
+            return
+
+        if self.max_execution_seconds is not None:
+            milliseconds = int(self.max_execution_seconds * 1000)
+            statement = None
+            if "postgres" in dialect:
+                statement = f"SET statement_timeout = {milliseconds}"
+            elif "mysql" in dialect or "mariadb" in dialect:
+                statement = f"SET SESSION max_execution_time = {milliseconds}"
+            if statement is not None:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(statement)
+                finally:
+                    cursor.close()
+        try:
+            yield
+        except Exception as e:
+            if any(message in str(e).lower() for message in _TIMEOUT_MESSAGES):
+                raise QueryTimeoutError(f"The query was stopped after running for {self.max_execution_seconds} seconds. Write a cheaper query, e.g. with filters on indexed columns or a LIMIT.") from e
+            raise
+
+    @contextmanager
+    def _sqlite_progress_limit(self, conn):
+        if self.max_execution_seconds is None and self.max_vm_steps is None:
+            yield
+            return
+
+        deadline = self._clock() + self.max_execution_seconds if self.max_execution_seconds is not None else None
+        state = {"steps": 0, "reason": None}
+        def progress_handler():
+            state["steps"] += self.progress_interval
+            if deadline is not None and self._clock() > deadline:
+                state["reason"] = f"running for {self.max_execution_seconds} seconds"
+            elif self.max_vm_steps is not None and state["steps"] > self.max_vm_steps:
+                state["reason"] = f"{self.max_vm_steps} steps"
+            return 1 if state["reason"] else 0
+
+        conn.set_progress_handler(progress_handler, self.progress_interval)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if state["reason"] is None:
+                raise
+            raise QueryTimeoutError(f"The query was stopped after {state['reason']}. Write a cheaper query, e.g. with filters on indexed columns or a LIMIT.") from e
+        finally:
+            conn.set_progress_handler(None, 0)
+
+def _scanned_table(detail):
+    """Returns the table (or alias) a query plan line scans in full, e.g. "SCAN t" or "SCAN TABLE t AS x" (older SQLite), or None."""
+
+    words = detail.split()
+    if len(words) < 2 or words[0] != "SCAN":
+        return None
+    name = words[2] if words[1] == "TABLE" and len(words) > 2 else words[1]
+    if name.startswith("(") or name in ("CONSTANT", "SUBQUERY"):
+        return None
+    return name
+
+def _resolve_alias(name, tokens):
+    """Resolves an alias from a query plan to the table it names in the query, e.g. "x" in "FROM employees x". Returns name itself otherwise."""
+
+    lowered = name.lower()
+    for i, token in enumerate(tokens):
+        if token != lowered:
+            continue
+        j = i - 2 if i >= 2 and tokens[i - 1] == "as" else i - 1
+        if j >= 1 and tokens[j - 1] in ("from", "join", ","):
+            return tokens[j].strip("\"`[]").rsplit(".", 1)[-1]
+    return name
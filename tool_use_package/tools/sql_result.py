@@ -0,0 +1,100 @@
+DITTO = '"'
+
+def format_cell(value, max_cell_chars=None):
+    """Renders one value for a result table: NULL for None, text without quotes, escaped delimiters and newlines, cut to max_cell_chars characters."""
+
+    if value is None:
+        text = "NULL"
+    elif isinstance(value, bytes):
+        text = f"<{len(value)} bytes>"
+    else:
+        text = str(value)
+    text = text.replace("\\", "\\\\").replace("|", "\\|").replace("\n", "\\n").replace("\r", "\\r")
+    if text == DITTO:
+        text = '\\"'
+    if max_cell_chars is not None and len(text) > max_cell_chars:
+        text = text[:max_cell_chars - 1] + "…"
+    return text
+
+def format_table(columns, rows, style="delimited", max_cell_chars=200, collapse_repeats=True):
+    """
+    Renders rows as a compact table with a header of column names.
+
+    - style "delimited" separates cells with |, and "markdown" renders a markdown table (a little longer, but familiar).
+    - max_cell_chars cuts long cells short.
+    - collapse_repeats replaces a cell equal to the one above it with a " (ditto) mark, which saves many tokens on sorted or grouped results.
+      Single character cells are never collapsed, since the mark would not be any shorter.
+    """
+
+    if style not in ("delimited", "markdown"):
+        raise ValueError(f"style must be 'delimited' or 'markdown', got {style}")
+
+    lines = []
+    used_ditto = False
+    previous = None
+    for row in rows:
+        cells = [format_cell(value, max_cell_chars) for value in row]
+        shown = cells
+        if collapse_repeats and previous is not None:
+            shown = [DITTO if i < len(previous) and cell == previous[i] and len(cell) > 1 else cell for i, cell in enumerate(cells)]
+            used_ditto = used_ditto or DITTO in shown
+        previous = cells
+        lines.append(shown)
+
+    header = [format_cell(column, max_cell_chars) for column in columns] or [f"column_{i + 1}" for i in range(len(lines[0]) if lines else 0)]
+    if style == "markdown":
+        rendered = [f"| {' | '.join(header)} |", f"|{'|'.join('---' for _ in header)}|"] + [f"| {' | '.join(cells)} |" for cells in lines]
+    else:
+        rendered = ["|".join(header)] + ["|".join(cells) for cells in lines]
+    if used_ditto:
+        rendered.append(f"({DITTO} = same value as the row above)")
+    return "\n".join(rendered)
+
+class SQLResult(list):
+    """
+    The rows returned by SQLTool. A plain list of row tuples, which also remembers the column names and whether (and why) the rows were cut short.
+
+    Attributes:
+    -----------
+    - columns (list): The column names from cursor.description, or an empty list for statements that return no rows.
+    - truncated (bool): True if the query returned more rows than are included.
+    - truncation_reason (str): Why the rows were cut short, e.g. "row limit" or "output token budget". None if not truncated.
+    - total_rows (int): The number of rows the query returned, as far as they were counted.
+    - total_rows_is_exact (bool): False if counting stopped early, in which case the query returned at least total_rows rows.
+    - warnings (list): Notes for Claude about the query, e.g. from SQLGuard.
+    - style, max_cell_chars, collapse_repeats: How str() renders the rows, see format_table. style "repr" renders the Python list of tuples instead.
+
+    str() of a result is what Claude sees: the rows as a compact table, followed by a note explaining any truncation and any warnings.
+    """
+
+    def __init__(self, rows=(), columns=None, truncation_reason=None, total_rows=None, total_rows_is_exact=True, warnings=None, style="delimited", max_cell_chars=200, collapse_repeats=True):
+        super().__init__(rows)
+        self.columns = columns or []
+        self.truncation_reason = truncation_reason
+        self.total_rows = len(self) if total_rows is None else total_rows
+        self.total_rows_is_exact = total_rows_is_exact
+        self.warnings = list(warnings or [])
+        self.style = style
+        self.max_cell_chars = max_cell_chars
+        self.collapse_repeats = collapse_repeats
+
+    @property
+    def truncated(self):
+        return self.truncation_reason is not None
+
+    def truncation_note(self):
+        if not self.truncated:
+            return ""
+        total = f"{self.total_rows}" if self.total_rows_is_exact else f"at least {self.total_rows}"
+        return f"[Showing the first {len(self)} of {total} rows (stopped at the {self.truncation_reason}). Add a LIMIT, filter or aggregate to see other rows.]"
+
+    def format_rows(self):
+        if self.style == "repr":
+            return list.__repr__(self)
+        if not self:
+            return f"{'|'.join(self.columns)}\n(no rows)" if self.columns else "(no rows)"
+        return format_table(self.columns, self, self.style, self.max_cell_chars, self.collapse_repeats)
+
+    def __str__(self):
+        notes = ([self.truncation_note()] if self.truncated else []) + self.warnings
+        return "\n".join([self.format_rows()] + notes)
@@ -0,0 +1,132 @@
+from ..relevance import BM25Index
+from .sql_cache import referenced_tables
+
+class TableSchema:
+    """
+    The introspected schema of one table or view.
+
+    Attributes:
+    -----------
+    - name (str): The table name.
+    - columns (list): (column name, type, is primary key) tuples, in table order.
+    - foreign_keys (list): (column name, referenced table, referenced column) tuples.
+    - is_view (bool): Whether this is a view rather than a base table.
+    - has_dependents (bool): Whether a view reads from the table or a trigger fires on it, so writing to it can change what queries that never name it return.
+      True when this could not be told.
+    """
+
+    def __init__(self, name, columns, foreign_keys=(), is_view=False, has_dependents=False):
+        self.name = name
+        self.columns = list(columns)
+        self.foreign_keys = list(foreign_keys)
+        self.is_view = is_view
+        self.has_dependents = has_dependents
+
+    def render(self):
+        """Renders the table on one line, e.g. orders(id INTEGER PK, customer_id INTEGER REFERENCES customers(id), total REAL)."""
+
+        references = {column: (table, referenced_column) for column, table, referenced_column in self.foreign_keys}
+        columns = []
+        for name, column_type, primary_key in self.columns:
+            column = f"{name} {column_type}".rstrip()
+            if primary_key:
+                column += " PK"
+            if name in references:
+                column += f" REFERENCES {references[name][0]}({references[name][1]})"
+            columns.append(column)
+        return f"{self.name}({', '.join(columns)})"
+
+    def relevance_document(self):
+        return " ".join([self.name] + [name for name, _, _ in self.columns])
+
+def introspect_schema(conn, db_dialect):
+    """Reads the tables, columns and foreign keys of the database behind conn, from sqlite_master for SQLite and from information_schema otherwise."""
+
+    cursor = conn.cursor()
+    try:
+        if "sqlite" in db_dialect.lower():
+            return _introspect_sqlite(cursor)
+        return _introspect_information_schema(cursor)
+    finally:
+        cursor.close()
+
+def _introspect_sqlite(cursor):
+    cursor.execute("SELECT type, name, tbl_name, sql FROM sqlite_master WHERE type IN ('table', 'view', 'trigger') AND name NOT LIKE 'sqlite_%' ORDER BY name")
+    objects = cursor.fetchall()
+    depended_on = set()
+    for object_type, _, table_name, sql in objects:
+        if object_type == "trigger":
+            depended_on.add(table_name.lower())
+        elif object_type == "view":
+            depended_on.update(referenced_tables(sql or ""))
+
+    tables = []
+    for object_type, table_name, _, _ in objects:
+        if object_type == "trigger":
+            continue
+        quoted_name = '"' + table_name.replace('"', '""') + '"'
+        cursor.execute(f"PRAGMA table_info({quoted_name})")
+        columns = [(name, column_type, primary_key > 0) for _, name, column_type, _, _, primary_key in cursor.fetchall()]
+        cursor.execute(f"PRAGMA foreign_key_list({quoted_name})")
+        foreign_keys = [(row[3], row[2], row[4]) for row in cursor.fetchall()]
+        tables.append(TableSchema(table_name, columns, foreign_keys, is_view=object_type == "view", has_dependents=table_name.lower() in depended_on))
+    return tables
+
+def _introspect_information_schema(cursor):
+    cursor.execute(
+        "SELECT c.table_schema, c.table_name, c.column_name, c.data_type, "
+        "CASE WHEN EXISTS ("
+        "SELECT 1 FROM information_schema.table_constraints tc JOIN information_schema.key_column_usage kcu "
+        "ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema "
+        "WHERE tc.constraint_type = 'PRIMARY KEY' AND kcu.table_schema = c.table_schema AND kcu.table_name = c.table_name AND kcu.column_name = c.column_name"
+        ") THEN 1 ELSE 0 END "
+        "FROM information_schema.columns c "
+        "WHERE c.table_schema NOT IN ('information_schema', 'pg_catalog', 'mysql', 'performance_schema', 'sys') "
+        "ORDER BY c.table_schema, c.table_name, c.ordinal_position"
+    )
+    tables = {}
+    schemas = set()
+    for table_schema, table_name, column_name, data_type, primary_key in cursor.fetchall():
+        schemas.add(table_schema)
+        tables.setdefault((table_schema, table_name), []).append((column_name, data_type, bool(primary_key)))
+
+    # Read last, since a database without these views fails the query, and on PostgreSQL that aborts the transaction the caller then rolls back.
+    try:
+        cursor.execute("SELECT table_schema, table_name FROM information_schema.views")
+        views = set(cursor.fetchall())
+        cursor.execute(
+            "SELECT table_schema, table_name FROM information_schema.view_table_usage "
+            "UNION SELECT event_object_schema, event_object_table FROM information_schema.triggers"
+        )
+        depended_on = set(cursor.fetchall())
+    except Exception:
+        views, depended_on = set(), None
+
+    # Only qualify table names with their schema when there is more than one.
+    return [
+        TableSchema(
+            f"{table_schema}.{table_name}" if len(schemas) > 1 else table_name, columns,
+            is_view=(table_schema, table_name) in views, has_dependents=depended_on is None or (table_schema, table_name) in depended_on
+        )
+        for (table_schema, table_name), columns in tables.items()
+    ]
+
+def render_schema(tables, query=None, max_tables=None):
+    """
+    Renders tables one per line. If query and max_tables are given and there are more than max_tables tables, only the (at most) max_tables tables
+    most relevant to query are rendered in full, along with the tables they reference, and the rest are only listed by name.
+    """
+
+    if query is None or max_tables is None or len(tables) <= max_tables:
+        return "\n".join(table.render() for table in tables)
+
+    selected = set(BM25Index([table.relevance_document() for table in tables]).top_k(query, max_tables))
+    names = {table.name: i for i, table in enumerate(tables)}
+    for i in list(selected):
+        selected.update(names[referenced] for _, referenced, _ in tables[i].foreign_keys if referenced in names)
+
+    rendered = [table.render() for i, table in enumerate(tables) if i in selected]
+    other_tables = [table.name for i, table in enumerate(tables) if i not in selected]
+    if other_tables:
+        rendered.append(f"-- Other tables (columns not shown): {', '.join(other_tables)}")
+    return "\n".join(rendered)
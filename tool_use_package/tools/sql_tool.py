@@ -1,35 +1,206 @@
 # Import required external packages
 import sqlite3 # Change this to whatever package you need for making your conn string.
 import os # For deleting our db file at the end
+import threading
+from contextlib import nullcontext
 
 # Import the requisite BaseTool and ToolUser classes, as well as some helpers.
 from .base_tool import BaseTool
+from .sql_result import SQLResult, format_cell
+from .sql_connections import make_connection_manager, read_only_session
+from .sql_cache import is_read_query, tokenize_sql
+from .sql_schema import introspect_schema, render_schema
 from ..tool_user import ToolUser
 from ..prompt_constructors import construct_format_sql_tool_for_claude_prompt
+from ..resources import get_tokenizer
 
 # Define our custom SQL Tool by inheriting BaseTool and defining its use_tool() method. In this case we also override its format_tool_for_claude method to provide some additional detail.
 class SQLTool(BaseTool):
-    """A tool that can run SQL queries against a datbase. db_conn should be a connection string such as sqlite3.connect('test.db')"""
+    """
+    A tool that can run SQL queries against a datbase. db_conn should be a connection string such as sqlite3.connect('test.db')
 
-    def __init__(self, name, description, parameters, db_schema, db_conn, db_dialect):
-        super().__init__(name, description, parameters)
+    Rows are streamed from the cursor with fetchmany, and reading stops once max_rows rows or max_output_tokens tokens of rows have been collected,
+    so memory and latency stay bounded whatever query Claude writes. After stopping, up to count_rows_limit further rows are counted (but not kept)
+    so Claude can be told how many rows it is missing.
+
+    Instead of db_conn, pass connection_factory (a function returning a new DB-API connection, e.g. sqlite_connection_factory('test.db', read_only=True))
+    to let several conversations or invokes query the database at once. SQLite factories get one connection per thread; other drivers get a pool of at
+    most pool_size connections. A single db_conn still works, but its queries run one at a time. A sqlite3 db_conn can only be used from the thread that
+    created it (unless it was opened with check_same_thread=False), so ToolUser always runs a tool given one in the calling thread (see BaseTool.thread_safe).
+
+    With read_only=True the connection is made to refuse writes while Claude's query runs (see read_only_session), and the tool rolls back after
+    each query instead of committing, so nothing Claude runs is ever persisted.
+
+    Pass result_cache (a SQLResultCache) to answer repeated read queries from memory. The tool invalidates it when it runs a write, using the
+    introspected schema to tell which tables views and triggers depend on (it reads the schema again after running DDL itself).
+
+    If db_schema is None, the tool reads the schema from the database itself (sqlite_master for SQLite, information_schema otherwise) on first use,
+    caches it, and describes it to Claude in a compact one-line-per-table form. With max_schema_tables set, databases with more tables than that only
+    describe the max_schema_tables tables most relevant to the conversation (plus the tables they reference) in full. Call refresh_schema() after the schema changes.
+    """
+
+    def __init__(self, name, description, parameters, db_schema=None, db_conn=None, db_dialect="SQLite", max_rows=500, max_output_tokens=5000, fetch_size=100, count_rows_limit=10000,
+                 connection_factory=None, pool_size=5, pool_timeout=30, read_only=False, result_cache=None, max_schema_tables=None, guard=None,
+                 result_format="delimited", max_cell_chars=200, collapse_repeats=True):
+        super().__init__(name, description, parameters, max_output_tokens=max_output_tokens)
         self.db_schema = db_schema
         self.db_conn = db_conn
         self.db_dialect = db_dialect
+        self.max_rows = max_rows
+        self.fetch_size = fetch_size
+        self.count_rows_limit = count_rows_limit
+        self.read_only = read_only
+        self.result_cache = result_cache
+        self.max_schema_tables = max_schema_tables
+        self.guard = guard
+        self.result_format = result_format
+        self.max_cell_chars = max_cell_chars
+        self.collapse_repeats = collapse_repeats
+        self._schema_tables = None
+        self._schema_lock = threading.Lock()
+        self.thread_safe = not isinstance(db_conn, sqlite3.Connection)
+        self.connections = make_connection_manager(db_conn, connection_factory, db_dialect, pool_size=pool_size, pool_timeout=pool_timeout)
+
 
-    
     def use_tool(self, sql_query):
         """Executes a query against the given database connection."""
-       
-        cursor = self.db_conn.cursor()
-        cursor.execute(sql_query)
-        results = cursor.fetchall()
-        self.db_conn.commit()
-        cursor.close()
+
+        if self.result_cache is None:
+            return self._execute(sql_query)
+
+        cached_results = self.result_cache.get(sql_query)
+        if cached_results is not None:
+            return cached_results
+        generation = self.result_cache.generation
+        is_read = is_read_query(sql_query)
+        try:
+            results = self._execute(sql_query)
+        except BaseException:
+            # A failed write may still have changed something (e.g. with an autocommitting driver), so invalidate for it anyway.
+            if not is_read:
+                self.result_cache.record(sql_query, None, isolated_tables=self._isolated_tables())
+            raise
+        finally:
+            # New or dropped views and triggers change which tables are isolated.
+            if not is_read and tokenize_sql(sql_query)[:1] in (["create"], ["drop"], ["alter"]):
+                self.refresh_schema()
+        self.result_cache.record(sql_query, results, generation=generation, isolated_tables=None if is_read else self._isolated_tables())
+        return results
+
+    def _isolated_tables(self):
+        """The lowercased names of the base tables that no view reads and no trigger fires on, or None if the schema cannot be read."""
+
+        try:
+            tables = self.schema_tables
+        except Exception:
+            return None
+        isolated = {}
+        for table in tables:
+            name = table.name.rsplit(".", 1)[-1].lower()
+            isolated[name] = isolated.get(name, True) and not table.is_view and not table.has_dependents
+        return {name for name, is_isolated in isolated.items() if is_isolated}
+
+    def _execute(self, sql_query):
+        with self.connections.connection() as conn:
+            with read_only_session(conn, self.db_dialect, sql_query) if self.read_only else nullcontext():
+                warnings = self.guard.check_plan(conn, sql_query, self.db_dialect) if self.guard is not None else []
+                cursor = conn.cursor()
+                try:
+                    with self.guard.limit_execution(conn, self.db_dialect) if self.guard is not None else nullcontext():
+                        cursor.execute(sql_query)
+                        results = self._fetch_rows(cursor)
+                finally:
+                    cursor.close()
+            results.warnings.extend(warnings)
+            if self.read_only:
+                conn.rollback()
+            else:
+                conn.commit()
 
         return results
-    
+
+    @property
+    def schema_tables(self):
+        """The introspected TableSchemas of the database, read on first access and then cached."""
+
+        with self._schema_lock:
+            if self._schema_tables is None:
+                with self.connections.connection() as conn:
+                    self._schema_tables = introspect_schema(conn, self.db_dialect)
+                    conn.rollback()
+            return self._schema_tables
+
+    def refresh_schema(self):
+        """Forgets the cached schema, so it is introspected again the next time the tool is described to Claude."""
+
+        with self._schema_lock:
+            self._schema_tables = None
+
+    def warmup(self):
+        if self.db_schema is None:
+            self.schema_tables
+
+    def close(self):
+        """Closes the tool's database connections."""
+
+        self.connections.close()
+
+    def _fetch_rows(self, cursor):
+        """Fetches rows in batches of fetch_size until the cursor is exhausted or the row limit or output token budget is reached."""
+
+        columns = [column[0] for column in cursor.description] if cursor.description else []
+        tokenizer = get_tokenizer() if self.max_output_tokens is not None else None
+        rows = []
+        n_tokens = 0
+        truncation_reason = None
+        n_rows_seen = 0
+
+        while truncation_reason is None:
+            batch = cursor.fetchmany(self.fetch_size)
+            if not batch:
+                break
+            n_rows_seen += len(batch)
+            row_tokens = [len(encoding.ids) for encoding in tokenizer.encode_batch([self._format_row(row) for row in batch])] if tokenizer is not None else None
+            for i, row in enumerate(batch):
+                if self.max_rows is not None and len(rows) >= self.max_rows:
+                    truncation_reason = "row limit"
+                    break
+                if row_tokens is not None and n_tokens + row_tokens[i] > self.max_output_tokens:
+                    truncation_reason = "output token budget"
+                    break
+                rows.append(row)
+                if row_tokens is not None:
+                    n_tokens += row_tokens[i]
+
+        format_options = {"style": self.result_format, "max_cell_chars": self.max_cell_chars, "collapse_repeats": self.collapse_repeats}
+        if truncation_reason is None:
+            return SQLResult(rows, columns, **format_options)
+
+        # Count (without keeping) the rows we are not returning, up to count_rows_limit, so Claude knows how much it is missing.
+        total_rows_is_exact = False
+        while n_rows_seen < self.count_rows_limit:
+            batch = cursor.fetchmany(min(self.fetch_size, self.count_rows_limit - n_rows_seen))
+            if not batch:
+                total_rows_is_exact = True
+                break
+            n_rows_seen += len(batch)
+
+        return SQLResult(rows, columns, truncation_reason=truncation_reason, total_rows=n_rows_seen, total_rows_is_exact=total_rows_is_exact, **format_options)
+
+    def _format_row(self, row):
+        """Approximates how a row is rendered to Claude (without collapsed repeats), for counting its tokens."""
+
+        if self.result_format == "repr":
+            return repr(row)
+        return "|".join(format_cell(value, self.max_cell_chars) for value in row)
+
     def format_tool_for_claude(self):
         """Overriding the base class format_tool_for_claude in this case, which we don't always do. Returns a formatted representation of the tool suitable for the Claude system prompt.""" #TODO: Test if we even need to do this vs putting schema in the description.
-        
-        return construct_format_sql_tool_for_claude_prompt(self.name, self.description, self.parameters, self.db_schema, self.db_dialect)
\ No newline at end of file
+
+        return self.format_tool_for_claude_for_query(None)
+
+    def format_tool_for_claude_for_query(self, query):
+        """Describes the tool with only the tables relevant to query, if the schema is introspected and max_schema_tables is set."""
+
+        db_schema = self.db_schema if self.db_schema is not None else render_schema(self.schema_tables, query, self.max_schema_tables)
+        return construct_format_sql_tool_for_claude_prompt(self.name, self.description, self.parameters, db_schema, self.db_dialect)